@@ -0,0 +1,161 @@
+# /opt-tg-bot/benchmarks/log_parser_bench.py
+"""
+Замер скорости разбора auth.log / fail2ban.log.
+
+Сравнивает прежний подход (последовательные re.search по каждому шаблону +
+datetime.strptime) с core.log_parser на синтетическом логе.
+Запуск из корня проекта:  python -m benchmarks.log_parser_bench [строк]
+"""
+import re
+import sys
+import time
+import random
+from datetime import datetime
+
+from core import log_parser
+
+# --- Прежняя реализация (для сравнения) ---
+_OLD_SSH_PATTERNS = (
+    (log_parser.LOGIN_ACCEPTED,
+     re.compile(r"Accepted\s+(?:\S+)\s+for\s+(\S+)\s+from\s+(\S+)"), ("user", "ip")),
+    (log_parser.LOGIN_INVALID_USER,
+     re.compile(r"Failed\s+(?:\S+)\s+for\s+invalid\s+user\s+(\S+)\s+from\s+(\S+)"), ("user", "ip")),
+    (log_parser.LOGIN_FAILED_PASSWORD,
+     re.compile(r"Failed password for (\S+) from (\S+)"), ("user", "ip")),
+    (log_parser.LOGIN_PAM_FAILURE,
+     re.compile(r"authentication failure;.*rhost=(\S+)\s+user=(\S+)"), ("ip", "user")),
+)
+_OLD_ISO_TIME_RE = re.compile(r"(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})")
+_OLD_SYSLOG_TIME_RE = re.compile(r"(\w{3}\s+\d{1,2}\s+\d{2}:\d{2}:\d{2})")
+_OLD_F2B_BAN_RE = re.compile(
+    r"(\d{4}-\d{2}-\d{2}\s\d{2}:\d{2}:\d{2},\d{3}).*fail2ban\.actions.* Ban\s+(\S+)")
+_OLD_F2B_ALREADY_RE = re.compile(
+    r"(\d{4}-\d{2}-\d{2}\s\d{2}:\d{2}:\d{2},\d{3}).*fail2ban\.actions.* (\S+)\s+already banned")
+
+
+def _old_timestamp(line):
+    match = _OLD_ISO_TIME_RE.search(line)
+    if match:
+        return datetime.strptime(match.group(1), "%Y-%m-%dT%H:%M:%S")
+    match = _OLD_SYSLOG_TIME_RE.search(line)
+    if match:
+        now = datetime.now()
+        dt = datetime.strptime(
+            match.group(1), "%b %d %H:%M:%S").replace(year=now.year)
+        if dt > now:
+            dt = dt.replace(year=now.year - 1)
+        return dt
+    return None
+
+
+def old_parse_ssh_line(line):
+    if "sshd" not in line:
+        return None
+    for kind, pattern, groups in _OLD_SSH_PATTERNS:
+        match = pattern.search(line)
+        if match:
+            fields = dict(zip(groups, match.groups()))
+            return log_parser.LogEvent(kind, _old_timestamp(line),
+                                       fields["ip"], fields["user"])
+    return None
+
+
+def old_parse_f2b_line(line):
+    for kind, pattern in ((log_parser.F2B_BAN, _OLD_F2B_BAN_RE),
+                          (log_parser.F2B_ALREADY_BANNED, _OLD_F2B_ALREADY_RE)):
+        match = pattern.search(line)
+        if match:
+            timestamp_str, ip = match.groups()
+            timestamp = datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S,%f")
+            return log_parser.LogEvent(kind, timestamp, ip.strip(" \n\t,"))
+    return None
+
+
+# --- Синтетические логи ---
+_SSH_NOISE = (
+    "{ts} vps sshd[{pid}]: Connection closed by {ip} port {port} [preauth]",
+    "{ts} vps sshd[{pid}]: Received disconnect from {ip} port {port}:11: Bye Bye [preauth]",
+    "{ts} vps sshd[{pid}]: pam_unix(sshd:session): session opened for user root(uid=0) by (uid=0)",
+    "{ts} vps CRON[{pid}]: pam_unix(cron:session): session closed for user root",
+    "{ts} vps systemd-logind[{pid}]: New session 42 of user root.",
+    "{ts} vps sudo:     root : TTY=pts/0 ; PWD=/root ; USER=root ; COMMAND=/usr/bin/ls",
+    # Маркеры входа от других PAM-сервисов — не события SSH
+    "{ts} vps su[{pid}]: pam_unix(su:auth): authentication failure; logname=alice uid=1000 euid=0 tty=pts/0 ruser=alice rhost={ip}  user=root",
+    "{ts} vps vsftpd[{pid}]: Accepted password for ftp from {ip} port {port}",
+)
+_SSH_EVENTS = (
+    "{ts} vps sshd[{pid}]: Accepted publickey for root from {ip} port {port} ssh2: ED25519 SHA256:abc",
+    "{ts} vps sshd[{pid}]: Failed password for root from {ip} port {port} ssh2",
+    "{ts} vps sshd[{pid}]: Failed password for invalid user admin from {ip} port {port} ssh2",
+    "{ts} vps sshd[{pid}]: pam_unix(sshd:auth): authentication failure; logname= uid=0 euid=0 tty=ssh ruser= rhost={ip}  user=root",
+)
+_F2B_LINES = (
+    "{ts},{ms:03d} fail2ban.filter         [{pid}]: INFO    [sshd] Found {ip} - {date}",
+    "{ts},{ms:03d} fail2ban.actions        [{pid}]: NOTICE  [sshd] Ban {ip}",
+    "{ts},{ms:03d} fail2ban.actions        [{pid}]: NOTICE  [sshd] {ip} already banned",
+    "{ts},{ms:03d} fail2ban.actions        [{pid}]: NOTICE  [sshd] Unban {ip}",
+)
+
+
+def _random_ip(rnd):
+    return ".".join(str(rnd.randint(1, 254)) for _ in range(4))
+
+
+def generate_ssh_log(count, event_ratio=0.2, seed=1):
+    rnd = random.Random(seed)
+    lines = []
+    for i in range(count):
+        templates = _SSH_EVENTS if rnd.random() < event_ratio else _SSH_NOISE
+        ts = f"Oct {rnd.randint(1, 28):2d} {rnd.randint(0, 23):02d}:{rnd.randint(0, 59):02d}:{rnd.randint(0, 59):02d}"
+        if i % 2:
+            ts = f"2024-10-{rnd.randint(1, 28):02d}T{rnd.randint(0, 23):02d}:00:00.123456+03:00"
+        lines.append(rnd.choice(templates).format(
+            ts=ts, pid=rnd.randint(100, 99999), ip=_random_ip(rnd),
+            port=rnd.randint(1024, 65535)))
+    return lines
+
+
+def generate_f2b_log(count, seed=2):
+    rnd = random.Random(seed)
+    lines = []
+    for _ in range(count):
+        ts = f"2024-10-{rnd.randint(1, 28):02d} {rnd.randint(0, 23):02d}:{rnd.randint(0, 59):02d}:{rnd.randint(0, 59):02d}"
+        lines.append(rnd.choice(_F2B_LINES).format(
+            ts=ts, ms=rnd.randint(0, 999), pid=rnd.randint(100, 99999),
+            ip=_random_ip(rnd), date=ts))
+    return lines
+
+
+def _measure(parser, lines, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for line in lines:
+            parser(line)
+        best = min(best, time.perf_counter() - start)
+    return len(lines) / best
+
+
+def _compare(title, old, new, lines):
+    # Результаты обеих реализаций должны совпадать (без учета года в syslog)
+    for line in lines:
+        a, b = old(line), new(line)
+        if (a is None) != (b is None) or (a and (a.kind, a.ip, a.user) != (b.kind, b.ip, b.user)):
+            raise SystemExit(f"Расхождение разбора:\n  {line}\n  было:  {a}\n  стало: {b}")
+    old_rate = _measure(old, lines)
+    new_rate = _measure(new, lines)
+    print(f"{title}: {len(lines)} строк")
+    print(f"  было:  {old_rate:12,.0f} строк/с")
+    print(f"  стало: {new_rate:12,.0f} строк/с  (x{new_rate / old_rate:.1f})")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    _compare("auth.log", old_parse_ssh_line, log_parser.parse_ssh_line,
+             generate_ssh_log(count))
+    _compare("fail2ban.log", old_parse_f2b_line, log_parser.parse_f2b_line,
+             generate_f2b_log(count))
+
+
+if __name__ == "__main__":
+    main()
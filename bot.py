@@ -3,11 +3,11 @@ from core.middlewares import SpamThrottleMiddleware  # <-- Добавлен им
 from modules import (
     selftest, traffic, uptime, notifications, users, vless,
     speedtest, top, xray, sshlog, fail2ban, logs, update, reboot, restart,
-    optimize
+    optimize, history, stats
 )
 from core.i18n import _, I18nFilter, get_language_keyboard
 from core import i18n
-from core import config, shared_state, auth, utils, keyboards, messaging
+from core import config, shared_state, auth, utils, keyboards, messaging, geoip, http_client, geo_scheduler, alert_coalescer, log_bus, cpu_sampler, metrics_store, delivery, outbox, subscriptions, bot_telemetry
 import asyncio
 import logging
 import signal
@@ -36,6 +36,7 @@ ENABLE_REBOOT = True    # Root
 ENABLE_NOTIFICATIONS = True
 ENABLE_USERS = True     # Admin
 ENABLE_OPTIMIZE = True
+ENABLE_HISTORY = True
 # ------------------------------
 
 # Импорт основного ядра
@@ -48,6 +49,9 @@ config.setup_logging(config.BOT_LOG_DIR, "bot")
 
 # --- Инициализация ---
 bot = Bot(token=config.TOKEN)
+# --- ДОБАВЛЕНО: Замер каждого вызова Bot API для /stats (core/bot_telemetry.py) ---
+bot.session.middleware(bot_telemetry.TelemetryMiddleware(bot_telemetry.BOT_TELEMETRY))
+# ----------------------------------------------------------------------------------
 storage = MemoryStorage()
 dp = Dispatcher(storage=storage)
 
@@ -271,6 +275,8 @@ def load_modules():
         register_module(uptime)
     if ENABLE_TRAFFIC:
         register_module(traffic)
+    if ENABLE_HISTORY:
+        register_module(history)
     if ENABLE_NOTIFICATIONS:
         register_module(notifications)
 
@@ -300,6 +306,9 @@ def load_modules():
     if ENABLE_OPTIMIZE:
         register_module(optimize, root_only=True)
 
+    # /stats — только команда, без кнопки (register_module ждет get_button)
+    stats.register_handlers(dp)
+
     logging.info("--- Карта кнопок (ключи i18n) ---")
     logging.info(f"User: {[btn.text for btn in buttons_map['user']]}")
     logging.info(f"Admin: {[btn.text for btn in buttons_map['admin']]}")
@@ -337,6 +346,15 @@ async def shutdown(dispatcher: Dispatcher, bot_instance: Bot):
                 logging.error(
                     f"Ошибка при завершении фоновой задачи {task_name}: {result}")
     logging.info("Фоновые задачи обработаны.")
+    # Недоотправленные сводки — в очередь исходящих (уйдут после рестарта)
+    await alert_coalescer.ALERT_COALESCER.close()
+    outbox.OUTBOX.close()
+    subscriptions.SUBSCRIPTIONS.flush()  # Отложенная запись подписок
+    try:
+        await geo_scheduler.GEO_SCHEDULER.close()
+        await http_client.close()
+    except Exception as e:
+        logging.error(f"Ошибка при закрытии HTTP-сессии: {e}")
     session_to_close = getattr(bot_instance, 'session', None)
     underlying_session = getattr(session_to_close, 'session', None)
     if underlying_session and not underlying_session.closed:
@@ -365,12 +383,23 @@ async def main():
         logging.info(
             f"Бот запускается в режиме: {config.INSTALL_MODE.upper()}")
         await asyncio.to_thread(auth.load_users)
-        await asyncio.to_thread(utils.load_alerts_config)
+        await asyncio.to_thread(subscriptions.SUBSCRIPTIONS.load)
         await asyncio.to_thread(i18n.load_user_settings)
+        await asyncio.to_thread(geoip.load_offline_db)
         await auth.refresh_user_names(bot)
         await utils.initial_reboot_check(bot)
         await utils.initial_restart_check(bot)
         load_modules()  # Загружаем модули, регистрируем хэндлеры и кнопки
+        # Общая шина логов: подписчики зарегистрированы модулями выше
+        log_bus.setup_default_sources(log_bus.LOG_BUS)
+        background_tasks.update(log_bus.LOG_BUS.start())
+        background_tasks.add(asyncio.create_task(
+            cpu_sampler.CPU_SAMPLER.run(), name="CpuSampler"))
+        background_tasks.add(asyncio.create_task(
+            metrics_store.record_metrics(metrics_store.METRICS_STORE), name="MetricsStore"))
+        # Очередь исходящих: дошлет и то, что не ушло до перезапуска
+        background_tasks.add(asyncio.create_task(
+            delivery.OUTBOX_SENDER.run(bot), name="OutboxSender"))
         logging.info("Starting polling...")
         await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
     except (KeyboardInterrupt, SystemExit):
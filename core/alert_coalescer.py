@@ -0,0 +1,131 @@
+# /opt-tg-bot/core/alert_coalescer.py
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import NamedTuple
+
+from aiogram import Bot
+
+from . import config
+from .i18n import _
+from .messaging import send_alert
+from .outbox import PRIORITY_BULK
+from .utils import resolve_many, get_server_timezone_label
+from .geo_scheduler import PRIORITY_ALERT
+from .config import (
+    ALERT_COALESCE_WINDOW, ALERT_COALESCE_THRESHOLD, ALERT_DIGEST_TOP_N
+)
+
+
+class AlertEvent(NamedTuple):
+    """Готовый текст алерта + данные для сводки."""
+    message: str
+    ip: str | None = None
+    flag: str | None = None
+    timestamp: datetime | None = None  # Время события из лога
+    key: str | None = None  # Идентичность события (LogEvent.origin) для очереди исходящих
+
+
+class _Window:
+    def __init__(self):
+        self.count = 0
+        self.suppressed: list[tuple[AlertEvent, datetime]] = []
+        self.close_now = asyncio.Event()  # Досрочное закрытие (остановка бота)
+
+
+class AlertCoalescer:
+    """
+    Прослойка между парсерами логов и send_alert.
+    Первые `threshold` событий типа в окне `window` секунд уходят сразу,
+    остальные копятся и отправляются одной сводкой при закрытии окна.
+    """
+
+    def __init__(self, window: float, threshold: int, top_n: int):
+        self.window = window
+        self.threshold = threshold
+        self.top_n = top_n
+        self._windows: dict[str, _Window] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    async def submit(self, bot: Bot, alert_type: str, event: AlertEvent):
+        window = self._windows.get(alert_type)
+        if window is None:
+            window = _Window()
+            self._windows[alert_type] = window
+            task = asyncio.create_task(
+                self._close_later(bot, alert_type, window),
+                name=f"AlertDigest-{alert_type}")
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        window.count += 1
+        if window.count <= self.threshold:
+            await send_alert(bot, event.message, alert_type, key=event.key)
+        else:
+            # Время из лога: после дочитывания или при отставании время обработки другое
+            window.suppressed.append((event, event.timestamp or datetime.now()))
+            logging.debug(
+                f"Алерт {alert_type} отложен в сводку ({len(window.suppressed)} в окне)")
+
+    async def _close_later(self, bot: Bot, alert_type: str, window: _Window):
+        try:
+            await asyncio.wait_for(window.close_now.wait(), self.window)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            if self._windows.get(alert_type) is window:
+                del self._windows[alert_type]
+        if window.suppressed:
+            first_key = window.suppressed[0][0].key
+            try:
+                # Сводка — фоновая информация, не должна задерживать срочные алерты
+                await send_alert(
+                    bot, await self._format_digest(alert_type, window), alert_type,
+                    PRIORITY_BULK, key=f"digest:{first_key}" if first_key else None)
+            except Exception as e:
+                logging.error(f"Ошибка отправки сводки {alert_type}: {e}")
+
+    async def _format_digest(self, alert_type: str, window: _Window) -> str:
+        lang = config.DEFAULT_LANGUAGE
+        events = window.suppressed
+        ip_counts = Counter(event.ip for event, _t in events if event.ip)
+
+        # К закрытию окна флаги обычно уже в кеше (были "⏳" во время шторма)
+        flags = {event.ip: event.flag for event, _t in events if event.ip}
+        try:
+            flags.update(await resolve_many(ip_counts, PRIORITY_ALERT))
+        except Exception as e:
+            logging.warning(f"Сводка {alert_type}: не удалось уточнить флаги: {e}")
+
+        top_ips = "\n".join(
+            _("alert_digest_ip_line", lang, flag=flags.get(ip) or "❓", ip=ip, count=count)
+            for ip, count in ip_counts.most_common(self.top_n))
+        country_counts = Counter(
+            flags.get(ip) or "❓" for ip in ip_counts.elements())
+        countries = ", ".join(
+            f"{flag} {count}" for flag, count in country_counts.most_common(self.top_n))
+
+        title = _(f"alert_digest_title_{alert_type}", lang,
+                  count=len(events), window=int(self.window))
+        return _("alert_digest_body", lang,
+                 title=title,
+                 first=min(t for _event, t in events).strftime('%H:%M:%S'),
+                 last=max(t for _event, t in events).strftime('%H:%M:%S'),
+                 tz=get_server_timezone_label(),
+                 top_ips=top_ips or "—",
+                 countries=countries or "—")
+
+    async def close(self):
+        """
+        Остановка бота: открытые окна закрываются сразу, отложенные события
+        уходят сводкой в очередь исходящих, а не теряются.
+        """
+        for window in self._windows.values():
+            window.close_now.set()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+ALERT_COALESCER = AlertCoalescer(
+    ALERT_COALESCE_WINDOW, ALERT_COALESCE_THRESHOLD, ALERT_DIGEST_TOP_N)
@@ -118,12 +118,13 @@ def is_allowed(user_id, command=None):
         "start", "menu", "back_to_menu", "uptime", "traffic", "selftest",
         "get_id", "get_id_inline", "notifications_menu", "toggle_alert_resources",
         "toggle_alert_logins", "toggle_alert_bans", "alert_downtime_stub",
-        "language"  # <-- Команда смены языка
+        "language",  # <-- Команда смены языка
+        "history"
     ]
     admin_only_commands = [
         "manage_users", "generate_vless", "speedtest", "top", "updatexray",
         "adduser", "add_user", "delete_user", "set_group", "change_group",
-        "back_to_manage_users", "back_to_delete_users"
+        "back_to_manage_users", "back_to_delete_users", "stats"
     ]
     root_only_commands = [
         "reboot_confirm",
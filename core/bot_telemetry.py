@@ -0,0 +1,160 @@
+# /opt-tg-bot/core/bot_telemetry.py
+import time
+import bisect
+from collections import deque
+from typing import NamedTuple
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware, NextRequestMiddlewareType
+)
+from aiogram.exceptions import (
+    TelegramAPIError, TelegramBadRequest, TelegramForbiddenError,
+    TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+)
+from aiogram.methods import TelegramMethod, Response
+
+from .config import TELEMETRY_WINDOW_MINUTES
+
+# Верхние границы корзин гистограмм, сек (последняя — "больше")
+LATENCY_BOUNDS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 1800, float("inf"))
+RETRY_AFTER_BOUNDS = (1, 5, 15, 30, 60, 300, float("inf"))
+
+# getUpdates — long polling: его "задержка" — время ожидания событий
+SKIPPED_METHODS = {"getUpdates"}
+
+# Путь алерта от записи в очередь (core/outbox.py) до доставки
+OUTBOX_DELIVERY = "outbox"
+
+
+def error_class(error: BaseException) -> str:
+    if isinstance(error, TelegramRetryAfter):
+        return "retry_after"
+    if isinstance(error, TelegramForbiddenError):
+        return "forbidden"
+    if isinstance(error, TelegramBadRequest):
+        return "bad_request"
+    if isinstance(error, TelegramServerError):
+        return "server"
+    if isinstance(error, TelegramNetworkError):
+        return "network"
+    if isinstance(error, TelegramAPIError):
+        return "api"
+    return type(error).__name__
+
+
+class _Minute:
+    """Счетчики одного метода за одну минуту."""
+    __slots__ = ("minute", "calls", "latency", "max_latency", "errors", "retry_after")
+
+    def __init__(self, minute: int):
+        self.minute = minute
+        self.calls = 0
+        self.latency = [0] * len(LATENCY_BOUNDS)
+        self.max_latency = 0.0
+        self.errors: dict[str, int] = {}
+        self.retry_after = [0] * len(RETRY_AFTER_BOUNDS)
+
+
+class MethodStats(NamedTuple):
+    calls: int
+    p50: float
+    p95: float
+    errors: dict[str, int]
+    retry_after: list[int]  # По корзинам RETRY_AFTER_BOUNDS
+
+
+def _percentile(histogram: list[int], total: int, max_value: float, q: float) -> float:
+    """Перцентиль по гистограмме: линейно внутри корзины."""
+    rank = q * total
+    seen = 0
+    for i, count in enumerate(histogram):
+        if count and seen + count >= rank:
+            lower = LATENCY_BOUNDS[i - 1] if i else 0.0
+            upper = min(LATENCY_BOUNDS[i], max_value)
+            return lower + (upper - lower) * (rank - seen) / count
+        seen += count
+    return max_value
+
+
+class ApiTelemetry:
+    """
+    Задержки, ошибки и RetryAfter по методам Bot API за последний час.
+    Память ограничена: на метод — не больше window минутных корзин
+    фиксированного размера, сырые замеры не хранятся.
+    """
+
+    def __init__(self, window_minutes: int):
+        self.window_minutes = window_minutes
+        self._methods: dict[str, deque[_Minute]] = {}
+
+    def record(self, method: str, latency: float, error: str | None = None,
+               retry_after: float | None = None):
+        minute = int(time.time() // 60)
+        history = self._methods.get(method)
+        if history is None:
+            history = self._methods[method] = deque(maxlen=self.window_minutes)
+        if not history or history[-1].minute != minute:
+            history.append(_Minute(minute))
+        bucket = history[-1]
+        bucket.calls += 1
+        bucket.latency[bisect.bisect_left(LATENCY_BOUNDS, latency)] += 1
+        bucket.max_latency = max(bucket.max_latency, latency)
+        if error is not None:
+            bucket.errors[error] = bucket.errors.get(error, 0) + 1
+        if retry_after is not None:
+            bucket.retry_after[bisect.bisect_left(RETRY_AFTER_BOUNDS, retry_after)] += 1
+
+    def summary(self) -> dict[str, MethodStats]:
+        """Сводка по методам за окно, самые частые — первыми."""
+        oldest = int(time.time() // 60) - self.window_minutes
+        result = {}
+        for method, history in self._methods.items():
+            calls = 0
+            latency = [0] * len(LATENCY_BOUNDS)
+            retry_after = [0] * len(RETRY_AFTER_BOUNDS)
+            errors: dict[str, int] = {}
+            max_latency = 0.0
+            for bucket in history:
+                if bucket.minute <= oldest:
+                    continue
+                calls += bucket.calls
+                max_latency = max(max_latency, bucket.max_latency)
+                for i, count in enumerate(bucket.latency):
+                    latency[i] += count
+                for i, count in enumerate(bucket.retry_after):
+                    retry_after[i] += count
+                for name, count in bucket.errors.items():
+                    errors[name] = errors.get(name, 0) + count
+            if calls:
+                result[method] = MethodStats(
+                    calls, _percentile(latency, calls, max_latency, 0.5),
+                    _percentile(latency, calls, max_latency, 0.95),
+                    errors, retry_after)
+        return dict(sorted(result.items(), key=lambda item: -item[1].calls))
+
+
+class TelemetryMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: замеряет каждый вызов Bot API."""
+
+    def __init__(self, telemetry: ApiTelemetry):
+        self.telemetry = telemetry
+
+    async def __call__(self, make_request: NextRequestMiddlewareType,
+                       bot: Bot, method: TelegramMethod) -> Response:
+        name = method.__api_method__
+        if name in SKIPPED_METHODS:
+            return await make_request(bot, method)
+        started = time.monotonic()
+        try:
+            response = await make_request(bot, method)
+        except Exception as e:
+            self.telemetry.record(
+                name, time.monotonic() - started, error_class(e),
+                e.retry_after if isinstance(e, TelegramRetryAfter) else None)
+            raise
+        self.telemetry.record(name, time.monotonic() - started)
+        return response
+
+
+BOT_TELEMETRY = ApiTelemetry(TELEMETRY_WINDOW_MINUTES)
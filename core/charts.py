@@ -0,0 +1,189 @@
+# /opt-tg-bot/core/charts.py
+import io
+import math
+import time
+import asyncio
+import logging
+from datetime import datetime
+from typing import NamedTuple
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+from .singleflight import SingleFlight
+from .metrics_store import METRICS_STORE, MetricRecord
+from .config import METRICS_STORE_INTERVAL, CHART_CACHE_TTL
+
+CHART_METRICS = ("cpu", "ram", "disk", "traffic")
+CHART_RANGES = {"1h": 3600, "24h": 86400, "7d": 7 * 86400}
+
+_WIDTH, _HEIGHT = 800, 400
+_LEFT, _RIGHT, _TOP, _BOTTOM = 60, 20, 36, 40
+_TITLES = {"cpu": "CPU, %", "ram": "RAM, %", "disk": "Disk, %",
+           "traffic": "Traffic, Mbit/s"}
+_COLORS = {"cpu": (220, 80, 60), "ram": (60, 120, 220), "disk": (150, 90, 200),
+           "rx": (40, 160, 80), "tx": (230, 140, 30)}
+# Разрыв линии, если между записями пропуск (бот не работал)
+_GAP = 3 * METRICS_STORE_INTERVAL
+
+
+class ChartImage(NamedTuple):
+    png: bytes
+    stats: dict
+
+
+def _percent_series(records: list[MetricRecord], field: str) -> list[tuple[float, float]]:
+    series = []
+    for record in records:
+        value = getattr(record, field)
+        if not math.isnan(value):
+            series.append((record.timestamp, value))
+    return series
+
+
+def _rate_series(records: list[MetricRecord], field: str) -> list[tuple[float, float]]:
+    """Мбит/с по разнице счетчиков соседних записей."""
+    series = []
+    for prev, cur in zip(records, records[1:]):
+        elapsed = cur.timestamp - prev.timestamp
+        delta = getattr(cur, field) - getattr(prev, field)
+        if elapsed <= 0 or elapsed > _GAP or delta < 0:
+            continue  # Пропуск или сброс счетчиков (перезагрузка)
+        series.append((cur.timestamp, delta * 8 / elapsed / 1_000_000))
+    return series
+
+
+def _downsample(series, start: float, span: float, columns: int):
+    """Усредняет точки по столбцам графика (не больше одной точки на пиксель)."""
+    buckets = {}
+    for ts, value in series:
+        column = min(columns - 1, int((ts - start) / span * columns))
+        total, count, last_ts = buckets.get(column, (0.0, 0, ts))
+        buckets[column] = (total + value, count + 1, ts)
+    return [(last_ts, total / count)
+            for _col, (total, count, last_ts) in sorted(buckets.items())]
+
+
+def _font(size: int):
+    try:
+        return ImageFont.load_default(size=size)
+    except (TypeError, OSError):  # Старый Pillow / нет FreeType
+        return ImageFont.load_default()
+
+
+def _draw(title: str, series_map: dict, start: float, end: float,
+          y_max: float, time_format: str) -> bytes:
+    image = Image.new("RGB", (_WIDTH, _HEIGHT), "white")
+    draw = ImageDraw.Draw(image)
+    font = _font(13)
+    plot_w = _WIDTH - _LEFT - _RIGHT
+    plot_h = _HEIGHT - _TOP - _BOTTOM
+    span = end - start
+
+    def x_of(ts):
+        return _LEFT + (ts - start) / span * plot_w
+
+    def y_of(value):
+        return _TOP + plot_h - min(value, y_max) / y_max * plot_h
+
+    draw.text((_LEFT, 10), title, fill="black", font=font)
+    for i in range(6):
+        value = y_max * i / 5
+        y = y_of(value)
+        draw.line([(_LEFT, y), (_WIDTH - _RIGHT, y)], fill=(225, 225, 225))
+        label = f"{value:.0f}" if y_max >= 10 else f"{value:.2f}"
+        draw.text((5, y - 7), label, fill="gray", font=font)
+    for i in range(7):
+        ts = start + span * i / 6
+        x = x_of(ts)
+        draw.line([(x, _TOP), (x, _TOP + plot_h)], fill=(235, 235, 235))
+        label = datetime.fromtimestamp(ts).strftime(time_format)
+        draw.text((x - 18, _TOP + plot_h + 8), label, fill="gray", font=font)
+    draw.rectangle([_LEFT, _TOP, _WIDTH - _RIGHT, _TOP + plot_h], outline="gray")
+
+    legend_x = _WIDTH - _RIGHT - 10
+    for name, series in reversed(list(series_map.items())):
+        color = _COLORS[name]
+        segment = []
+        prev_ts = None
+        points = _downsample(series, start, span, plot_w)
+        for ts, value in points:
+            if prev_ts is not None and ts - prev_ts > max(_GAP, span / plot_w * 2):
+                if len(segment) > 1:
+                    draw.line(segment, fill=color, width=2)
+                segment = []
+            segment.append((x_of(ts), y_of(value)))
+            prev_ts = ts
+        if len(segment) > 1:
+            draw.line(segment, fill=color, width=2)
+        elif segment:
+            x, y = segment[0]
+            draw.ellipse([x - 2, y - 2, x + 2, y + 2], fill=color)
+        if len(series_map) > 1:
+            legend_x -= 40
+            draw.text((legend_x, 10), name, fill=color, font=font)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def _summary(series) -> dict:
+    values = [value for _ts, value in series]
+    return {"last": values[-1], "avg": sum(values) / len(values), "max": max(values)}
+
+
+def render_chart_sync(metric: str, range_key: str) -> ChartImage | None:
+    """Рисует PNG-график метрики за период (блокирующая, вызывать в потоке)."""
+    end = time.time()
+    start = end - CHART_RANGES[range_key]
+    records = METRICS_STORE.range(start, end)
+    if metric == "traffic":
+        series_map = {"rx": _rate_series(records, "rx"),
+                      "tx": _rate_series(records, "tx")}
+        peak = max((v for s in series_map.values() for _t, v in s), default=0)
+        y_max = max(peak * 1.1, 0.01)
+    else:
+        series_map = {metric: _percent_series(records, metric)}
+        y_max = 100.0
+    if not any(series_map.values()):
+        return None
+    stats = {name: _summary(series) for name, series in series_map.items() if series}
+    time_format = "%d.%m" if range_key == "7d" else "%H:%M"
+    png = _draw(f"{_TITLES[metric]} - {range_key}", series_map, start, end,
+                y_max, time_format)
+    logging.debug(f"График {metric}/{range_key}: {len(records)} записей, {len(png)} байт")
+    return ChartImage(png, stats)
+
+
+class ChartCache:
+    """
+    Кеш отрисованных графиков по ключу (метрика, период, интервал времени):
+    все запросы одного графика в пределах `ttl` секунд получают один рендер.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._images: dict[tuple, ChartImage | None] = {}
+        self._flight = SingleFlight("charts")
+
+    async def get(self, metric: str, range_key: str) -> ChartImage | None:
+        if not PIL_AVAILABLE:
+            raise RuntimeError("Pillow не установлен")
+        bucket = int(time.time() // self.ttl)
+        key = (metric, range_key, bucket)
+        if key in self._images:
+            return self._images[key]
+        image = await self._flight.do(
+            key, lambda: asyncio.to_thread(render_chart_sync, metric, range_key))
+        # Графики прошлых интервалов больше не понадобятся
+        for old_key in [k for k in self._images if k[2] < bucket]:
+            del self._images[old_key]
+        self._images[key] = image
+        return image
+
+
+CHART_CACHE = ChartCache(CHART_CACHE_TTL)
@@ -34,6 +34,12 @@ REBOOT_FLAG_FILE = os.path.join(CONFIG_DIR, "reboot_flag.txt")
 RESTART_FLAG_FILE = os.path.join(CONFIG_DIR, "restart_flag.txt")
 ALERTS_CONFIG_FILE = os.path.join(CONFIG_DIR, "alerts_config.json")
 USER_SETTINGS_FILE = os.path.join(CONFIG_DIR, "user_settings.json")
+GEOIP_CACHE_FILE = os.path.join(CONFIG_DIR, "geoip_cache.db")
+GEOIP_COMPILED_FILE = os.path.join(CONFIG_DIR, "geoip_ranges.bin")
+LOG_CHECKPOINTS_FILE = os.path.join(CONFIG_DIR, "log_checkpoints.json")
+METRICS_STORE_FILE = os.path.join(CONFIG_DIR, "metrics.ring")
+TRAFFIC_BASELINE_FILE = os.path.join(CONFIG_DIR, "traffic_baseline.json")
+OUTBOX_FILE = os.path.join(CONFIG_DIR, "outbox.db")
 # --- LOG_FILE удален ---
 
 # --- Загрузка .env ---
@@ -43,6 +49,8 @@ INSTALL_MODE = os.environ.get("INSTALL_MODE", "secure")
 DEPLOY_MODE = os.environ.get("DEPLOY_MODE", "systemd")
 # ------------------------------------
 ADMIN_USERNAME = os.environ.get("TG_ADMIN_USERNAME")
+# --- ДОБАВЛЕНО: Локальная GeoIP-база (CSV диапазонов или .mmdb), опционально ---
+GEOIP_DB_PATH = os.environ.get("GEOIP_DB_PATH") or None
 
 try:
     ADMIN_USER_ID = int(os.environ.get("TG_ADMIN_ID"))
@@ -73,6 +81,102 @@ CPU_THRESHOLD = 90.0
 RAM_THRESHOLD = 90.0
 DISK_THRESHOLD = 95.0
 RESOURCE_ALERT_COOLDOWN = 1800
+# Гистерезис: "нормализация" только ниже этих порогов (core/metric_engine.py)
+CPU_RECOVERY_THRESHOLD = 80.0
+RAM_RECOVERY_THRESHOLD = 85.0
+DISK_RECOVERY_THRESHOLD = 90.0
+# Сколько секунд значение должно держаться выше порога до алерта
+CPU_ALERT_MIN_DURATION = 0      # CPU уже усредняется за CPU_ALERT_WINDOW
+RAM_ALERT_MIN_DURATION = 60
+DISK_ALERT_MIN_DURATION = 0
+
+# --- Диски (core/disk_monitor.py) ---
+DISK_DISCOVERY_INTERVAL = 10 * 60   # Как часто переобнаруживать разделы, сек
+DISK_TREND_WINDOW = 60 * 60         # Окно для оценки скорости роста, сек
+DISK_TREND_MIN_SAMPLES = 10         # Минимум точек для прогноза
+DISK_FULL_WARN_HOURS = 6            # Алерт, если раздел заполнится раньше, ч
+
+# --- Фоновый замер CPU (core/cpu_sampler.py) ---
+CPU_SAMPLE_INTERVAL = 5             # Период замера /proc/stat, сек
+CPU_SAMPLE_HISTORY = 15 * 60        # Глубина кольцевого буфера, сек
+CPU_ALERT_WINDOW = 5 * 60           # Алерт CPU — по средней загрузке за это окно, сек
+CPU_ALERT_MIN_COVERAGE = 0.8        # Доля окна, покрытая замерами, без которой среднее не сравнивается
+TOP_PROCESSES_COUNT = 5             # Процессов в алертах CPU/RAM (core/process_tracker.py)
+
+# --- Хранилище метрик (core/metrics_store.py) ---
+METRICS_STORE_INTERVAL = 60         # Период записи, сек
+METRICS_STORE_RETENTION_DAYS = 30   # Глубина истории (40 байт на запись, ~1.7 МБ)
+METRICS_STORE_CAPACITY = METRICS_STORE_RETENTION_DAYS * 86400 // METRICS_STORE_INTERVAL
+CHART_CACHE_TTL = 60                # Один рендер графика на (метрика, период) в минуту
+
+# --- Аномалии трафика (core/traffic_anomaly.py) ---
+TRAFFIC_ANOMALY_INTERVAL = 10       # Период замера счетчиков сети, сек
+TRAFFIC_ANOMALY_ALPHA = 0.01        # Вес нового замера в EWMA базовой линии
+TRAFFIC_ANOMALY_SIGMA = 4.0         # Алерт: выше среднего на столько стандартных отклонений
+TRAFFIC_ANOMALY_RECOVERY_SIGMA = 2.0  # Нормализация: ниже среднего + столько отклонений
+TRAFFIC_ANOMALY_MIN_DURATION = 60   # Сколько секунд аномалия должна держаться до алерта
+TRAFFIC_ANOMALY_WARMUP = 360        # Замеров в часовом слоте до первых алертов
+TRAFFIC_ANOMALY_MIN_MBPS = 20.0     # Ниже этой скорости алерт не нужен, Мбит/с
+TRAFFIC_ANOMALY_MIN_PPS = 5000      # Ниже этого числа пакетов алерт не нужен, пак/с
+TRAFFIC_BASELINE_SAVE_INTERVAL = 600  # Период сохранения базовых линий, сек
+
+# --- Слежение за логами (core/log_follower.py) ---
+LOG_FOLLOW_POLL_INTERVAL = 1.0      # Интервал опроса, если inotify недоступен, сек
+LOG_FOLLOW_SAFETY_INTERVAL = 10.0   # Проверка ротации при работающем inotify, сек
+LOG_CHECKPOINT_INTERVAL = 5.0       # Как часто сохранять позиции чтения, сек
+LOG_REPLAY_MAX_BYTES = 256 * 1024   # Максимум непрочитанного хвоста при перезапуске
+LOG_BUS_HISTORY_SIZE = 500          # Событий в истории каждого источника (core/log_bus.py)
+LOG_BUS_BACKLOG_BYTES = 512 * 1024  # Сколько байт хвоста читать для истории при старте
+LOG_JOURNAL_BACKLOG_ENTRIES = 2000  # Записей journald для истории при старте
+LOG_JOURNAL_REPLAY_MAX_AGE = 3600   # Записи journald старше (сек) при дочитывании не рассылаются
+
+# --- Сводки алертов (шторм банов/входов) ---
+ALERT_COALESCE_WINDOW = 60          # Окно группировки, сек
+ALERT_COALESCE_THRESHOLD = 3        # Столько событий в окне уходят сразу, остальные — в сводку
+ALERT_DIGEST_TOP_N = 5              # Строк в топе IP/стран сводки
+SUBSCRIPTIONS_SAVE_DELAY = 2.0      # Задержка записи подписок на алерты (core/subscriptions.py), сек
+
+# --- Рассылка алертов (core/delivery.py), лимиты Telegram Bot API ---
+DELIVERY_GLOBAL_RATE = 30           # Сообщений в секунду на весь бот
+DELIVERY_GLOBAL_BURST = 30          # Сообщений подряд без ожидания
+DELIVERY_CHAT_RATE = 1.0            # Сообщений в секунду в один чат
+DELIVERY_CHAT_BURST = 3             # Сообщений подряд в один чат
+DELIVERY_CONCURRENCY = 10           # Одновременных запросов sendMessage
+DELIVERY_MAX_RETRIES = 3            # Повторов после RetryAfter для одного чата
+DELIVERY_EDIT_MAX_AGE = 10          # Правка "живого" сообщения старше этого не отправляется, сек
+TELEMETRY_WINDOW_MINUTES = 60       # Окно статистики вызовов Bot API для /stats (core/bot_telemetry.py), мин
+LIVE_MESSAGE_MIN_INTERVAL = 3.0     # Не чаще одной правки "живого" сообщения за столько секунд (core/live_message.py)
+
+# --- Очередь исходящих (core/outbox.py) ---
+OUTBOX_BATCH_SIZE = 50              # Строк за один проход отправителя
+OUTBOX_LEASE = 300                  # Аренда строки на время отправки, сек
+OUTBOX_POLL_INTERVAL = 30           # Проверка очереди без сигналов (другой процесс), сек
+OUTBOX_BACKOFF_BASE = 5             # Первая задержка повтора, сек (x2 каждый раз)
+OUTBOX_BACKOFF_MAX = 600            # Максимальная задержка повтора, сек
+OUTBOX_MAX_AGE = 24 * 3600          # Не доставленное за это время не отправляется
+OUTBOX_SENT_RETENTION = 24 * 3600   # Сколько хранить отправленные (ключи идемпотентности), сек
+
+# --- Настройки общего HTTP-клиента (core/http_client.py) ---
+HTTP_TIMEOUT = 10              # Таймаут запроса по умолчанию, сек
+HTTP_RETRIES = 2               # Повторов при сетевой ошибке / 5xx / 429
+HTTP_RETRY_BACKOFF = 0.5       # Базовая задержка между повторами (x2 каждый раз)
+HTTP_POOL_LIMIT = 30           # Всего соединений в пуле
+HTTP_PER_HOST_LIMIT = 4        # Одновременных запросов к одному хосту
+HTTP_HOST_LIMITS = {"ip-api.com": 2}  # Индивидуальные лимиты по хостам
+
+# --- Настройки GeoIP-кеша ---
+GEOIP_API_URL = "http://ip-api.com"  # /json/<ip> и /batch
+GEOIP_BATCH_SIZE = 100                # Лимит ip-api.com на один batch-запрос
+GEOIP_CACHE_MAX_ITEMS = 5000          # Записей в памяти (LRU)
+GEOIP_CACHE_TTL = 7 * 24 * 3600       # Успешный ответ (страна найдена)
+GEOIP_CACHE_NEGATIVE_TTL = 3600       # Ответ API "fail" (приватный IP и т.п.)
+
+# --- Лимиты ip-api.com (бесплатный тариф) для планировщика GeoIP ---
+GEOIP_RATE_LIMIT = 45                 # Запросов /json в минуту
+GEOIP_RATE_BURST = 10                 # Запросов /json подряд без ожидания
+GEOIP_BATCH_RATE_LIMIT = 15           # Запросов /batch в минуту
+GEOIP_BATCH_RATE_BURST = 3            # Запросов /batch подряд без ожидания
+GEOIP_MAX_WAIT = 3.0                  # Сколько ждать ответа, если бюджет есть, сек
 
 # --- Настройка логирования ---
 # --- ИСПРАВЛЕНО: Функция setup_logging ---
@@ -0,0 +1,116 @@
+# /opt-tg-bot/core/cpu_sampler.py
+import math
+import time
+import asyncio
+import logging
+from array import array
+from typing import NamedTuple
+
+import psutil
+
+from .utils import get_host_path
+from .config import CPU_SAMPLE_INTERVAL, CPU_SAMPLE_HISTORY
+
+
+class CpuStats(NamedTuple):
+    """Загрузка CPU (%) за окно."""
+    avg: float
+    max: float
+    p95: float
+    samples: int
+
+
+def _read_proc_stat() -> tuple[int, int]:
+    """(занято, всего) в тиках по первой строке /proc/stat."""
+    with open(get_host_path("/proc/stat"), "rb") as f:
+        fields = f.readline().split()
+    # cpu user nice system idle iowait irq softirq steal (guest уже входит в user)
+    values = [int(value) for value in fields[1:9]]
+    total = sum(values)
+    idle = values[3] + (values[4] if len(values) > 4 else 0)
+    return total - idle, total
+
+
+class CpuSampler:
+    """
+    Фоновый замер загрузки CPU по разнице счетчиков /proc/stat каждые
+    `interval` секунд. Значения лежат в кольцевом буфере фиксированного
+    размера (array), по нему считаются avg/max/p95 за скользящие окна.
+    """
+
+    def __init__(self, interval: float, history: float):
+        self.interval = interval
+        self.capacity = max(1, int(history // interval) + 1)
+        self._values = array("d", bytes(8 * self.capacity))
+        self._times = array("d", bytes(8 * self.capacity))
+        self._next = 0
+        self._count = 0
+        self._prev = None
+        self._use_psutil = False
+
+    def _measure(self) -> float | None:
+        if not self._use_psutil:
+            try:
+                busy, total = _read_proc_stat()
+            except (OSError, ValueError, IndexError) as e:
+                logging.warning(
+                    f"CpuSampler: /proc/stat недоступен ({e}), использую psutil.")
+                self._use_psutil = True
+                psutil.cpu_percent(interval=None)
+                return None
+            prev, self._prev = self._prev, (busy, total)
+            if prev is None or total <= prev[1]:
+                return None
+            return 100.0 * (busy - prev[0]) / (total - prev[1])
+        return psutil.cpu_percent(interval=None)
+
+    def sample(self):
+        """Один замер (быстрый, без ожидания)."""
+        value = self._measure()
+        if value is None:
+            return
+        self._values[self._next] = min(100.0, max(0.0, value))
+        self._times[self._next] = time.monotonic()
+        self._next = (self._next + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def current(self) -> float | None:
+        """Последнее значение (или None, пока замеров нет)."""
+        if not self._count:
+            return None
+        return self._values[self._next - 1]
+
+    def stats(self, window: float) -> CpuStats | None:
+        """avg/max/p95 за последние `window` секунд (или None без данных)."""
+        border = time.monotonic() - window
+        values = []
+        index = self._next
+        for _ in range(self._count):
+            index = (index - 1) % self.capacity
+            if self._times[index] < border:
+                break
+            values.append(self._values[index])
+        if not values:
+            return None
+        values.sort()
+        p95 = values[max(0, math.ceil(0.95 * len(values)) - 1)]
+        return CpuStats(sum(values) / len(values), values[-1], p95, len(values))
+
+    def load_windows(self) -> dict[int, CpuStats | None]:
+        """Статистика за 1/5/15 минут (как load average)."""
+        return {minutes: self.stats(minutes * 60) for minutes in (1, 5, 15)}
+
+    async def run(self):
+        logging.info(f"CpuSampler запущен (каждые {self.interval} сек).")
+        try:
+            while True:
+                try:
+                    self.sample()
+                except Exception as e:
+                    logging.error(f"CpuSampler: ошибка замера: {e}")
+                await asyncio.sleep(self.interval)
+        except asyncio.CancelledError:
+            logging.info("CpuSampler остановлен.")
+
+
+CPU_SAMPLER = CpuSampler(CPU_SAMPLE_INTERVAL, CPU_SAMPLE_HISTORY)
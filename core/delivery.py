@@ -0,0 +1,276 @@
+# /opt-tg-bot/core/delivery.py
+import time
+import asyncio
+import logging
+from collections import deque
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+)
+
+from .rate_limit import TokenBucket
+from .bot_telemetry import BOT_TELEMETRY, OUTBOX_DELIVERY
+from .outbox import (
+    OUTBOX, Outbox, OutboxItem, SENT, FAILED,
+    PRIORITY_CRITICAL, PRIORITY_NORMAL, PRIORITY_BULK
+)
+from .config import (
+    DELIVERY_GLOBAL_RATE, DELIVERY_GLOBAL_BURST, DELIVERY_CHAT_RATE,
+    DELIVERY_CHAT_BURST, DELIVERY_CONCURRENCY, DELIVERY_MAX_RETRIES,
+    DELIVERY_EDIT_MAX_AGE, OUTBOX_BATCH_SIZE, OUTBOX_LEASE, OUTBOX_POLL_INTERVAL
+)
+
+RETRY = "retry"
+
+
+class PriorityLimiter:
+    """
+    Раздает токены общего bucket'а по приоритетам: пока ждет хоть один
+    запрос с меньшим номером (PRIORITY_CRITICAL), более низкие классы
+    не обслуживаются. Внутри класса — по очереди.
+    """
+
+    def __init__(self, bucket: TokenBucket):
+        self._bucket = bucket
+        self._queues = {priority: deque() for priority in
+                        (PRIORITY_CRITICAL, PRIORITY_NORMAL, PRIORITY_BULK)}
+        self._dispatcher: asyncio.Task | None = None
+
+    def _head(self) -> deque | None:
+        """Очередь самого приоритетного ожидающего (отмененные выбрасываются)."""
+        for queue in self._queues.values():
+            while queue and queue[0].done():
+                queue.popleft()
+            if queue:
+                return queue
+        return None
+
+    async def acquire(self, priority: int):
+        if self._head() is None and self._bucket.try_acquire():
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._queues[priority].append(future)
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(
+                self._dispatch(), name="delivery_limiter")
+        await future
+
+    async def _dispatch(self):
+        while (queue := self._head()) is not None:
+            wait = self._bucket.delay()
+            if wait > 0:
+                # Ждущий выбирается заново после паузы: мог прийти более важный
+                await asyncio.sleep(wait)
+                continue
+            if self._bucket.try_acquire():
+                queue.popleft().set_result(None)
+
+
+class _PendingEdit:
+    __slots__ = ("params", "created")
+
+    def __init__(self, params: dict):
+        self.params = params
+        self.created = time.monotonic()
+
+
+class MessageDelivery:
+    """
+    Все исходящие вызовы Bot API для рассылок и "живых" сообщений.
+    Общий лимит бота раздается по приоритетам (PriorityLimiter), у каждого
+    чата свой bucket. RetryAfter ставит на паузу только свой чат.
+    Правки одного сообщения, ждущие бюджета, сливаются в последнюю,
+    а устаревшие (старше DELIVERY_EDIT_MAX_AGE) не отправляются.
+    """
+
+    def __init__(self, global_bucket: TokenBucket, chat_rate: float,
+                 chat_burst: float, concurrency: int, max_retries: int):
+        self._limiter = PriorityLimiter(global_bucket)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._chats: dict[int, TokenBucket] = {}
+        self._edits: dict[tuple[int, int], _PendingEdit] = {}
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    async def send(self, bot: Bot, chat_id: int, text: str,
+                   parse_mode: str | None = "HTML",
+                   priority: int = PRIORITY_NORMAL) -> tuple[str, str | None, int | None]:
+        """
+        Отправляет одно сообщение с учетом лимитов.
+        Возвращает (SENT | FAILED | RETRY, текст ошибки, message_id): FAILED — повтор
+        бессмысленен (чат не найден, бот заблокирован), RETRY — стоит повторить позже.
+        """
+        bucket = self._chat_bucket(chat_id)
+        for _attempt in range(self.max_retries + 1):
+            await bucket.acquire()
+            await self._limiter.acquire(priority)
+            try:
+                async with self._semaphore:
+                    sent_message = await bot.send_message(chat_id, text, parse_mode=parse_mode)
+                return SENT, None, sent_message.message_id
+            except TelegramRetryAfter as e:
+                logging.warning(
+                    f"Рассылка: RetryAfter для {chat_id}, пауза чата {e.retry_after}с")
+                bucket.pause(e.retry_after)
+            except (TelegramBadRequest, TelegramForbiddenError) as e:
+                if isinstance(e, TelegramForbiddenError) or "chat not found" in str(e):
+                    logging.warning(
+                        f"Не удалось отправить алерт пользователю {chat_id}: чат не найден или бот заблокирован.")
+                else:
+                    logging.error(
+                        f"Неизвестная ошибка TelegramBadRequest при отправке алерта {chat_id}: {e}")
+                return FAILED, str(e), None
+            except Exception as e:
+                # Сеть, 5xx и т.п. — сообщение останется в очереди
+                logging.error(f"Ошибка при отправке алерта пользователю {chat_id}: {e}")
+                return RETRY, str(e), None
+        return RETRY, "RetryAfter", None
+
+    async def edit(self, bot: Bot, chat_id: int, message_id: int, text: str,
+                   priority: int = PRIORITY_BULK, **kwargs) -> bool:
+        """
+        Правка "живого" сообщения (edit_message_text). Если правка этого же
+        сообщения уже ждет бюджета — подменяет ее текст и возвращает False.
+        False также — правка устарела или чат на паузе после RetryAfter.
+        Остальные ошибки Bot API пробрасываются вызывающему.
+        """
+        key = (chat_id, message_id)
+        params = dict(chat_id=chat_id, message_id=message_id, text=text, **kwargs)
+        pending = self._edits.get(key)
+        if pending is not None:
+            pending.params = params
+            pending.created = time.monotonic()
+            return False
+        pending = self._edits[key] = _PendingEdit(params)
+        bucket = self._chat_bucket(chat_id)
+        try:
+            await bucket.acquire()
+            await self._limiter.acquire(priority)
+        finally:
+            del self._edits[key]
+        if time.monotonic() - pending.created > DELIVERY_EDIT_MAX_AGE:
+            logging.debug(f"Правка {key} устарела в очереди и пропущена")
+            return False
+        try:
+            async with self._semaphore:
+                await bot.edit_message_text(**pending.params)
+        except TelegramRetryAfter as e:
+            logging.warning(f"Правка {key}: RetryAfter, пауза чата {e.retry_after}с")
+            bucket.pause(e.retry_after)
+            return False
+        return True
+
+
+class OutboxSender:
+    """
+    Фоновая задача: разбирает очередь исходящих (core/outbox.py) через
+    MessageDelivery. Строки забираются по приоритету и отправляются
+    параллельно (до OUTBOX_BATCH_SIZE сразу), поэтому новый критический
+    алерт не ждет, пока уйдет уже взятая пачка. Аренда строк, которые еще
+    отправляются, продлевается, чтобы их не забрал второй раз watchdog.
+    Недоставленное повторяется с экспоненциальной задержкой, оставшееся
+    с прошлого запуска — при старте.
+    """
+
+    def __init__(self, outbox: Outbox, delivery: MessageDelivery):
+        self.outbox = outbox
+        self.delivery = delivery
+        self._wakeup = asyncio.Event()
+        self._in_flight: dict[asyncio.Task, int] = {}  # Задача -> id строки
+
+    def wake(self):
+        """Сигнал: в очереди появились новые сообщения."""
+        self._wakeup.set()
+
+    async def _deliver(self, bot: Bot, item: OutboxItem):
+        status, error, message_id = await self.delivery.send(
+            bot, item.chat_id, item.text, item.parse_mode, item.priority)
+        # Время от постановки в очередь до доставки — для /stats
+        if status == SENT:
+            BOT_TELEMETRY.record(OUTBOX_DELIVERY, time.time() - item.created_at)
+            text = await asyncio.to_thread(self.outbox.mark_sent, item.id, message_id)
+            if text is not None and text != item.text:
+                # Текст уточнили, пока сообщение отправлялось (флаг страны)
+                await self.edit_sent(bot, item.chat_id, message_id, text,
+                                     item.priority, item.parse_mode)
+        elif status == FAILED:
+            BOT_TELEMETRY.record(OUTBOX_DELIVERY, time.time() - item.created_at, "failed")
+            await asyncio.to_thread(self.outbox.mark_failed, item.id, error)
+        else:
+            await asyncio.to_thread(self.outbox.retry, item.id, error)
+
+    async def edit_sent(self, bot: Bot, chat_id: int, message_id: int, text: str,
+                        priority: int = PRIORITY_NORMAL, parse_mode: str | None = "HTML"):
+        """Правка уже доставленного алерта; ошибка только логируется."""
+        try:
+            edited = await self.delivery.edit(
+                bot, chat_id, message_id, text, priority=priority, parse_mode=parse_mode)
+        except TelegramBadRequest as e:
+            if "message is not modified" not in str(e).lower():
+                logging.warning(f"Не удалось поправить алерт {chat_id}/{message_id}: {e}")
+            return
+        except Exception as e:
+            logging.warning(f"Не удалось поправить алерт {chat_id}/{message_id}: {e}")
+            return
+        if not edited:
+            logging.debug(f"Правка алерта {chat_id}/{message_id} не отправлена (лимит Bot API)")
+
+    def _done(self, task: asyncio.Task):
+        self._in_flight.pop(task, None)
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f"Ошибка отправки из очереди исходящих: {task.exception()}")
+        self._wakeup.set()  # Освободилось место — можно забрать еще
+
+    async def run(self, bot: Bot):
+        logging.info("Отправитель очереди исходящих запущен.")
+        purged_at = 0.0
+        renewed_at = time.monotonic()
+        try:
+            while True:
+                if time.monotonic() - purged_at > 3600:
+                    await asyncio.to_thread(self.outbox.purge)
+                    purged_at = time.monotonic()
+                if time.monotonic() - renewed_at > OUTBOX_LEASE / 3:
+                    await asyncio.to_thread(
+                        self.outbox.extend_lease, list(self._in_flight.values()), OUTBOX_LEASE)
+                    renewed_at = time.monotonic()
+                self._wakeup.clear()
+                room = OUTBOX_BATCH_SIZE - len(self._in_flight)
+                if room <= 0:
+                    timeout = OUTBOX_POLL_INTERVAL
+                else:
+                    items = await asyncio.to_thread(self.outbox.claim_due, room, OUTBOX_LEASE)
+                    for item in items:
+                        task = asyncio.create_task(self._deliver(bot, item))
+                        self._in_flight[task] = item.id
+                        task.add_done_callback(self._done)
+                    if items:
+                        continue
+                    delay = await asyncio.to_thread(self.outbox.next_due_in)
+                    timeout = OUTBOX_POLL_INTERVAL if delay is None else min(delay, OUTBOX_POLL_INTERVAL)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            logging.info("Отправитель очереди исходящих остановлен.")
+        finally:
+            # Взятые строки вернутся в очередь по истечении аренды
+            for task in list(self._in_flight):
+                task.cancel()
+            self.outbox.close()
+
+
+DELIVERY = MessageDelivery(
+    TokenBucket(DELIVERY_GLOBAL_RATE, DELIVERY_GLOBAL_BURST),
+    DELIVERY_CHAT_RATE, DELIVERY_CHAT_BURST, DELIVERY_CONCURRENCY,
+    DELIVERY_MAX_RETRIES)
+OUTBOX_SENDER = OutboxSender(OUTBOX, DELIVERY)
@@ -0,0 +1,168 @@
+# /opt-tg-bot/core/disk_monitor.py
+import time
+import logging
+import functools
+from collections import deque
+
+import psutil
+
+from .i18n import _
+from .utils import get_host_path, format_traffic, format_uptime, escape_html
+from .metric_engine import MetricEngine, MetricRule, MetricAlert, Sample
+from .config import (
+    DEPLOY_MODE, INSTALL_MODE, DISK_THRESHOLD, DISK_RECOVERY_THRESHOLD,
+    DISK_ALERT_MIN_DURATION, RESOURCE_ALERT_COOLDOWN, DISK_DISCOVERY_INTERVAL,
+    DISK_TREND_WINDOW, DISK_TREND_MIN_SAMPLES, DISK_FULL_WARN_HOURS
+)
+
+# Файловые системы реальных разделов (tmpfs, overlay, squashfs и т.п. пропускаем)
+_REAL_FS = {"ext2", "ext3", "ext4", "xfs", "btrfs", "zfs", "f2fs", "reiserfs",
+            "jfs", "vfat", "exfat", "ntfs", "ntfs3", "fuseblk", "bcachefs"}
+
+
+def _read_mounts(path: str) -> list[tuple[str, str, str]]:
+    """(устройство, точка монтирования, ФС) из файла формата /proc/mounts."""
+    entries = []
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) >= 3:
+                # Пробелы в путях экранированы как \040
+                entries.append((fields[0], fields[1].replace("\\040", " "), fields[2]))
+    return entries
+
+
+def discover_mountpoints() -> dict[str, str]:
+    """
+    Точки монтирования хоста: {точка монтирования: путь для disk_usage}.
+    В режиме docker-root читаются монтирования хоста (PID 1), а не контейнера.
+    """
+    if DEPLOY_MODE == "docker" and INSTALL_MODE == "root":
+        entries = _read_mounts(get_host_path("/proc/1/mounts"))
+    else:
+        entries = [(p.device, p.mountpoint, p.fstype)
+                   for p in psutil.disk_partitions(all=False)]
+    mounts = {}
+    by_device = {}
+    for device, mountpoint, fstype in entries:
+        if fstype not in _REAL_FS:
+            continue
+        # Один раздел может быть смонтирован несколько раз (bind) — берем кратчайший путь
+        previous = by_device.get(device)
+        if previous is not None:
+            if len(previous) <= len(mountpoint):
+                continue
+            del mounts[previous]
+        by_device[device] = mountpoint
+        mounts[mountpoint] = get_host_path(mountpoint)
+    return mounts or {"/": get_host_path("/")}
+
+
+def growth_rate(samples) -> float | None:
+    """Наклон линейной регрессии (байт/сек) по точкам (время, занято байт)."""
+    n = len(samples)
+    if n < DISK_TREND_MIN_SAMPLES:
+        return None
+    mean_t = sum(t for t, _u in samples) / n
+    mean_u = sum(u for _t, u in samples) / n
+    var_t = sum((t - mean_t) ** 2 for t, _u in samples)
+    if var_t == 0:
+        return None
+    return sum((t - mean_t) * (u - mean_u) for t, u in samples) / var_t
+
+
+class _Trend:
+    def __init__(self):
+        self.samples: deque[tuple[float, int]] = deque()
+        self.active = False
+        self.last_alert = 0.0
+
+
+class DiskMonitor:
+    """
+    Все реальные разделы хоста: по каждому — правило порога в MetricEngine
+    и прогноз заполнения по скорости роста за DISK_TREND_WINDOW секунд.
+    """
+
+    def __init__(self):
+        self.mounts: dict[str, str] = {}
+        self._discovered_at = None
+        self._trends: dict[str, _Trend] = {}
+        self._snapshot = (0.0, {})
+        self._evaluated_at = 0.0
+
+    def sync_rules(self, engine: MetricEngine):
+        """Периодически переобнаруживает разделы и обновляет правила порога."""
+        if self._discovered_at is not None and \
+                time.monotonic() - self._discovered_at < DISK_DISCOVERY_INTERVAL:
+            return
+        self._discovered_at = time.monotonic()
+        try:
+            mounts = discover_mountpoints()
+        except OSError as e:
+            logging.error(f"DiskMonitor: не удалось получить список разделов: {e}")
+            return
+        for mount in set(self.mounts) - set(mounts):
+            engine.unregister(f"disk:{mount}")
+            self._trends.pop(mount, None)
+        for mount in set(mounts) - set(self.mounts):
+            engine.register(MetricRule(
+                f"disk:{mount}", functools.partial(self._percent, mount),
+                DISK_THRESHOLD, DISK_RECOVERY_THRESHOLD, DISK_ALERT_MIN_DURATION,
+                key="disk", params={"mount": escape_html(mount)}))
+        if set(mounts) != set(self.mounts):
+            logging.info(f"DiskMonitor: разделы {', '.join(sorted(mounts))}")
+        self.mounts = mounts
+
+    def read_usage(self) -> dict:
+        """Проба для Sample: использование всех разделов (один раз за тик)."""
+        usage = {}
+        for mount, path in self.mounts.items():
+            try:
+                usage[mount] = psutil.disk_usage(path)
+            except OSError as e:
+                logging.debug(f"DiskMonitor: {mount} недоступен: {e}")
+        self._snapshot = (time.time(), usage)
+        return usage
+
+    def _percent(self, mount: str, sample: Sample) -> float | None:
+        usage = sample.read(self.read_usage).get(mount)
+        return usage.percent if usage else None
+
+    def evaluate_trends(self, lang: str) -> list[MetricAlert]:
+        """Прогноз заполнения по последнему снимку; возвращает алерты."""
+        now, usage = self._snapshot
+        if now == self._evaluated_at:
+            return []
+        self._evaluated_at = now
+        warn_seconds = DISK_FULL_WARN_HOURS * 3600
+        messages = []
+        for mount, disk in usage.items():
+            trend = self._trends.setdefault(mount, _Trend())
+            trend.samples.append((now, disk.used))
+            while trend.samples[0][0] < now - DISK_TREND_WINDOW:
+                trend.samples.popleft()
+            rate = growth_rate(trend.samples)
+            eta = disk.free / rate if rate and rate > 0 else None
+
+            if eta is not None and eta <= warn_seconds:
+                if trend.active and now - trend.last_alert <= RESOURCE_ALERT_COOLDOWN:
+                    continue
+                messages.append(MetricAlert(f"disk_trend:{mount}:high:{now:.0f}", _(
+                    "alert_disk_trend", lang, mount=escape_html(mount),
+                    eta=format_uptime(eta // 60 * 60, lang),
+                    rate=format_traffic(rate * 3600, lang),
+                    free=format_traffic(disk.free, lang), usage=disk.percent)))
+                logging.info(f"Сгенерирован алерт прогноза заполнения {mount} (~{eta / 3600:.1f} ч).")
+                trend.active = True
+                trend.last_alert = now
+            elif trend.active and (eta is None or eta > 2 * warn_seconds):
+                messages.append(MetricAlert(f"disk_trend:{mount}:normal:{now:.0f}", _(
+                    "alert_disk_trend_normal", lang,
+                    mount=escape_html(mount), usage=disk.percent)))
+                logging.info(f"Сгенерирован алерт нормализации роста {mount}.")
+                trend.active = False
+        return messages
+
+
+DISK_MONITOR = DiskMonitor()
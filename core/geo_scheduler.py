@@ -0,0 +1,252 @@
+# /opt-tg-bot/core/geo_scheduler.py
+import heapq
+import asyncio
+import logging
+import itertools
+
+import aiohttp
+
+from . import geoip
+from . import http_client
+from .rate_limit import TokenBucket
+from .config import (
+    GEOIP_API_URL, GEOIP_BATCH_SIZE, GEOIP_RATE_LIMIT, GEOIP_RATE_BURST,
+    GEOIP_BATCH_RATE_LIMIT, GEOIP_BATCH_RATE_BURST, GEOIP_MAX_WAIT
+)
+
+# Приоритеты (меньше — раньше)
+PRIORITY_ALERT = 0        # Строки уведомлений, которые отправляются прямо сейчас
+PRIORITY_INTERACTIVE = 1  # Ответы на команды (selftest, speedtest)
+PRIORITY_HISTORY = 2      # Рендер истории (/sshlog, /fail2ban)
+
+
+def store_api_result(identifier: str, data: dict) -> tuple[str | None, str | None]:
+    """Разбирает ответ ip-api.com, кладет результат в GEO_CACHE и возвращает (code, name)."""
+    if data.get("status") != "success":
+        logging.warning(
+            f"API ip-api.com вернул статус '{data.get('status')}' для {identifier}")
+        geoip.GEO_CACHE.set(identifier, None, None)
+        return None, None
+
+    country_code = data.get("countryCode")
+    if not (country_code and len(country_code)
+            == 2 and country_code.isalpha()):
+        logging.warning(
+            f"Некорректный countryCode '{country_code}' от API для {identifier}")
+        country_code = None
+    country_name = data.get("country") or None
+
+    geoip.GEO_CACHE.set(identifier, country_code, country_name)
+    return country_code, country_name
+
+
+class GeoLookupScheduler:
+    """
+    Единственная точка обращения к ip-api.com.
+    Промахи кеша ставятся в очередь с приоритетом; фоновый обработчик
+    разбирает ее, расходуя токены двух bucket'ов (/json и /batch)
+    и учитывая 429 и заголовки X-Rl / X-Ttl.
+    Одинаковые адреса в очереди и в работе не дублируются.
+    """
+
+    def __init__(self, single_bucket: TokenBucket, batch_bucket: TokenBucket,
+                 max_wait: float):
+        self._single = single_bucket
+        self._batch = batch_bucket
+        self.max_wait = max_wait
+        self._heap: list[tuple[int, int, str]] = []
+        self._queued: dict[str, int] = {}  # identifier -> приоритет (ждет в очереди)
+        # identifier -> future (в очереди или в работе)
+        self._futures: dict[str, asyncio.Future] = {}
+        self._seq = itertools.count()
+        self._wakeup: asyncio.Event | None = None
+        self._worker: asyncio.Task | None = None
+
+    def has_budget(self) -> bool:
+        return self._single.available() >= 1 or self._batch.available() >= 1
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.create_task(
+                self._run(), name="geoip_scheduler")
+
+    def _enqueue(self, identifier: str, priority: int):
+        queued_priority = self._queued.get(identifier)
+        if identifier in self._futures:
+            # Уже в работе или в очереди с тем же/более высоким приоритетом
+            if queued_priority is None or queued_priority <= priority:
+                return
+        else:
+            self._futures[identifier] = asyncio.get_running_loop().create_future()
+        # Старая запись в куче (если была) будет пропущена в _pop
+        self._queued[identifier] = priority
+        heapq.heappush(self._heap, (priority, next(self._seq), identifier))
+
+    def _pop(self, limit: int) -> list[tuple[str, int]]:
+        taken = []
+        while self._heap and len(taken) < limit:
+            priority, _seq, identifier = heapq.heappop(self._heap)
+            if self._queued.get(identifier) != priority:
+                continue
+            del self._queued[identifier]
+            taken.append((identifier, priority))
+        return taken
+
+    def submit(self, identifiers: list[str],
+               priority: int = PRIORITY_INTERACTIVE) -> dict[str, asyncio.Future]:
+        """
+        Ставит адреса в очередь без ожидания. Future завершается
+        (code, name) или None (не удалось узнать сейчас).
+        """
+        self._ensure_worker()
+        for identifier in identifiers:
+            self._enqueue(identifier, priority)
+        self._wakeup.set()
+        return {identifier: self._futures[identifier]
+                for identifier in identifiers}
+
+    async def resolve(self, identifiers: list[str],
+                      priority: int = PRIORITY_INTERACTIVE) -> dict[str, tuple | None]:
+        """
+        Возвращает {identifier: (code, name) | None}.
+        None — результат еще не готов: бюджет исчерпан или ответ не пришел
+        за max_wait. Такие адреса остаются в очереди и попадут в кеш позже.
+        """
+        if not identifiers:
+            return {}
+        futures = self.submit(identifiers, priority)
+
+        if self.has_budget():
+            await asyncio.wait(futures.values(), timeout=self.max_wait)
+        else:
+            logging.debug(
+                f"GeoIP: лимит ip-api.com исчерпан, {len(futures)} адресов в очереди")
+        return {identifier: future.result() if future.done() else None
+                for identifier, future in futures.items()}
+
+    def _choose_bucket(self) -> TokenBucket:
+        # Один адрес — /json, несколько — /batch; если нужный бюджет пуст,
+        # а другой нет — используем другой
+        single_ready = self._single.available() >= 1
+        batch_ready = self._batch.available() >= 1
+        if len(self._queued) == 1:
+            return self._single if single_ready or not batch_ready else self._batch
+        return self._batch if batch_ready or not single_ready else self._single
+
+    @staticmethod
+    def _limit_pause(headers, limited: bool = False) -> float | None:
+        """
+        Сколько секунд ждать по заголовкам ip-api.com: X-Rl — остаток запросов,
+        X-Ttl — секунд до сброса окна. limited=True — ответ 429.
+        """
+        try:
+            remaining = headers.get("X-Rl")
+            if limited or (remaining is not None and int(remaining) <= 0):
+                return float(headers.get("X-Ttl") or 60)
+        except (TypeError, ValueError):
+            if limited:
+                return 60.0
+        return None
+
+    async def _fetch_single(self, identifier: str) -> dict:
+        data, headers = await http_client.get_json(
+            f"{GEOIP_API_URL}/json/{identifier}?fields=status,countryCode,country",
+            timeout=2, retries=0, with_headers=True)
+        pause = self._limit_pause(headers)
+        if pause:
+            self._single.pause(pause)
+        return {identifier: store_api_result(identifier, data)}
+
+    async def _fetch_batch(self, identifiers: list[str]) -> dict:
+        batch_data, headers = await http_client.post_json(
+            f"{GEOIP_API_URL}/batch?fields=status,countryCode,country,query",
+            identifiers, timeout=5, retries=0, with_headers=True)
+        pause = self._limit_pause(headers)
+        if pause:
+            self._batch.pause(pause)
+        # Адреса, пропущенные в ответе API, считаются неразрешенными (None, не кешируются)
+        results = {}
+        for identifier, data in zip(identifiers, batch_data):
+            results[identifier] = store_api_result(identifier, data)
+        logging.debug(
+            f"GeoIP batch: разрешено {len(identifiers)} адресов одним запросом.")
+        return results
+
+    async def _run(self):
+        while True:
+            if not self._queued:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            bucket = self._choose_bucket()
+            await bucket.acquire()
+            taken = self._pop(1 if bucket is self._single else GEOIP_BATCH_SIZE)
+            if not taken:
+                continue
+            identifiers = [identifier for identifier, _priority in taken]
+
+            try:
+                if bucket is self._single:
+                    results = await self._fetch_single(identifiers[0])
+                else:
+                    results = await self._fetch_batch(identifiers)
+            except asyncio.CancelledError:
+                raise
+            except aiohttp.ClientResponseError as e:
+                if e.status != 429:
+                    logging.warning(
+                        f"GeoIP: HTTP ошибка {e.status} для {len(identifiers)} адресов: {e}")
+                    results = {}
+                else:
+                    pause = self._limit_pause(e.headers or {}, limited=True)
+                    bucket.pause(pause)
+                    logging.warning(
+                        f"GeoIP: ip-api.com ответил 429, пауза {pause:.0f}с, "
+                        f"{len(identifiers)} адресов возвращены в очередь")
+                    for identifier, priority in taken:
+                        self._queued[identifier] = priority
+                        heapq.heappush(
+                            self._heap, (priority, next(self._seq), identifier))
+                    continue
+            except asyncio.TimeoutError:
+                logging.warning(
+                    f"GeoIP: тайм-аут запроса для {len(identifiers)} адресов")
+                results = {}
+            except Exception as e:
+                logging.warning(
+                    f"GeoIP: ошибка запроса для {len(identifiers)} адресов: {e}")
+                results = {}
+
+            # Ответы уже в памяти кеша, на диск — одной транзакцией в потоке
+            await asyncio.to_thread(geoip.GEO_CACHE.flush)
+
+            # API не ответил по адресу (пропуск в batch, HTTP/сетевая ошибка) —
+            # None: "не удалось узнать сейчас" (⏳), не кешируется, спросим позже
+            for identifier in identifiers:
+                future = self._futures.pop(identifier, None)
+                if future is not None and not future.done():
+                    future.set_result(results.get(identifier))
+
+    async def close(self):
+        """Останавливает обработчик очереди (при остановке бота)."""
+        if self._worker is not None and not self._worker.done():
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self._worker = None
+        for future in self._futures.values():
+            if not future.done():
+                future.set_result(None)
+        self._futures.clear()
+        self._queued.clear()
+        self._heap.clear()
+
+
+GEO_SCHEDULER = GeoLookupScheduler(
+    TokenBucket(GEOIP_RATE_LIMIT / 60, GEOIP_RATE_BURST),
+    TokenBucket(GEOIP_BATCH_RATE_LIMIT / 60, GEOIP_BATCH_RATE_BURST),
+    GEOIP_MAX_WAIT)
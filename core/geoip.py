@@ -0,0 +1,349 @@
+# /opt-tg-bot/core/geoip.py
+import os
+import csv
+import json
+import mmap
+import time
+import bisect
+import struct
+import sqlite3
+import logging
+import ipaddress
+import threading
+from collections import OrderedDict
+
+# --- Опциональная зависимость для .mmdb ---
+try:
+    import maxminddb
+    MAXMINDDB_AVAILABLE = True
+except ImportError:
+    MAXMINDDB_AVAILABLE = False
+# ------------------------------------------
+
+from .config import (
+    GEOIP_CACHE_FILE, GEOIP_CACHE_MAX_ITEMS, GEOIP_CACHE_TTL,
+    GEOIP_CACHE_NEGATIVE_TTL, GEOIP_DB_PATH, GEOIP_COMPILED_FILE
+)
+
+
+class GeoCache:
+    """
+    Кеш результатов GeoIP: LRU в памяти + sqlite на диске.
+    Запись: (country_code | None, country_name | None, expires_at).
+    country_code = None означает "отрицательный" результат (API вернул fail).
+    get_memory() не трогает диск и годится для event loop; get()/get_many()
+    и flush() работают с sqlite — из async-кода их вызывают через
+    asyncio.to_thread. set() кладет запись в память, на диск она уходит
+    пачкой при flush().
+    """
+
+    def __init__(self, db_path: str, max_items: int, ttl: int,
+                 negative_ttl: int):
+        self.db_path = db_path
+        self.max_items = max_items
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._memory = OrderedDict()
+        self._pending: dict[str, tuple] = {}  # Еще не записанные на диск
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _get_conn(self):
+        # Вызывается только под self._lock
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            self._conn = sqlite3.connect(
+                self.db_path, check_same_thread=False)
+            # WAL + synchronous=NORMAL: fsync только при checkpoint, а не на каждый commit
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS geo ("
+                "key TEXT PRIMARY KEY, code TEXT, name TEXT, "
+                "expires_at REAL NOT NULL)")
+            deleted = self._conn.execute(
+                "DELETE FROM geo WHERE expires_at < ?", (time.time(),)).rowcount
+            self._conn.commit()
+            logging.info(
+                f"GeoIP-кеш открыт: {self.db_path} (удалено устаревших: {deleted})")
+        return self._conn
+
+    def _remember(self, key: str, entry: tuple):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+    def _memory_get(self, key: str, now: float) -> tuple | None:
+        # Вызывается только под self._lock
+        entry = self._memory.get(key)
+        if entry is not None:
+            if entry[2] > now:
+                self._memory.move_to_end(key)
+                return entry[0], entry[1]
+            del self._memory[key]
+        return None
+
+    def get_memory(self, key: str) -> tuple | None:
+        """Только LRU в памяти, без обращения к диску."""
+        with self._lock:
+            return self._memory_get(key, time.time())
+
+    def get(self, key: str) -> tuple | None:
+        """Возвращает (code, name) или None, если записи нет/она устарела (блокирующая)."""
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: list[str]) -> dict[str, tuple]:
+        """Найденные записи {key: (code, name)}: память, затем один запрос к sqlite."""
+        now = time.time()
+        found = {}
+        with self._lock:
+            misses = []
+            for key in keys:
+                cached = self._memory_get(key, now)
+                if cached is not None:
+                    found[key] = cached
+                else:
+                    misses.append(key)
+            if not misses:
+                return found
+            try:
+                placeholders = ",".join("?" * len(misses))
+                rows = self._get_conn().execute(
+                    "SELECT key, code, name, expires_at FROM geo "
+                    f"WHERE key IN ({placeholders}) AND expires_at > ?",
+                    (*misses, now)).fetchall()
+            except sqlite3.Error as e:
+                logging.warning(f"GeoIP-кеш: ошибка чтения ({len(misses)} адресов): {e}")
+                return found
+            for key, code, name, expires_at in rows:
+                self._remember(key, (code, name, expires_at))
+                found[key] = (code, name)
+        return found
+
+    def set(self, key: str, code: str | None, name: str | None):
+        """Сохраняет результат в памяти (на диск — при flush). code=None — отрицательный результат."""
+        ttl = self.ttl if code else self.negative_ttl
+        entry = (code, name, time.time() + ttl)
+        with self._lock:
+            self._remember(key, entry)
+            self._pending[key] = entry
+
+    def flush(self):
+        """Записывает накопленные set() одной транзакцией (блокирующая)."""
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+            try:
+                conn = self._get_conn()
+                conn.executemany(
+                    "INSERT OR REPLACE INTO geo (key, code, name, expires_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    [(key, *entry) for key, entry in pending.items()])
+                conn.commit()
+            except sqlite3.Error as e:
+                logging.warning(f"GeoIP-кеш: ошибка записи ({len(pending)} адресов): {e}")
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+GEO_CACHE = GeoCache(
+    GEOIP_CACHE_FILE,
+    GEOIP_CACHE_MAX_ITEMS,
+    GEOIP_CACHE_TTL,
+    GEOIP_CACHE_NEGATIVE_TTL)
+
+
+# --- Локальная (офлайн) база диапазонов ---
+# Формат скомпилированного файла (все ключи big-endian, поэтому сравнение
+# байтовых строк эквивалентно сравнению адресов):
+#   заголовок  <8sIII: magic, n4, n6, длина JSON с именами стран
+#   IPv4: starts (n4*4), ends (n4*4), codes (n4*2)
+#   IPv6: starts (n6*16), ends (n6*16), codes (n6*2)
+#   JSON {code: name}
+_COMPILED_MAGIC = b"GEORNG01"
+_HEADER = struct.Struct("<8sIII")
+
+
+class _PackedColumn:
+    """Read-only последовательность записей фиксированной ширины поверх mmap (для bisect)."""
+
+    def __init__(self, buf, offset: int, count: int, width: int):
+        self._buf = buf
+        self._offset = offset
+        self._count = count
+        self._width = width
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index: int) -> bytes:
+        start = self._offset + index * self._width
+        return self._buf[start:start + self._width]
+
+
+def _parse_csv_address(value: str):
+    value = value.strip()
+    if value.isdigit():
+        return ipaddress.ip_address(int(value))
+    return ipaddress.ip_address(value)
+
+
+def _read_csv_ranges(path: str, names: dict) -> list:
+    ranges = []
+    with open(path, "r", encoding="utf-8", errors="ignore", newline="") as f:
+        for row in csv.reader(f):
+            if len(row) < 3:
+                continue
+            code = row[2].strip().upper()
+            if len(code) != 2 or not code.isalpha() or code == "ZZ":
+                continue
+            try:
+                start = _parse_csv_address(row[0])
+                end = _parse_csv_address(row[1])
+            except ValueError:
+                continue  # Заголовок или мусорная строка
+            if start.version != end.version:
+                continue
+            ranges.append((start.packed, end.packed, code))
+            if len(row) > 3 and row[3].strip() and code not in names:
+                names[code] = row[3].strip()
+    return ranges
+
+
+def _read_mmdb_ranges(path: str, names: dict) -> list:
+    if not MAXMINDDB_AVAILABLE:
+        raise RuntimeError(
+            "Для .mmdb нужна библиотека 'maxminddb' (pip install maxminddb)")
+    ranges = []
+    with maxminddb.open_database(path) as reader:
+        for network, record in reader:
+            country = (record or {}).get("country") or {}
+            code = country.get("iso_code")
+            if not code:
+                continue
+            code = code.upper()
+            name = (country.get("names") or {}).get("en")
+            if name and code not in names:
+                names[code] = name
+            ranges.append((network.network_address.packed,
+                           network.broadcast_address.packed, code))
+    return ranges
+
+
+def compile_ranges(source_path: str, compiled_path: str) -> int:
+    """Компилирует CSV/.mmdb в бинарные отсортированные таблицы. Возвращает число диапазонов."""
+    names = {}
+    if source_path.lower().endswith(".mmdb"):
+        ranges = _read_mmdb_ranges(source_path, names)
+    else:
+        ranges = _read_csv_ranges(source_path, names)
+
+    v4 = sorted(r for r in ranges if len(r[0]) == 4)
+    v6 = sorted(r for r in ranges if len(r[0]) == 16)
+    names_json = json.dumps(names, ensure_ascii=False).encode("utf-8")
+
+    tmp_path = compiled_path + ".tmp"
+    os.makedirs(os.path.dirname(compiled_path), exist_ok=True)
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(_COMPILED_MAGIC, len(v4), len(v6), len(names_json)))
+        for table in (v4, v6):
+            f.write(b"".join(r[0] for r in table))
+            f.write(b"".join(r[1] for r in table))
+            f.write(b"".join(r[2].encode("ascii") for r in table))
+        f.write(names_json)
+    os.replace(tmp_path, compiled_path)
+    return len(v4) + len(v6)
+
+
+class OfflineGeoDB:
+    """Поиск страны по IP двоичным поиском в memory-mapped таблицах диапазонов."""
+
+    def __init__(self, compiled_path: str):
+        self._file = open(compiled_path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n4, n6, names_len = _HEADER.unpack_from(self._mmap, 0)
+        if magic != _COMPILED_MAGIC:
+            raise ValueError(f"Неверный формат файла {compiled_path}")
+
+        offset = _HEADER.size
+        self._tables = {}
+        for version, count, width in ((4, n4, 4), (6, n6, 16)):
+            starts = _PackedColumn(self._mmap, offset, count, width)
+            offset += count * width
+            ends = _PackedColumn(self._mmap, offset, count, width)
+            offset += count * width
+            codes = _PackedColumn(self._mmap, offset, count, 2)
+            offset += count * 2
+            self._tables[version] = (starts, ends, codes)
+        self.names = json.loads(
+            bytes(self._mmap[offset:offset + names_len]) or b"{}")
+        self.size = n4 + n6
+
+    def lookup(self, identifier: str) -> tuple[str | None, str | None]:
+        """Возвращает (country_code | None, country_name | None)."""
+        value = identifier.strip()
+        if len(value) == 2 and value.isalpha():
+            code = value.upper()
+            return code, self.names.get(code)
+        try:
+            address = ipaddress.ip_address(value)
+        except ValueError:
+            return None, None
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+
+        starts, ends, codes = self._tables[address.version]
+        packed = address.packed
+        index = bisect.bisect_right(starts, packed) - 1
+        if index < 0 or ends[index] < packed:
+            return None, None
+        code = codes[index].decode("ascii")
+        return code, self.names.get(code)
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+
+OFFLINE_DB = None
+_offline_lock = threading.Lock()
+
+
+def load_offline_db(source_path: str | None = GEOIP_DB_PATH,
+                    compiled_path: str = GEOIP_COMPILED_FILE):
+    """
+    Загружает локальную базу (если настроена GEOIP_DB_PATH).
+    Перекомпилирует таблицы, только если исходник новее скомпилированного файла.
+    """
+    global OFFLINE_DB
+    if not source_path:
+        return None
+    with _offline_lock:
+        if OFFLINE_DB is not None:
+            return OFFLINE_DB
+        try:
+            if not os.path.exists(source_path):
+                logging.warning(
+                    f"GeoIP: база {source_path} не найдена, используется ip-api.com.")
+                return None
+            if not os.path.exists(compiled_path) or \
+                    os.path.getmtime(compiled_path) < os.path.getmtime(source_path):
+                started = time.monotonic()
+                count = compile_ranges(source_path, compiled_path)
+                logging.info(
+                    f"GeoIP: скомпилировано {count} диапазонов из {source_path} за {time.monotonic() - started:.1f}с")
+            OFFLINE_DB = OfflineGeoDB(compiled_path)
+            logging.info(
+                f"GeoIP: локальная база загружена ({OFFLINE_DB.size} диапазонов).")
+        except Exception as e:
+            logging.error(
+                f"GeoIP: не удалось загрузить локальную базу {source_path}: {e}")
+            OFFLINE_DB = None
+        return OFFLINE_DB
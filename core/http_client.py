@@ -0,0 +1,111 @@
+# /opt-tg-bot/core/http_client.py
+import asyncio
+import logging
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from .config import (
+    HTTP_TIMEOUT, HTTP_RETRIES, HTTP_RETRY_BACKOFF, HTTP_POOL_LIMIT,
+    HTTP_PER_HOST_LIMIT, HTTP_HOST_LIMITS
+)
+
+# Общая сессия (keep-alive пул соединений) и семафоры по хостам.
+# Создаются лениво внутри работающего event loop.
+_session: aiohttp.ClientSession | None = None
+_host_semaphores: dict[str, asyncio.Semaphore] = {}
+
+# Статусы, при которых имеет смысл повторить запрос
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Возвращает общую aiohttp-сессию, создавая ее при первом вызове."""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=HTTP_PER_HOST_LIMIT,
+            ttl_dns_cache=300,
+            keepalive_timeout=30)
+        _session = aiohttp.ClientSession(connector=connector)
+    return _session
+
+
+def _get_host_semaphore(url: str) -> asyncio.Semaphore:
+    host = urlsplit(url).hostname or ""
+    semaphore = _host_semaphores.get(host)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(
+            HTTP_HOST_LIMITS.get(host, HTTP_PER_HOST_LIMIT))
+        _host_semaphores[host] = semaphore
+    return semaphore
+
+
+async def request(
+        method: str,
+        url: str,
+        *,
+        response_type: str = "json",
+        timeout: float = HTTP_TIMEOUT,
+        retries: int = HTTP_RETRIES,
+        with_headers: bool = False,
+        **kwargs):
+    """
+    Выполняет запрос через общую сессию и возвращает тело ответа
+    (response_type: "json" | "text").
+    При with_headers=True возвращает кортеж (тело, заголовки ответа).
+    Повторяет запрос при сетевых ошибках, таймаутах и статусах RETRY_STATUSES.
+    Пробрасывает aiohttp.ClientError (в т.ч. ClientResponseError) и asyncio.TimeoutError.
+    """
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    semaphore = _get_host_semaphore(url)
+    attempt = 0
+
+    while True:
+        try:
+            async with semaphore:
+                async with get_session().request(
+                        method, url, timeout=client_timeout, **kwargs) as response:
+                    if response.status in RETRY_STATUSES and attempt < retries:
+                        raise aiohttp.ClientResponseError(
+                            response.request_info, response.history,
+                            status=response.status, message=response.reason)
+                    response.raise_for_status()
+                    if response_type == "text":
+                        body = await response.text()
+                    else:
+                        body = await response.json(content_type=None)
+                    return (body, response.headers) if with_headers else body
+
+        except (aiohttp.ClientConnectionError, aiohttp.ClientResponseError, asyncio.TimeoutError) as e:
+            is_retryable = not isinstance(e, aiohttp.ClientResponseError) or \
+                e.status in RETRY_STATUSES
+            if not is_retryable or attempt >= retries:
+                raise
+            delay = HTTP_RETRY_BACKOFF * (2 ** attempt)
+            attempt += 1
+            logging.debug(
+                f"HTTP {method} {url}: {type(e).__name__} {e}. Повтор #{attempt} через {delay}с")
+            await asyncio.sleep(delay)
+
+
+async def get_json(url: str, **kwargs):
+    return await request("GET", url, response_type="json", **kwargs)
+
+
+async def get_text(url: str, **kwargs) -> str:
+    return await request("GET", url, response_type="text", **kwargs)
+
+
+async def post_json(url: str, payload, **kwargs):
+    return await request("POST", url, response_type="json", json=payload, **kwargs)
+
+
+async def close():
+    """Закрывает общую сессию (вызывается при остановке бота)."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+        logging.info("HTTP-сессия закрыта.")
+    _session = None
@@ -39,6 +39,7 @@ STRINGS = {
         "btn_selftest": "🛠 Сведения о сервере",
         "btn_traffic": "📡 Трафик сети",
         "btn_uptime": "⏱ Аптайм",
+        "btn_history": "📈 История",
         "btn_speedtest": "🚀 Скорость сети",
         "btn_top": "🔥 Топ процессов",
         "btn_xray": "🩻 Обновление X-ray",
@@ -72,7 +73,7 @@ STRINGS = {
         "utils_server_rebooted": "✅ <b>Сервер успешно перезагружен! Бот снова в сети.</b>",
         "alert_no_users_for_type": "Нет пользователей с включенными уведомлениями типа '{alert_type}'.",
         "alert_sending_to_users": "Отправка алерта типа '{alert_type}' {count} пользователям...",
-        "alert_sent_to_users": "Алерт типа '{alert_type}' отправлен {count} пользователям.",
+        "alert_queued_for_users": "Алерт типа '{alert_type}' поставлен в очередь для {count} пользователей.",
         "watchdog_alert_prefix": "🚨 Система оповещений (Alert):",
         "watchdog_log_read_error": "Ошибка чтения лога: {error}",
         "watchdog_log_error_found_details": "Обнаружена ОШИБКА: {details}",
@@ -113,15 +114,33 @@ STRINGS = {
         "notifications_downtime_stub": "⏳ Функция уведомлений о даунтайме сервера находится в разработке.\nПока рекомендуем использовать внешние сервисы мониторинга (например, UptimeRobot).",
         "alert_ssh_login_detected": "🔔 <b>Обнаружен вход SSH</b>\n\n👤 Пользователь: <b>{user}</b>\n🌍 IP: <b>{flag} {ip}</b>\n⏰ Время: <b>{time}</b>{tz}",
         "alert_f2b_ban_detected": "🛡️ <b>Fail2Ban забанил IP</b>\n\n🌍 IP: <b>{flag} {ip}</b>\n⏰ Время: <b>{time}</b>{tz}",
+        "alert_digest_title_bans": "🛡️ <b>Fail2Ban: еще {count} банов</b> (сводка за {window} сек)",
+        "alert_digest_title_logins": "🔔 <b>Еще {count} входов SSH</b> (сводка за {window} сек)",
+        "alert_digest_body": "{title}\n\n⏰ Период: <b>{first} — {last}</b>{tz}\n\n🌍 Топ IP:\n{top_ips}\n\n🗺 Страны: {countries}",
+        "alert_digest_ip_line": "{flag} <code>{ip}</code> × {count}",
         "alert_cpu_high": "⚠️ <b>Превышен порог CPU!</b>\nТекущее использование: <b>{usage:.1f}%</b> (Порог: {threshold}%)",
         "alert_cpu_high_repeat": "‼️ <b>CPU все еще ВЫСОКИЙ!</b>\nТекущее использование: <b>{usage:.1f}%</b> (Порог: {threshold}%)",
         "alert_cpu_normal": "✅ <b>Нагрузка CPU нормализовалась.</b>\nТекущее использование: <b>{usage:.1f}%</b>",
         "alert_ram_high": "⚠️ <b>Превышен порог RAM!</b>\nТекущее использование: <b>{usage:.1f}%</b> (Порог: {threshold}%)",
         "alert_ram_high_repeat": "‼️ <b>RAM все еще ВЫСОКАЯ!</b>\nТекущее использование: <b>{usage:.1f}%</b> (Порог: {threshold}%)",
         "alert_ram_normal": "✅ <b>Использование RAM нормализовалось.</b>\nТекущее использование: <b>{usage:.1f}%</b>",
-        "alert_disk_high": "⚠️ <b>Превышен порог Disk!</b>\nТекущее использование: <b>{usage:.1f}%</b> (Порог: {threshold}%)",
-        "alert_disk_high_repeat": "‼️ <b>Disk все еще ВЫСОКИЙ!</b>\nТекущее использование: <b>{usage:.1f}%</b> (Порог: {threshold}%)",
-        "alert_disk_normal": "✅ <b>Использование Disk нормализовалось.</b>\nТекущее использование: <b>{usage:.1f}%</b>",
+        "alert_disk_high": "⚠️ <b>Превышен порог Disk ({mount})!</b>\nТекущее использование: <b>{usage:.1f}%</b> (Порог: {threshold}%)",
+        "alert_disk_high_repeat": "‼️ <b>Disk ({mount}) все еще ВЫСОКИЙ!</b>\nТекущее использование: <b>{usage:.1f}%</b> (Порог: {threshold}%)",
+        "alert_disk_normal": "✅ <b>Использование Disk ({mount}) нормализовалось.</b>\nТекущее использование: <b>{usage:.1f}%</b>",
+        "alert_disk_trend": "📈 <b>Disk ({mount}) заполнится примерно через {eta}!</b>\nРост: <b>{rate}/ч</b>, свободно: <b>{free}</b> (занято {usage:.1f}%)",
+        "alert_disk_trend_normal": "✅ <b>Рост Disk ({mount}) замедлился.</b>\nТекущее использование: <b>{usage:.1f}%</b>",
+        "alert_top_cpu_header": "🔥 <b>Топ процессов по CPU:</b>",
+        "alert_top_ram_header": "🔥 <b>Топ процессов по памяти (RSS):</b>",
+        "alert_top_process": "<code>{pid}</code> {name} — CPU {cpu:.1f}%, RSS {rss}",
+        "alert_traffic_anomaly_high": "🌊 <b>Аномальный трафик: {metric}!</b>\nСейчас: <b>{value}</b>, обычно в это время: {baseline}",
+        "alert_traffic_anomaly_high_repeat": "‼️ <b>Трафик все еще аномальный: {metric}!</b>\nСейчас: <b>{value}</b>, обычно в это время: {baseline}",
+        "alert_traffic_anomaly_normal": "✅ <b>Трафик нормализовался: {metric}.</b>\nСейчас: <b>{value}</b>",
+        "traffic_anomaly_rx_bytes": "входящий",
+        "traffic_anomaly_tx_bytes": "исходящий",
+        "traffic_anomaly_rx_packets": "входящие пакеты",
+        "traffic_anomaly_tx_packets": "исходящие пакеты",
+        "traffic_anomaly_mbps": "{value:.1f} Мбит/с",
+        "traffic_anomaly_pps": "{value:.0f} пак/с",
         "optimize_start": "⏳ <b>Запускаю оптимизацию системы...</b>\n\nЭто очень долгий процесс (5-15 минут).\nПожалуйста, не перезапускайте бота и не вызывайте другие команды.",
         "optimize_success": "✅ <b>Оптимизация завершена успешно!</b>\n\n<b>Последние 1000 символов вывода (включая sysctl):</b>\n<pre>{output}</pre>",
         "optimize_fail": "❌ <b>Ошибка во время оптимизации!</b>\n\n<b>Код возврата:</b> {code}\n<b>Вывод STDOUT (последние 1000):</b>\n<pre>{stdout}</pre>\n<b>Вывод STDERR (последние 2000):</b>\n<pre>{stderr}</pre>",
@@ -168,6 +187,7 @@ STRINGS = {
         "sshlog_header": "🔐 <b>Последние {count} событий SSH{source}:</b>\n\n{log_output}",
         "sshlog_not_found": "🔐 Не найдено событий SSH (вход/провал){source}.",
         "sshlog_read_error": "⚠️ Ошибка при чтении журнала SSH: {error}",
+        "sshlog_no_source": "⚠️ Источник событий SSH не найден (нет /var/log/auth.log, /var/log/secure и journald).",
         "sshlog_entry_success": "✅ <b>Успешный вход</b>\n👤 Пользователь: <b>{user}</b>\n🌍 IP: <b>{flag} {ip}</b>\n⏰ {time}{tz} ({date})",
         "sshlog_entry_invalid_user": "❌ <b>Неверный юзер</b>\n👤 Попытка: <b>{user}</b>\n🌍 IP: <b>{flag} {ip}</b>\n⏰ {time}{tz} ({date})",
         "sshlog_entry_wrong_pass": "❌ <b>Неверный пароль</b>\n👤 Пользователь: <b>{user}</b>\n🌍 IP: <b>{flag} {ip}</b>\n⏰ {time}{tz} ({date})",
@@ -191,6 +211,25 @@ STRINGS = {
         "update_fail": "❌ Ошибка при обновлении (Код: {code}):\n<pre>{error}</pre>",
         "uptime_text": "⏱ Время работы: <b>{uptime}</b>",
         "uptime_fail": "⚠️ Ошибка при получении аптайма: {error}",
+        "history_metric_cpu": "CPU",
+        "history_metric_ram": "RAM",
+        "history_metric_disk": "Диск",
+        "history_metric_traffic": "Трафик",
+        "history_range_1h": "1 час",
+        "history_range_24h": "24 часа",
+        "history_range_7d": "7 дней",
+        "history_caption_percent": "📈 <b>{metric}</b> за {period}\nСейчас: <b>{last:.1f}%</b>, среднее: {avg:.1f}%, максимум: {max:.1f}%",
+        "history_caption_traffic": "📈 <b>{metric}</b> за {period}\n⬇️ Входящий: среднее {rx_avg:.2f}, максимум {rx_max:.2f} Мбит/с\n⬆️ Исходящий: среднее {tx_avg:.2f}, максимум {tx_max:.2f} Мбит/с",
+        "history_no_data": "📈 Нет данных за {period}: история метрик копится с момента запуска бота (запись раз в минуту).",
+        "history_error": "⚠️ Ошибка построения графика: {error}",
+        "stats_header": "📊 <b>Вызовы Bot API за последний час</b>",
+        "stats_no_data": "📊 За последний час вызовов Bot API не было.",
+        "stats_method": "<code>{method}</code>: {calls} выз., p50 {p50}, p95 {p95}, ошибок {error_rate:.1f}%",
+        "stats_outbox": "📬 <b>Доставка алертов</b>: {calls}, p50 {p50}, p95 {p95}, не доставлено {error_rate:.1f}%",
+        "stats_errors": "    ошибки: {errors}",
+        "stats_retry_after": "    RetryAfter: {buckets}",
+        "stats_ms": "{value:.0f} мс",
+        "stats_sec": "{value:.1f} с",
         "vless_prompt_file": "📤 <b>Отправьте файл конфигурации Xray (JSON)</b>\n\n<i>Важно: файл должен содержать рабочую конфигурацию outbound с Reality.</i>",
         "vless_error_not_json": "⛔ <b>Ошибка:</b> Файл должен быть формата <code>.json</code>.\n\nПопробуйте отправить файл еще раз.",
         "vless_prompt_name": "✅ Файл JSON получен.\n\nТеперь <b>введите имя</b> для этой VLESS-ссылки (например, 'My_Server_1'):",
@@ -279,6 +318,7 @@ STRINGS = {
         "btn_selftest": "🛠 Server Info",
         "btn_traffic": "📡 Network Traffic",
         "btn_uptime": "⏱ Uptime",
+        "btn_history": "📈 History",
         "btn_speedtest": "🚀 Speedtest",
         "btn_top": "🔥 Top Processes",
         "btn_xray": "🩻 Update X-ray",
@@ -312,7 +352,7 @@ STRINGS = {
         "utils_server_rebooted": "✅ <b>Server rebooted successfully! The bot is back online.</b>",
         "alert_no_users_for_type": "No users with notifications enabled for type '{alert_type}'.",
         "alert_sending_to_users": "Sending alert type '{alert_type}' to {count} users...",
-        "alert_sent_to_users": "Alert type '{alert_type}' sent to {count} users.",
+        "alert_queued_for_users": "Alert type '{alert_type}' queued for {count} users.",
         "watchdog_alert_prefix": "🚨 Alert System:",
         "watchdog_log_read_error": "Log read error: {error}",
         "watchdog_log_error_found_details": "ERROR detected: {details}",
@@ -353,15 +393,33 @@ STRINGS = {
         "notifications_downtime_stub": "⏳ Server downtime notifications are under development.\nFor now, we recommend using an external monitoring service (e.g., UptimeRobot).",
         "alert_ssh_login_detected": "🔔 <b>SSH Login Detected</b>\n\n👤 User: <b>{user}</b>\n🌍 IP: <b>{flag} {ip}</b>\n⏰ Time: <b>{time}</b>{tz}",
         "alert_f2b_ban_detected": "🛡️ <b>Fail2Ban Banned IP</b>\n\n🌍 IP: <b>{flag} {ip}</b>\n⏰ Time: <b>{time}</b>{tz}",
+        "alert_digest_title_bans": "🛡️ <b>Fail2Ban: {count} more bans</b> ({window}s digest)",
+        "alert_digest_title_logins": "🔔 <b>{count} more SSH logins</b> ({window}s digest)",
+        "alert_digest_body": "{title}\n\n⏰ Period: <b>{first} — {last}</b>{tz}\n\n🌍 Top IPs:\n{top_ips}\n\n🗺 Countries: {countries}",
+        "alert_digest_ip_line": "{flag} <code>{ip}</code> × {count}",
         "alert_cpu_high": "⚠️ <b>CPU Threshold Exceeded!</b>\nCurrent usage: <b>{usage:.1f}%</b> (Threshold: {threshold}%)",
         "alert_cpu_high_repeat": "‼️ <b>CPU Still HIGH!</b>\nCurrent usage: <b>{usage:.1f}%</b> (Threshold: {threshold}%)",
         "alert_cpu_normal": "✅ <b>CPU load normalized.</b>\nCurrent usage: <b>{usage:.1f}%</b>",
         "alert_ram_high": "⚠️ <b>RAM Threshold Exceeded!</b>\nCurrent usage: <b>{usage:.1f}%</b> (Threshold: {threshold}%)",
         "alert_ram_high_repeat": "‼️ <b>RAM Still HIGH!</b>\nCurrent usage: <b>{usage:.1f}%</b> (Threshold: {threshold}%)",
         "alert_ram_normal": "✅ <b>RAM usage normalized.</b>\nCurrent usage: <b>{usage:.1f}%</b>",
-        "alert_disk_high": "⚠️ <b>Disk Threshold Exceeded!</b>\nCurrent usage: <b>{usage:.1f}%</b> (Threshold: {threshold}%)",
-        "alert_disk_high_repeat": "‼️ <b>Disk Still HIGH!</b>\nCurrent usage: <b>{usage:.1f}%</b> (Threshold: {threshold}%)",
-        "alert_disk_normal": "✅ <b>Disk usage normalized.</b>\nCurrent usage: <b>{usage:.1f}%</b>",
+        "alert_disk_high": "⚠️ <b>Disk ({mount}) Threshold Exceeded!</b>\nCurrent usage: <b>{usage:.1f}%</b> (Threshold: {threshold}%)",
+        "alert_disk_high_repeat": "‼️ <b>Disk ({mount}) Still HIGH!</b>\nCurrent usage: <b>{usage:.1f}%</b> (Threshold: {threshold}%)",
+        "alert_disk_normal": "✅ <b>Disk ({mount}) usage normalized.</b>\nCurrent usage: <b>{usage:.1f}%</b>",
+        "alert_disk_trend": "📈 <b>Disk ({mount}) will be full in about {eta}!</b>\nGrowth: <b>{rate}/h</b>, free: <b>{free}</b> ({usage:.1f}% used)",
+        "alert_disk_trend_normal": "✅ <b>Disk ({mount}) growth slowed down.</b>\nCurrent usage: <b>{usage:.1f}%</b>",
+        "alert_top_cpu_header": "🔥 <b>Top processes by CPU:</b>",
+        "alert_top_ram_header": "🔥 <b>Top processes by memory (RSS):</b>",
+        "alert_top_process": "<code>{pid}</code> {name} — CPU {cpu:.1f}%, RSS {rss}",
+        "alert_traffic_anomaly_high": "🌊 <b>Abnormal traffic: {metric}!</b>\nNow: <b>{value}</b>, usual at this hour: {baseline}",
+        "alert_traffic_anomaly_high_repeat": "‼️ <b>Traffic still abnormal: {metric}!</b>\nNow: <b>{value}</b>, usual at this hour: {baseline}",
+        "alert_traffic_anomaly_normal": "✅ <b>Traffic normalized: {metric}.</b>\nNow: <b>{value}</b>",
+        "traffic_anomaly_rx_bytes": "inbound",
+        "traffic_anomaly_tx_bytes": "outbound",
+        "traffic_anomaly_rx_packets": "inbound packets",
+        "traffic_anomaly_tx_packets": "outbound packets",
+        "traffic_anomaly_mbps": "{value:.1f} Mbit/s",
+        "traffic_anomaly_pps": "{value:.0f} pkt/s",
         "optimize_start": "⏳ <b>Starting system optimization...</b>\n\nThis is a very long process (5-15 minutes).\nPlease do not restart the bot or run other commands.",
         "optimize_success": "✅ <b>Optimization completed successfully!</b>\n\n<b>Last 1000 characters of output (including sysctl):</b>\n<pre>{output}</pre>",
         "optimize_fail": "❌ <b>Error during optimization!</b>\n\n<b>Return Code:</b> {code}\n<b>STDOUT (last 1000):</b>\n<pre>{stdout}</pre>\n<b>STDERR (last 2000):</b>\n<pre>{stderr}</pre>",
@@ -408,6 +466,7 @@ STRINGS = {
         "sshlog_header": "🔐 <b>Last {count} SSH events{source}:</b>\n\n{log_output}",
         "sshlog_not_found": "🔐 No SSH events (login/fail) found{source}.",
         "sshlog_read_error": "⚠️ Error reading SSH log: {error}",
+        "sshlog_no_source": "⚠️ No SSH event source found (no /var/log/auth.log, /var/log/secure or journald).",
         "sshlog_entry_success": "✅ <b>Successful login</b>\n👤 User: <b>{user}</b>\n🌍 IP: <b>{flag} {ip}</b>\n⏰ {time}{tz} ({date})",
         "sshlog_entry_invalid_user": "❌ <b>Invalid user</b>\n👤 Attempt: <b>{user}</b>\n🌍 IP: <b>{flag} {ip}</b>\n⏰ {time}{tz} ({date})",
         "sshlog_entry_wrong_pass": "❌ <b>Failed password</b>\n👤 User: <b>{user}</b>\n🌍 IP: <b>{flag} {ip}</b>\n⏰ {time}{tz} ({date})",
@@ -431,6 +490,25 @@ STRINGS = {
         "update_fail": "❌ Error during update (Code: {code}):\n<pre>{error}</pre>",
         "uptime_text": "⏱ Uptime: <b>{uptime}</b>",
         "uptime_fail": "⚠️ Error getting uptime: {error}",
+        "history_metric_cpu": "CPU",
+        "history_metric_ram": "RAM",
+        "history_metric_disk": "Disk",
+        "history_metric_traffic": "Traffic",
+        "history_range_1h": "1 hour",
+        "history_range_24h": "24 hours",
+        "history_range_7d": "7 days",
+        "history_caption_percent": "📈 <b>{metric}</b> for {period}\nNow: <b>{last:.1f}%</b>, average: {avg:.1f}%, max: {max:.1f}%",
+        "history_caption_traffic": "📈 <b>{metric}</b> for {period}\n⬇️ Inbound: average {rx_avg:.2f}, max {rx_max:.2f} Mbit/s\n⬆️ Outbound: average {tx_avg:.2f}, max {tx_max:.2f} Mbit/s",
+        "history_no_data": "📈 No data for {period}: metric history is collected since the bot started (one record per minute).",
+        "history_error": "⚠️ Error building the chart: {error}",
+        "stats_header": "📊 <b>Bot API calls in the last hour</b>",
+        "stats_no_data": "📊 No Bot API calls in the last hour.",
+        "stats_method": "<code>{method}</code>: {calls} calls, p50 {p50}, p95 {p95}, errors {error_rate:.1f}%",
+        "stats_outbox": "📬 <b>Alert delivery</b>: {calls}, p50 {p50}, p95 {p95}, undelivered {error_rate:.1f}%",
+        "stats_errors": "    errors: {errors}",
+        "stats_retry_after": "    RetryAfter: {buckets}",
+        "stats_ms": "{value:.0f} ms",
+        "stats_sec": "{value:.1f} s",
         "vless_prompt_file": "📤 <b>Send your Xray configuration file (JSON)</b>\n\n<i>Important: The file must contain a working outbound configuration with Reality.</i>",
         "vless_error_not_json": "⛔ <b>Error:</b> File must be in <code>.json</code> format.\n\nPlease try sending the file again.",
         "vless_prompt_name": "✅ JSON file received.\n\nNow, <b>enter a name</b> for this VLESS link (e.g., 'My_Server_1'):",
@@ -0,0 +1,207 @@
+# /opt-tg-bot/core/journal_follower.py
+import os
+import json
+import time
+import shutil
+import asyncio
+import logging
+import subprocess
+from collections import deque
+from datetime import datetime
+from typing import AsyncIterator, Iterable
+
+from .config import DEPLOY_MODE, INSTALL_MODE, LOG_JOURNAL_REPLAY_MAX_AGE
+from .log_checkpoints import CheckpointStore
+
+_STREAM_LIMIT = 1024 * 1024  # Максимальная длина одной JSON-записи журнала
+
+
+def journalctl_command() -> list[str] | None:
+    """Команда запуска journalctl хоста или None, если журнал недоступен."""
+    if DEPLOY_MODE == "docker":
+        if INSTALL_MODE != "root":
+            return None
+        # Docker-Root: journalctl хоста через chroot (как в modules/logs.py)
+        for binary in ("/usr/bin/journalctl", "/bin/journalctl"):
+            if os.path.exists("/host" + binary):
+                return ["chroot", "/host", binary]
+        return None
+    binary = shutil.which("journalctl")
+    return [binary] if binary else None
+
+
+def _unit_args(units: Iterable[str]) -> list[str]:
+    args = []
+    for unit in units:
+        args += ["-u", unit]
+    return args
+
+
+def _parse_entry(raw: bytes) -> dict | None:
+    try:
+        entry = json.loads(raw)
+    except ValueError:
+        return None
+    return entry if isinstance(entry, dict) else None
+
+
+def _realtime_us(entry: dict) -> int:
+    try:
+        return int(entry["__REALTIME_TIMESTAMP"])
+    except (KeyError, ValueError, TypeError):
+        return 0
+
+
+def journal_entry_to_line(entry: dict) -> str | None:
+    """
+    JSON-запись journald -> строка в стиле syslog с ISO-временем
+    ("2024-01-31T12:34:56 host sshd[123]: ..."), понятная core/log_parser.py.
+    """
+    message = entry.get("MESSAGE")
+    if isinstance(message, list):  # Не-UTF-8 сообщение приходит массивом байт
+        message = bytes(message).decode("utf-8", errors="ignore")
+    if not message:
+        return None
+    realtime = _realtime_us(entry)
+    timestamp = datetime.fromtimestamp(
+        realtime / 1_000_000) if realtime else datetime.now()
+    ident = entry.get("SYSLOG_IDENTIFIER") or entry.get("_COMM") or "journal"
+    pid = entry.get("_PID") or entry.get("SYSLOG_PID")
+    if pid:
+        ident = f"{ident}[{pid}]"
+    return f"{timestamp.isoformat(timespec='seconds')} {entry.get('_HOSTNAME', '-')} {ident}: {message}"
+
+
+async def _read_stderr(stream: asyncio.StreamReader, tail: deque):
+    """Читает stderr journalctl, пока он работает: полный pipe остановил бы процесс."""
+    while True:
+        try:
+            raw = await stream.readline()
+        except ValueError:
+            continue  # Слишком длинная строка — пропускаем
+        if not raw:
+            return
+        tail.append(raw.decode("utf-8", errors="ignore").strip())
+
+
+def read_journal_sync(units: Iterable[str], limit: int) -> list[dict]:
+    """Последние `limit` записей журнала по юнитам (старые первыми)."""
+    command = journalctl_command()
+    if command is None:
+        raise OSError("journalctl недоступен")
+    result = subprocess.run(
+        command + _unit_args(units) + ["-o", "json", "-n", str(limit), "--no-pager"],
+        capture_output=True, timeout=30)
+    if result.returncode != 0:
+        raise OSError(result.stderr.decode("utf-8", errors="ignore").strip())
+    entries = (_parse_entry(raw) for raw in result.stdout.splitlines())
+    return [entry for entry in entries if entry]
+
+
+class JournalFollower:
+    """
+    Аналог LogFollower для journald: один долгоживущий `journalctl -f -o json`.
+    Курсор последней обработанной записи сохраняется в checkpoints, после
+    перезапуска чтение продолжается с него. Записи старше
+    LOG_JOURNAL_REPLAY_MAX_AGE при дочитывании пропускаются (только сдвигают курсор).
+    """
+
+    def __init__(self, units: Iterable[str], key: str,
+                 checkpoints: CheckpointStore | None = None,
+                 initial_cursor: str | None = None):
+        self.units = tuple(units)
+        self.key = key
+        self.checkpoints = checkpoints
+        self.initial_cursor = initial_cursor
+        self._process = None
+        self.position: str | None = None  # Курсор последней отданной записи
+
+    def _start_cursor(self) -> str | None:
+        checkpoint = self.checkpoints.get(self.key) if self.checkpoints else None
+        if checkpoint and checkpoint.get("cursor"):
+            return checkpoint["cursor"]
+        return self.initial_cursor
+
+    def _save_cursor(self, cursor: str | None):
+        if self.checkpoints is not None and cursor:
+            self.checkpoints.set(self.key, cursor=cursor)
+
+    async def follow(self) -> AsyncIterator[str]:
+        """Асинхронный генератор новых записей журнала (в виде строк)."""
+        command = journalctl_command()
+        if command is None:
+            raise OSError("journalctl недоступен")
+        cursor = self._start_cursor()
+        args = command + _unit_args(self.units) + ["-f", "-o", "json", "--no-pager"]
+        # Без курсора — только новые записи (как `tail -n 0 -F`)
+        args += [f"--after-cursor={cursor}"] if cursor else ["-n", "0"]
+
+        self._process = await asyncio.create_subprocess_exec(
+            *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+            limit=_STREAM_LIMIT)
+        stderr_tail = deque(maxlen=20)  # Последние строки stderr — для лога
+        stderr_task = asyncio.create_task(
+            _read_stderr(self._process.stderr, stderr_tail), name="journalctl_stderr")
+        logging.info(
+            f"JournalFollower: слежу за journald ({', '.join(self.units)}), "
+            f"{'после курсора' if cursor else 'с текущего момента'}")
+
+        replay_border = (time.time() - LOG_JOURNAL_REPLAY_MAX_AGE) * 1_000_000
+        skipped = 0
+        try:
+            while True:
+                try:
+                    raw = await self._process.stdout.readline()
+                except ValueError:
+                    logging.warning("JournalFollower: слишком длинная запись журнала пропущена.")
+                    continue
+                if not raw:
+                    break
+                entry = _parse_entry(raw)
+                if entry is None:
+                    continue
+                if cursor and _realtime_us(entry) < replay_border:
+                    skipped += 1
+                else:
+                    if skipped:
+                        logging.warning(
+                            f"JournalFollower: пропущено {skipped} записей старше {LOG_JOURNAL_REPLAY_MAX_AGE} сек.")
+                        skipped = 0
+                    line = journal_entry_to_line(entry)
+                    if line:
+                        self.position = entry.get("__CURSOR")
+                        yield line
+                # Курсор сдвигается только после обработки записи
+                self._save_cursor(entry.get("__CURSOR"))
+
+            returncode = await self._process.wait()
+            await stderr_task
+            logging.warning(
+                f"JournalFollower: journalctl завершился (код {returncode}): "
+                f"{' '.join(stderr_tail)}")
+        finally:
+            stderr_task.cancel()
+            await self._reap()
+            self.close()
+
+    async def _reap(self):
+        """Останавливает journalctl и дожидается его завершения (без зомби)."""
+        process = self._process
+        if process is None:
+            return
+        if process.returncode is None:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+        await process.wait()
+
+    def close(self):
+        if self._process is not None and self._process.returncode is None:
+            try:
+                self._process.kill()
+            except ProcessLookupError:
+                pass
+        self._process = None
+        if self.checkpoints is not None:
+            self.checkpoints.flush()
@@ -7,7 +7,8 @@ from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMar
 from .i18n import _, get_user_lang, STRINGS as I18N_STRINGS
 # -----------------------------------
 
-from .shared_state import ALLOWED_USERS, USER_NAMES, ALERTS_CONFIG
+from .shared_state import ALLOWED_USERS, USER_NAMES
+from .subscriptions import SUBSCRIPTIONS
 # --- ИЗМЕНЕНО: Добавляем импорт DEFAULT_LANGUAGE ---
 from .config import ADMIN_USER_ID, INSTALL_MODE, DEFAULT_LANGUAGE
 # ----------------------------------------------------
@@ -74,7 +75,7 @@ def get_main_reply_keyboard(
             available_buttons_map[translated_btn.text] = translated_btn
 
     button_layout_keys = [
-        ["btn_selftest", "btn_traffic", "btn_uptime"],
+        ["btn_selftest", "btn_traffic", "btn_uptime", "btn_history"],
         ["btn_speedtest", "btn_top", "btn_xray"],
         ["btn_sshlog", "btn_fail2ban", "btn_logs"],
         ["btn_users", "btn_vless"],
@@ -270,13 +271,27 @@ def get_back_keyboard(lang: str, callback_data="back_to_manage_users"):
     return keyboard
 
 
+def get_history_keyboard(lang: str, metric: str, range_key: str):
+    """Выбор метрики и периода графика /history (текущие отмечены •)."""
+    def button(text, data, selected):
+        return InlineKeyboardButton(
+            text=f"• {text}" if selected else text, callback_data=data)
+
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [button(_(f"history_metric_{m}", lang), f"history_{m}_{range_key}", m == metric)
+         for m in ("cpu", "ram", "disk", "traffic")],
+        [button(_(f"history_range_{r}", lang), f"history_{metric}_{r}", r == range_key)
+         for r in ("1h", "24h", "7d")],
+    ])
+    return keyboard
+
+
 def get_alerts_menu_keyboard(user_id: int):
     lang = get_user_lang(user_id)
 
-    user_config = ALERTS_CONFIG.get(user_id, {})
-    res_enabled = user_config.get("resources", False)
-    logins_enabled = user_config.get("logins", False)
-    bans_enabled = user_config.get("bans", False)
+    res_enabled = SUBSCRIPTIONS.is_enabled(user_id, "resources")
+    logins_enabled = SUBSCRIPTIONS.is_enabled(user_id, "logins")
+    bans_enabled = SUBSCRIPTIONS.is_enabled(user_id, "bans")
 
     status_yes = _("status_enabled", lang)
     status_no = _("status_disabled", lang)
@@ -0,0 +1,114 @@
+# /opt-tg-bot/core/live_message.py
+import time
+import asyncio
+import hashlib
+import logging
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+
+from .delivery import DELIVERY
+from .outbox import PRIORITY_BULK
+from .config import LIVE_MESSAGE_MIN_INTERVAL
+
+
+def _digest(text: str, reply_markup) -> bytes:
+    """Хеш того, что увидит пользователь: текст и клавиатура."""
+    markup = reply_markup.model_dump_json(exclude_none=True) if reply_markup is not None else ""
+    return hashlib.blake2b(f"{text}\0{markup}".encode(), digest_size=16).digest()
+
+
+class LiveMessage:
+    """
+    Сообщение, которое обновляется по ходу работы (трафик, статус speedtest).
+    update() не ждет Bot API: правка уходит в фоне не чаще раза в
+    min_interval секунд, из нескольких быстрых обновлений отправляется
+    последнее, а совпадающее с показанным (по хешу) не отправляется вовсе.
+    Ошибка фоновой правки (сообщение удалено и т.п.) пробрасывается
+    из следующего вызова update().
+    """
+
+    def __init__(self, bot: Bot, chat_id: int, message_id: int,
+                 min_interval: float = LIVE_MESSAGE_MIN_INTERVAL,
+                 parse_mode: str | None = "HTML", priority: int = PRIORITY_BULK):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.min_interval = min_interval
+        self.parse_mode = parse_mode
+        self.priority = priority
+        self._shown = None       # Хеш последнего отправленного состояния
+        self._pending = None     # (text, reply_markup, хеш), ждущее отправки
+        self._edited_at = 0.0
+        self._error: Exception | None = None
+        self._task: asyncio.Task | None = None
+
+    async def update(self, text: str, reply_markup=None):
+        if self._error is not None:
+            raise self._error
+        digest = _digest(text, reply_markup)
+        if digest == self._shown:
+            self._pending = None  # Вернулись к показанному — старое ожидающее не нужно
+            return
+        self._pending = (text, reply_markup, digest)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(
+                self._run(), name=f"live_message_{self.chat_id}_{self.message_id}")
+
+    async def _run(self):
+        while self._pending is not None:
+            wait = self._edited_at + self.min_interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue  # За время ожидания состояние могло смениться
+            text, reply_markup, digest = self._pending
+            self._pending = None
+            try:
+                sent = await DELIVERY.edit(
+                    self.bot, self.chat_id, self.message_id, text,
+                    priority=self.priority, parse_mode=self.parse_mode,
+                    reply_markup=reply_markup)
+            except TelegramBadRequest as e:
+                if "message is not modified" not in str(e).lower():
+                    self._error = e
+                    return
+                sent = True
+            except Exception as e:
+                logging.error(f"LiveMessage {self.chat_id}/{self.message_id}: ошибка правки: {e}")
+                self._error = e
+                return
+            self._edited_at = time.monotonic()
+            if sent:
+                self._shown = digest
+            elif self._pending is None:
+                # Правка не ушла (RetryAfter, устарела в очереди) — повторяем,
+                # если за это время не пришло более новое состояние
+                self._pending = (text, reply_markup, digest)
+
+    def close(self):
+        """Отменяет еще не отправленную правку (перед финальным текстом или удалением)."""
+        self._pending = None
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+
+class LiveMessageRegistry:
+    """Один LiveMessage на сообщение: хеш и интервал общие для всех, кто его правит."""
+
+    def __init__(self):
+        self._messages: dict[tuple[int, int], LiveMessage] = {}
+
+    def get(self, bot: Bot, chat_id: int, message_id: int, **kwargs) -> LiveMessage:
+        live = self._messages.get((chat_id, message_id))
+        if live is None:
+            live = self._messages[(chat_id, message_id)] = LiveMessage(
+                bot, chat_id, message_id, **kwargs)
+        return live
+
+    def close(self, chat_id: int, message_id: int | None):
+        live = self._messages.pop((chat_id, message_id), None)
+        if live is not None:
+            live.close()
+
+
+LIVE_MESSAGES = LiveMessageRegistry()
@@ -0,0 +1,228 @@
+# /opt-tg-bot/core/log_bus.py
+import os
+import asyncio
+import subprocess
+import logging
+from collections import deque, defaultdict
+from typing import Awaitable, Callable, Iterable
+
+from . import log_parser
+from .log_parser import LogEvent
+from .log_follower import LogFollower
+from .journal_follower import (
+    JournalFollower, journalctl_command, journal_entry_to_line, read_journal_sync
+)
+from .log_checkpoints import LOG_CHECKPOINTS
+from .utils import get_host_path
+from .config import (
+    LOG_BUS_HISTORY_SIZE, LOG_BUS_BACKLOG_BYTES, LOG_JOURNAL_BACKLOG_ENTRIES
+)
+
+Subscriber = Callable[[LogEvent], Awaitable[None]]
+
+# Юниты sshd: ssh.service (Debian/Ubuntu) и sshd.service (RHEL/Arch)
+SSH_JOURNAL_UNITS = ("ssh", "sshd")
+
+
+class LogSource:
+    """Один лог-файл: один follower, один разбор каждой строки, история событий."""
+
+    is_journal = False
+
+    def __init__(self, name: str, path: str,
+                 parser: Callable[[str], LogEvent | None]):
+        self.name = name
+        self.path = path
+        self.parser = parser
+        self.history: deque[LogEvent] = deque(maxlen=LOG_BUS_HISTORY_SIZE)
+
+    def make_follower(self) -> LogFollower:
+        return LogFollower(self.path, checkpoints=LOG_CHECKPOINTS)
+
+    def _backlog_end(self) -> int:
+        """До какого смещения прочитаны строки, которые follower НЕ будет переигрывать."""
+        st = os.stat(self.path)
+        checkpoint = LOG_CHECKPOINTS.get(self.path)
+        if checkpoint is None:
+            return st.st_size  # Follower начнет с конца файла
+        if (checkpoint.get("dev"), checkpoint.get("inode")) != (st.st_dev, st.st_ino):
+            return 0  # Follower прочитает новый файл с начала
+        return min(checkpoint.get("offset", 0), st.st_size)
+
+    def load_backlog_sync(self):
+        """Заполняет историю последними событиями из файла (без рассылки подписчикам)."""
+        try:
+            end = self._backlog_end()
+            start = max(0, end - LOG_BUS_BACKLOG_BYTES)
+            with open(self.path, "rb") as f:
+                f.seek(start)
+                data = f.read(end - start)
+        except OSError as e:
+            logging.info(f"LogBus[{self.name}]: история не загружена: {e}")
+            return
+        lines = data.split(b"\n")
+        if start > 0:
+            lines = lines[1:]  # Первая строка обрезана
+        for raw in lines:
+            event = self.parser(raw.decode("utf-8", errors="ignore").strip())
+            if event:
+                self.history.append(event)
+        logging.info(
+            f"LogBus[{self.name}]: в истории {len(self.history)} событий из {self.path}")
+
+
+class JournalSource(LogSource):
+    """Источник из journald (для систем без auth.log/secure)."""
+
+    is_journal = True
+
+    def __init__(self, name: str, units: Iterable[str],
+                 parser: Callable[[str], LogEvent | None]):
+        self.units = tuple(units)
+        super().__init__(name, "journald:" + ",".join(self.units), parser)
+        self.checkpoint_key = f"journal:{name}"
+        self._backlog_cursor = None
+
+    def make_follower(self) -> JournalFollower:
+        return JournalFollower(self.units, self.checkpoint_key,
+                               checkpoints=LOG_CHECKPOINTS,
+                               initial_cursor=self._backlog_cursor)
+
+    def load_backlog_sync(self):
+        """Заполняет историю последними записями журнала (без рассылки подписчикам)."""
+        try:
+            entries = read_journal_sync(self.units, LOG_JOURNAL_BACKLOG_ENTRIES)
+        except (OSError, subprocess.SubprocessError) as e:
+            logging.info(f"LogBus[{self.name}]: история не загружена: {e}")
+            return
+        checkpoint = LOG_CHECKPOINTS.get(self.checkpoint_key)
+        saved_cursor = checkpoint.get("cursor") if checkpoint else None
+        if saved_cursor:
+            # В историю — только записи до курсора: остальные follower дочитает сам
+            cursors = [entry.get("__CURSOR") for entry in entries]
+            entries = entries[:cursors.index(saved_cursor) + 1] \
+                if saved_cursor in cursors else []
+        elif entries:
+            # Follower продолжит сразу после истории, без пропусков и повторов
+            self._backlog_cursor = entries[-1].get("__CURSOR")
+        for entry in entries:
+            line = journal_entry_to_line(entry)
+            event = self.parser(line) if line else None
+            if event:
+                self.history.append(event)
+        logging.info(
+            f"LogBus[{self.name}]: в истории {len(self.history)} событий из {self.path}")
+
+
+class LogBus:
+    """
+    Общая шина событий логов: каждый источник читается одним LogFollower,
+    каждая строка разбирается один раз, события рассылаются подписчикам
+    по типу и хранятся в истории для /sshlog, /fail2ban и selftest.
+    """
+
+    def __init__(self):
+        self.sources: dict[str, LogSource] = {}
+        self._subscribers: dict[str, list[Subscriber]] = defaultdict(list)
+
+    def add_source(self, name: str, path: str,
+                   parser: Callable[[str], LogEvent | None]) -> LogSource:
+        source = LogSource(name, path, parser)
+        self.sources[name] = source
+        return source
+
+    def add_journal_source(self, name: str, units: Iterable[str],
+                           parser: Callable[[str], LogEvent | None]) -> JournalSource:
+        source = JournalSource(name, units, parser)
+        self.sources[name] = source
+        return source
+
+    def subscribe(self, kinds: Iterable[str], callback: Subscriber):
+        for kind in kinds:
+            self._subscribers[kind].append(callback)
+
+    def recent(self, source_name: str, kinds: Iterable[str] | None = None,
+               limit: int = 10,
+               where: Callable[[LogEvent], bool] | None = None) -> list[LogEvent] | None:
+        """
+        Последние события источника (новые первыми). where — дополнительный
+        фильтр, применяется до limit.
+        None — источник не настроен (например, нет файла лога).
+        """
+        source = self.sources.get(source_name)
+        if source is None:
+            return None
+        kinds = set(kinds) if kinds else None
+        result = []
+        for event in reversed(source.history):
+            if (kinds is None or event.kind in kinds) and (where is None or where(event)):
+                result.append(event)
+                if len(result) >= limit:
+                    break
+        return result
+
+    async def _dispatch(self, source: LogSource, event: LogEvent):
+        source.history.append(event)
+        for callback in self._subscribers.get(event.kind, ()):
+            try:
+                await callback(event)
+            except Exception as e:
+                logging.error(
+                    f"LogBus[{source.name}]: ошибка подписчика {getattr(callback, '__name__', callback)}: {e}")
+
+    async def _run_source(self, source: LogSource):
+        await asyncio.to_thread(source.load_backlog_sync)
+        try:
+            while True:
+                follower = source.make_follower()
+                logging.info(f"LogBus[{source.name}]: слежу за {source.path}")
+                try:
+                    async for line in follower.follow():
+                        event = source.parser(line)
+                        if event:
+                            if follower.position:
+                                event = event._replace(
+                                    origin=f"{source.name}:{follower.position}")
+                            await self._dispatch(source, event)
+                except Exception as e:
+                    logging.error(
+                        f"LogBus[{source.name}]: критическая ошибка ({source.path}): {e}")
+                finally:
+                    follower.close()
+                logging.info(
+                    f"LogBus[{source.name}]: пауза 5 сек перед перезапуском...")
+                await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            logging.info(f"LogBus[{source.name}]: остановлен.")
+
+    def start(self) -> list[asyncio.Task]:
+        """Запускает чтение всех источников. Возвращает фоновые задачи."""
+        return [asyncio.create_task(self._run_source(source), name=f"LogBus-{name}")
+                for name, source in self.sources.items()]
+
+
+def find_ssh_log() -> str | None:
+    """Путь к SSH-логу хоста (secure или auth.log) или None."""
+    for path in ("/var/log/secure", "/var/log/auth.log"):
+        host_path = get_host_path(path)
+        if os.path.exists(host_path):
+            return host_path
+    return None
+
+
+def setup_default_sources(bus: "LogBus"):
+    """Регистрирует стандартные источники: SSH-лог (файл или journald) и fail2ban.log."""
+    ssh_log = find_ssh_log()
+    if ssh_log:
+        bus.add_source("ssh", ssh_log, log_parser.parse_ssh_line)
+    elif journalctl_command():
+        logging.info("LogBus: файла лога SSH нет, источник 'ssh' читает journald.")
+        bus.add_journal_source("ssh", SSH_JOURNAL_UNITS, log_parser.parse_ssh_line)
+    else:
+        logging.warning("LogBus: лог SSH не найден, источник 'ssh' не запущен.")
+    # fail2ban.log может появиться позже — follower дождется файла
+    bus.add_source("fail2ban", get_host_path("/var/log/fail2ban.log"),
+                   log_parser.parse_f2b_line)
+
+
+LOG_BUS = LogBus()
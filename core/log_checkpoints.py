@@ -0,0 +1,74 @@
+# /opt-tg-bot/core/log_checkpoints.py
+import os
+import json
+import asyncio
+import logging
+
+from .config import LOG_CHECKPOINTS_FILE, LOG_CHECKPOINT_INTERVAL
+
+
+class CheckpointStore:
+    """
+    Позиции чтения логов: {path: {"dev": ..., "inode": ..., "offset": ...}}
+    для файлов и {"journal:<источник>": {"cursor": ...}} для journald.
+    update()/set() меняют только память; запись на диск откладывается на
+    LOG_CHECKPOINT_INTERVAL секунд, чтобы не писать файл на каждую строку.
+    """
+
+    def __init__(self, path: str, interval: float):
+        self.path = path
+        self.interval = interval
+        self._data = None
+        self._dirty = False
+        self._flush_handle = None
+
+    def _load(self) -> dict:
+        if self._data is None:
+            self._data = {}
+            try:
+                if os.path.exists(self.path):
+                    with open(self.path, "r", encoding='utf-8') as f:
+                        loaded = json.load(f)
+                    if isinstance(loaded, dict):
+                        self._data = loaded
+            except (OSError, json.JSONDecodeError) as e:
+                logging.error(f"Ошибка загрузки {self.path}: {e}")
+        return self._data
+
+    def get(self, key: str) -> dict | None:
+        return self._load().get(key)
+
+    def update(self, key: str, dev: int, inode: int, offset: int):
+        self.set(key, dev=dev, inode=inode, offset=offset)
+
+    def set(self, key: str, **fields):
+        if self._load().get(key) == fields:
+            return
+        self._data[key] = fields
+        self._dirty = True
+        if self._flush_handle is None:
+            try:
+                self._flush_handle = asyncio.get_running_loop().call_later(
+                    self.interval, self.flush)
+            except RuntimeError:
+                self.flush()  # Вне event loop — пишем сразу
+
+    def flush(self):
+        """Сохраняет позиции на диск, если они менялись."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._dirty:
+            return
+        tmp_path = self.path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp_path, "w", encoding='utf-8') as f:
+                json.dump(self._data, f, indent=4, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+        except OSError as e:
+            logging.error(f"Ошибка сохранения {self.path}: {e}")
+
+
+LOG_CHECKPOINTS = CheckpointStore(LOG_CHECKPOINTS_FILE, LOG_CHECKPOINT_INTERVAL)
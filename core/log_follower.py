@@ -0,0 +1,312 @@
+# /opt-tg-bot/core/log_follower.py
+import os
+import errno
+import ctypes
+import ctypes.util
+import struct
+import asyncio
+import logging
+from typing import AsyncIterator
+
+from .config import (
+    LOG_FOLLOW_POLL_INTERVAL, LOG_FOLLOW_SAFETY_INTERVAL, LOG_REPLAY_MAX_BYTES
+)
+from .log_checkpoints import CheckpointStore
+
+# --- inotify через libc (Linux). Если недоступен — опрос по таймеру ---
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_IGNORED = 0x00008000
+_WATCH_MASK = (_IN_MODIFY | _IN_ATTRIB | _IN_MOVED_FROM | _IN_MOVED_TO |
+               _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF | _IN_MOVE_SELF)
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+try:
+    _libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6",
+                        use_errno=True)
+    _libc.inotify_init1.argtypes = [ctypes.c_int]
+    _libc.inotify_add_watch.argtypes = [
+        ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    INOTIFY_AVAILABLE = True
+except (OSError, AttributeError):
+    _libc = None
+    INOTIFY_AVAILABLE = False
+
+_READ_CHUNK = 64 * 1024
+
+
+class _DirectoryWatch:
+    """inotify-наблюдение за каталогом файла (ловит и запись, и ротацию)."""
+
+    def __init__(self, directory: str, filename: str):
+        self.filename = os.fsencode(filename)
+        self.fd = _libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        wd = _libc.inotify_add_watch(
+            self.fd, os.fsencode(directory), _WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(err, os.strerror(err))
+        self.broken = False
+
+    def consume(self) -> bool:
+        """Вычитывает события. True — есть события, касающиеся нашего файла."""
+        relevant = False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return relevant
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            if not data:
+                return relevant
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(data):
+                _wd, mask, _cookie, name_len = _EVENT_HEADER.unpack_from(
+                    data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + name_len].rstrip(b"\0")
+                offset += name_len
+                if mask & (_IN_IGNORED | _IN_DELETE_SELF | _IN_MOVE_SELF):
+                    # Сам каталог пропал — дальше только опрос
+                    self.broken = True
+                    relevant = True
+                elif name == self.filename:
+                    relevant = True
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class LogFollower:
+    """
+    Асинхронный аналог `tail -n 0 -F` без подпроцесса.
+    Держит файл открытым и читает только новые байты; отдает целые строки.
+    Ротацию (смена inode) и усечение (copytruncate) отслеживает сам:
+    дочитывает старый файл и продолжает с начала нового.
+    С checkpoints позиция обработанных строк сохраняется, и после
+    перезапуска чтение продолжается с нее (не более LOG_REPLAY_MAX_BYTES).
+    """
+
+    def __init__(self, path: str, from_end: bool = True,
+                 checkpoints: CheckpointStore | None = None):
+        self.path = path
+        self.from_end = from_end
+        self.checkpoints = checkpoints
+        self._file = None
+        self._file_id = None
+        self._buffer = b""
+        self._watch = None
+        self._wakeup = None
+        self._last_error = None
+        # Место последней отданной строки: "<dev>:<inode>:<смещение конца>"
+        self.position: str | None = None
+
+    # --- Ожидание изменений ---
+    def _start_watch(self):
+        if not INOTIFY_AVAILABLE or self._watch is not None:
+            return
+        directory, filename = os.path.split(os.path.abspath(self.path))
+        try:
+            self._watch = _DirectoryWatch(directory, filename)
+            asyncio.get_running_loop().add_reader(
+                self._watch.fd, self._on_inotify)
+            logging.debug(f"LogFollower: inotify для {self.path}")
+        except OSError as e:
+            logging.info(
+                f"LogFollower: inotify недоступен для {self.path} ({e}), опрос каждые {LOG_FOLLOW_POLL_INTERVAL}с")
+            self._watch = None
+
+    def _stop_watch(self):
+        if self._watch is not None:
+            try:
+                asyncio.get_running_loop().remove_reader(self._watch.fd)
+            except RuntimeError:
+                pass
+            self._watch.close()
+            self._watch = None
+
+    def _on_inotify(self):
+        try:
+            relevant = self._watch.consume()
+        except OSError as e:
+            logging.warning(f"LogFollower: ошибка чтения inotify ({self.path}): {e}")
+            relevant = True
+            self._watch.broken = True
+        if self._watch.broken:
+            self._stop_watch()
+        if relevant:
+            self._wakeup.set()
+
+    async def _wait(self):
+        # С inotify таймер — лишь страховка от пропущенных событий
+        timeout = LOG_FOLLOW_SAFETY_INTERVAL if self._watch else LOG_FOLLOW_POLL_INTERVAL
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            if INOTIFY_AVAILABLE and self._watch is None:
+                self._start_watch()  # Каталог мог появиться
+        self._wakeup.clear()
+
+    # --- Работа с файлом ---
+    def _report(self, message: str | None):
+        if message and message != self._last_error:
+            logging.warning(message)
+        self._last_error = message
+
+    def _open(self, at_end: bool, resume: bool) -> bool:
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            self._report(f"LogFollower: {self.path} не найден, ожидание появления.")
+            return False
+        except PermissionError:
+            self._report(f"LogFollower: нет прав на чтение {self.path}.")
+            return False
+        st = os.fstat(f.fileno())
+        checkpoint = self.checkpoints.get(
+            self.path) if self.checkpoints and resume else None
+        if checkpoint is not None:
+            self._resume(f, st, checkpoint)
+        elif at_end:
+            f.seek(0, os.SEEK_END)
+        self._file = f
+        self._file_id = (st.st_dev, st.st_ino)
+        self._buffer = b""
+        self._report(None)
+        logging.info(
+            f"LogFollower: слежу за {self.path} (inode {st.st_ino}, позиция {f.tell()})")
+        return True
+
+    def _resume(self, f, st, checkpoint: dict):
+        """Позиционирует файл по сохраненной позиции (с ограничением хвоста)."""
+        start = 0
+        if (checkpoint.get("dev"), checkpoint.get("inode")) == (st.st_dev, st.st_ino):
+            start = checkpoint.get("offset", 0)
+            if start > st.st_size:
+                logging.info(
+                    f"LogFollower: {self.path} усечен во время простоя, чтение с начала.")
+                start = 0
+        else:
+            # Файл ротирован во время простоя — новый читается с начала
+            logging.info(
+                f"LogFollower: {self.path} сменился во время простоя, чтение с начала.")
+
+        if st.st_size - start > LOG_REPLAY_MAX_BYTES:
+            skipped = st.st_size - LOG_REPLAY_MAX_BYTES - start
+            f.seek(st.st_size - LOG_REPLAY_MAX_BYTES)
+            f.readline()  # Пропускаем обрезанную строку
+            logging.warning(
+                f"LogFollower: {self.path}: пропущено {skipped} байт старого хвоста (лимит {LOG_REPLAY_MAX_BYTES}).")
+        else:
+            f.seek(start)
+        if f.tell() < st.st_size:
+            logging.info(
+                f"LogFollower: {self.path}: дочитываю {st.st_size - f.tell()} байт, записанных во время простоя.")
+
+    def _save_position(self, offset: int):
+        if self.checkpoints is not None and self._file_id is not None:
+            self.checkpoints.update(self.path, *self._file_id, offset)
+
+    def _mark_position(self, end: int):
+        self.position = "{}:{}:{}".format(*self._file_id, end)
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._file_id = None
+
+    def _read_lines(self, flush: bool = False) -> list[tuple[str, int]]:
+        """
+        Читает все доступные байты и возвращает целые строки
+        в виде (строка, смещение конца строки в файле).
+        """
+        lines = []
+        try:
+            if os.fstat(self._file.fileno()).st_size < self._file.tell():
+                logging.info(f"LogFollower: {self.path} усечен, чтение с начала.")
+                self._file.seek(0)
+                self._buffer = b""
+        except OSError:
+            pass
+        position = self._file.tell() - len(self._buffer)
+        while True:
+            chunk = self._file.read(_READ_CHUNK)
+            if not chunk:
+                break
+            *complete, self._buffer = (self._buffer + chunk).split(b"\n")
+            for raw in complete:
+                position += len(raw) + 1
+                lines.append((raw, position))
+        if flush and self._buffer:
+            position += len(self._buffer)
+            lines.append((self._buffer, position))
+            self._buffer = b""
+        decoded = ((raw.decode("utf-8", errors="ignore").strip(), end)
+                   for raw, end in lines)
+        return [(line, end) for line, end in decoded if line]
+
+    def _is_rotated(self) -> bool:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return False  # Новый файл еще не создан — дочитываем старый
+        return (st.st_dev, st.st_ino) != self._file_id
+
+    async def follow(self) -> AsyncIterator[str]:
+        """Асинхронный генератор новых строк файла."""
+        self._wakeup = asyncio.Event()
+        self._start_watch()
+        at_end = self.from_end
+        first_open = True
+        try:
+            while True:
+                if self._file is None:
+                    # Checkpoint нужен только при старте; файл, появившийся
+                    # после старта, и новый файл после ротации читаются целиком
+                    opened = self._open(at_end, resume=first_open)
+                    at_end = first_open = False
+                    if not opened:
+                        await self._wait()
+                        continue
+
+                for line, end in self._read_lines():
+                    self._mark_position(end)
+                    yield line
+                    # Позиция сдвигается только после обработки строки
+                    self._save_position(end)
+                self._save_position(self._file.tell() - len(self._buffer))
+
+                if self._is_rotated():
+                    for line, end in self._read_lines(flush=True):
+                        self._mark_position(end)
+                        yield line
+                        self._save_position(end)
+                    logging.info(f"LogFollower: {self.path} ротирован, переоткрываю.")
+                    self._close_file()
+                    continue
+
+                await self._wait()
+        finally:
+            self.close()
+
+    def close(self):
+        self._stop_watch()
+        self._close_file()
+        if self.checkpoints is not None:
+            self.checkpoints.flush()
@@ -0,0 +1,164 @@
+# /opt-tg-bot/core/log_parser.py
+import re
+import time
+import logging
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+# --- Типы событий ---
+LOGIN_ACCEPTED = "login_accepted"
+LOGIN_FAILED_PASSWORD = "login_failed_password"
+LOGIN_INVALID_USER = "login_invalid_user"
+LOGIN_PAM_FAILURE = "login_pam_failure"
+F2B_BAN = "f2b_ban"
+F2B_ALREADY_BANNED = "f2b_already_banned"
+
+SSH_EVENT_KINDS = (LOGIN_ACCEPTED, LOGIN_FAILED_PASSWORD,
+                   LOGIN_INVALID_USER, LOGIN_PAM_FAILURE)
+F2B_EVENT_KINDS = (F2B_BAN, F2B_ALREADY_BANNED)
+
+
+class LogEvent(NamedTuple):
+    """
+    Разобранная строка лога. timestamp — время из самой строки (если есть),
+    origin — место строки в источнике ("ssh:<dev>:<inode>:<смещение>" или
+    курсор journald); одно и то же при повторном чтении после рестарта.
+    """
+    kind: str
+    timestamp: datetime | None
+    ip: str | None
+    user: str | None = None
+    origin: str | None = None
+
+
+# --- SSH: все шаблоны в одной альтернации (один проход regex по строке) ---
+# Порядок альтернатив важен: "invalid user" раньше "Failed password".
+_SSH_RE = re.compile(
+    r"Accepted\s+\S+\s+for\s+(?P<acc_user>\S+)\s+from\s+(?P<acc_ip>\S+)"
+    r"|Failed\s+\S+\s+for\s+invalid\s+user\s+(?P<inv_user>\S+)\s+from\s+(?P<inv_ip>\S+)"
+    r"|Failed password for (?P<fp_user>\S+) from (?P<fp_ip>\S+)"
+    r"|authentication failure;.*rhost=(?P<pam_ip>\S+)\s+user=(?P<pam_user>\S+)")
+# lastgroup совпадения -> (тип, группа user, группа ip)
+_SSH_KINDS = {
+    "acc_ip": (LOGIN_ACCEPTED, "acc_user", "acc_ip"),
+    "inv_ip": (LOGIN_INVALID_USER, "inv_user", "inv_ip"),
+    "fp_ip": (LOGIN_FAILED_PASSWORD, "fp_user", "fp_ip"),
+    "pam_user": (LOGIN_PAM_FAILURE, "pam_user", "pam_ip"),
+}
+
+_F2B_BAN_RE = re.compile(r"fail2ban\.actions.* Ban\s+(\S+)")
+_F2B_ALREADY_RE = re.compile(r"fail2ban\.actions.* (\S+)\s+already banned")
+_F2B_TIME_RE = re.compile(r"(\d{4}-\d{2}-\d{2}\s\d{2}:\d{2}:\d{2},\d{3})")
+
+# --- Время ---
+_MONTHS = {name: number for number, name in enumerate(
+    ("Jan", "Feb", "Mar", "Apr", "May", "Jun",
+     "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"), start=1)}
+_ISO_TIME_RE = re.compile(r"(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})")
+_SYSLOG_TIME_RE = re.compile(r"(\w{3})\s+(\d{1,2})\s+(\d{2}):(\d{2}):(\d{2})")
+
+# "Сейчас" для определения года в syslog-строках; обновляется раз в минуту
+_now_cache = [0.0, datetime.min]
+_NOW_CACHE_TTL = 60
+
+
+def _reference_now() -> datetime:
+    if time.monotonic() > _now_cache[0]:
+        _now_cache[0] = time.monotonic() + _NOW_CACHE_TTL
+        _now_cache[1] = datetime.now()
+    return _now_cache[1]
+
+
+def _syslog_datetime(month: int, day: int, hour: int, minute: int,
+                     second: int) -> datetime:
+    """Syslog не пишет год: берем текущий, а "будущие" даты относим к прошлому году."""
+    now = _reference_now()
+    dt = datetime(now.year, month, day, hour, minute, second)
+    if dt > now + timedelta(days=1):
+        dt = dt.replace(year=now.year - 1)
+    return dt
+
+
+def parse_syslog_timestamp(line: str) -> datetime | None:
+    """
+    Время из строки auth.log/secure/journalctl: ISO 8601 или классический
+    syslog ("Oct  7 10:00:00") без года. Быстрый путь — разбор по позициям
+    в начале строки, иначе поиск в любом месте строки.
+    """
+    try:
+        if len(line) >= 19 and line[4] == "-" and line[10] == "T":
+            return datetime(int(line[0:4]), int(line[5:7]), int(line[8:10]),
+                            int(line[11:13]), int(line[14:16]), int(line[17:19]))
+        month = _MONTHS.get(line[:3])
+        if month and len(line) >= 15 and line[3] == " " and line[9] == ":":
+            return _syslog_datetime(month, int(line[4:6]), int(line[7:9]),
+                                    int(line[10:12]), int(line[13:15]))
+    except ValueError:
+        pass
+
+    # Медленный путь: время не в начале строки
+    try:
+        match = _ISO_TIME_RE.search(line)
+        if match:
+            return datetime(*map(int, match.groups()))
+        match = _SYSLOG_TIME_RE.search(line)
+        if match and match.group(1) in _MONTHS:
+            return _syslog_datetime(_MONTHS[match.group(1)],
+                                    *map(int, match.groups()[1:]))
+    except ValueError as e:
+        logging.debug(f"Не удалось распарсить дату: {e}. Строка: {line}")
+    return None
+
+
+def parse_ssh_line(line: str) -> LogEvent | None:
+    """Разбирает строку SSH-лога в LogEvent (или None, если строка не интересна)."""
+    # Быстрый отсев: большинство строк auth.log не содержат ни одного маркера.
+    # Только sshd: такие же строки пишут su, sudo, cron, vsftpd и другие PAM-сервисы
+    if "Accepted" not in line and "Failed" not in line and \
+            "authentication failure" not in line:
+        return None
+    if "sshd" not in line:
+        return None
+    match = _SSH_RE.search(line)
+    if match is None:
+        return None
+    kind, user_group, ip_group = _SSH_KINDS[match.lastgroup]
+    return LogEvent(kind, parse_syslog_timestamp(line),
+                    match.group(ip_group), match.group(user_group))
+
+
+def _parse_f2b_timestamp(line: str) -> datetime | None:
+    # Обычно строка начинается с "2024-01-31 12:34:56,789"
+    try:
+        if len(line) >= 23 and line[4] == "-" and line[19] == ",":
+            return datetime(int(line[0:4]), int(line[5:7]), int(line[8:10]),
+                            int(line[11:13]), int(line[14:16]), int(line[17:19]),
+                            int(line[20:23]) * 1000)
+    except ValueError:
+        pass
+    match = _F2B_TIME_RE.search(line)
+    if match:
+        try:
+            return datetime.strptime(match.group(1), "%Y-%m-%d %H:%M:%S,%f")
+        except ValueError:
+            pass
+    logging.warning(f"Could not parse Fail2Ban timestamp: {line[:40]}")
+    return None
+
+
+def parse_f2b_line(line: str) -> LogEvent | None:
+    """Разбирает строку fail2ban.log (Ban / already banned)."""
+    if "fail2ban.actions" not in line:
+        return None
+    if " Ban " in line:
+        kind, match = F2B_BAN, _F2B_BAN_RE.search(line)
+    elif "already banned" in line:
+        kind, match = F2B_ALREADY_BANNED, _F2B_ALREADY_RE.search(line)
+    else:
+        return None
+    if match is None:
+        return None
+    timestamp = _parse_f2b_timestamp(line)
+    if timestamp is None:
+        return None
+    return LogEvent(kind, timestamp, match.group(1).strip(" \n\t,"))
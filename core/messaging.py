@@ -1,9 +1,10 @@
 # /opt/tg-bot/core/messaging.py
 import logging
 import asyncio
+import sqlite3
 from aiogram import Bot
 # --- ИЗМЕНЕНО: Добавлены импорты ---
-from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 # ---------------------------------
 
@@ -12,7 +13,10 @@ from .i18n import _, get_user_lang
 from . import config  # Нужен для DEFAULT_LANGUAGE
 # ----------------------------------------
 
-from .shared_state import LAST_MESSAGE_IDS, ALERTS_CONFIG
+from .shared_state import LAST_MESSAGE_IDS
+from .subscriptions import SUBSCRIPTIONS
+from .outbox import OUTBOX, PRIORITY_NORMAL
+from .delivery import DELIVERY, OUTBOX_SENDER
 
 
 async def delete_previous_message(
@@ -62,17 +66,43 @@ async def send_support_message(bot: Bot, user_id: int, lang: str):
 # --- КОНЕЦ НОВОЙ ФУНКЦИИ ---
 
 
-async def send_alert(bot: Bot, message: str, alert_type: str):
+def alert_key(alert_type: str, event_key: str | None) -> str | None:
+    """
+    Ключ алерта в очереди исходящих по идентичности события (место строки
+    в логе, переход метрики), а не по тексту: повтор того же события после
+    рестарта не создает дублей, а разные события с одинаковым текстом
+    не сливаются. Без event_key — новый ключ на каждый вызов.
+    """
+    return f"alert:{alert_type}:{event_key}" if event_key else None
+
+
+async def update_alert(bot: Bot, alert_type: str, key: str | None, message: str):
+    """
+    Уточняет текст уже поставленного алерта (например, флаг страны вместо "⏳"):
+    ждущие отправки уйдут с новым текстом, доставленные правятся.
+    """
+    outbox_key = alert_key(alert_type, key)
+    if outbox_key is None:
+        return
+    try:
+        sent = await asyncio.to_thread(OUTBOX.replace_text, outbox_key, message)
+    except sqlite3.Error as e:
+        logging.warning(f"Не удалось уточнить алерт {outbox_key}: {e}")
+        return
+    await asyncio.gather(*(OUTBOX_SENDER.edit_sent(bot, chat_id, message_id, message)
+                           for chat_id, message_id in sent))
+
+
+async def send_alert(bot: Bot, message: str, alert_type: str,
+                     priority: int = PRIORITY_NORMAL, key: str | None = None):
+    """key — идентичность события (см. alert_key)."""
     if not alert_type:
         logging.warning("send_alert вызван без указания alert_type")
         return
 
-    sent_count = 0
-    users_to_alert = []
-    for user_id, config_data in ALERTS_CONFIG.items(
-    ):  # Переименовано во избежание конфликта
-        if config_data.get(alert_type, False):
-            users_to_alert.append(user_id)
+    # --- ИЗМЕНЕНО: Подписчики берутся из обратного индекса, без обхода всех настроек ---
+    users_to_alert = SUBSCRIPTIONS.subscribers(alert_type)
+    # -------------------------------------------------------------------------------
 
     if not users_to_alert:
         # --- ИЗМЕНЕНО: Используем i18n (язык по умолчанию для логов) ---
@@ -86,51 +116,22 @@ async def send_alert(bot: Bot, message: str, alert_type: str):
                  alert_type=alert_type, count=len(users_to_alert)))
     # -------------------------------------------------------------
 
-    for user_id in users_to_alert:
-        try:
-            # --- ИЗМЕНЕНО: Получаем язык пользователя и переводим сообщение ---
-            # (Предполагается, что `message` изначально на языке по умолчанию)
-            # Если `message` уже содержит ключ i18n, нужно будет переделать логику
-            # Но сейчас алерты генерируются с уже готовым текстом на языке по умолчанию.
-            # Мы просто отправляем этот текст. Для полноценного перевода алертов
-            # нужно передавать ключ и параметры, а не готовый текст.
-            # Пока оставим отправку оригинального сообщения.
-            # lang = get_user_lang(user_id)
-            # translated_message = _(key_from_message, lang, **params_from_message) # Примерно так
-            # await bot.send_message(user_id, translated_message,
-            # parse_mode="HTML")
-
-            # ВРЕМЕННО: Отправляем оригинальное сообщение (которое на языке по
-            # умолчанию)
-            await bot.send_message(user_id, message, parse_mode="HTML")
-            # ----------------------------------------------------------------------
-
-            sent_count += 1
-            await asyncio.sleep(0.1)  # Задержка остается
-        except TelegramBadRequest as e:
-            if "chat not found" in str(
-                    e) or "bot was blocked by the user" in str(e):
-                logging.warning(
-                    f"Не удалось отправить алерт пользователю {user_id}: чат не найден или бот заблокирован.")
-            else:
-                logging.error(
-                    f"Неизвестная ошибка TelegramBadRequest при отправке алерта {user_id}: {e}")
-        except TelegramRetryAfter as e:  # Добавлена обработка RetryAfter
-            logging.warning(
-                f"send_alert: TelegramRetryAfter для {user_id}: Ждем {e.retry_after}с")
-            await asyncio.sleep(e.retry_after)
-            # Повторная попытка (опционально, можно просто пропустить)
-            try:
-                await bot.send_message(user_id, message, parse_mode="HTML")
-                sent_count += 1
-            except Exception as retry_e:
-                logging.error(
-                    f"Ошибка при повторной отправке алерта {user_id} после RetryAfter: {retry_e}")
-        except Exception as e:
-            logging.error(
-                f"Ошибка при отправке алерта пользователю {user_id}: {e}")
+    # --- ИЗМЕНЕНО: Алерт сначала пишется в очередь на диске (core/outbox.py),
+    # отправляет его OUTBOX_SENDER — параллельно, с повторами и после рестарта ---
+    # Текст алерта уже на языке по умолчанию, отправляется как есть
+    try:
+        # Запись в sqlite — в потоке: при занятой блокировке (watchdog, отправитель)
+        # ожидание не должно останавливать event loop
+        queued_count = await asyncio.to_thread(
+            OUTBOX.enqueue, list(users_to_alert), message,
+            key=alert_key(alert_type, key), priority=priority)
+    except sqlite3.Error as e:
+        logging.error(f"Очередь исходящих недоступна, алерт отправляется напрямую: {e}")
+        await asyncio.gather(*(DELIVERY.send(bot, user_id, message, priority=priority)
+                               for user_id in users_to_alert))
+        return
+    OUTBOX_SENDER.wake()
+    # -------------------------------------------------------------------------
 
-    # --- ИЗМЕНЕНО: Используем i18n (язык по умолчанию для логов) ---
-    logging.info(_("alert_sent_to_users", config.DEFAULT_LANGUAGE,
-                 alert_type=alert_type, count=sent_count))
-    # -------------------------------------------------------------
+    logging.info(_("alert_queued_for_users", config.DEFAULT_LANGUAGE,
+                 alert_type=alert_type, count=queued_count))
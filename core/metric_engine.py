@@ -0,0 +1,139 @@
+# /opt-tg-bot/core/metric_engine.py
+import logging
+from typing import Callable, NamedTuple
+
+from .i18n import _
+from .config import RESOURCE_ALERT_COOLDOWN
+
+
+class Sample:
+    """
+    Общий снимок системы на один тик. Пробы (psutil.virtual_memory и т.п.)
+    вызываются лениво и не более одного раза, сколько бы метрик их ни читало.
+    """
+
+    def __init__(self):
+        self._cache = {}
+
+    def read(self, probe: Callable[[], object]):
+        if probe not in self._cache:
+            self._cache[probe] = probe()
+        return self._cache[probe]
+
+
+class MetricRule(NamedTuple):
+    """
+    Описание метрики. Алерт — когда значение держится >= threshold не меньше
+    min_duration секунд; повтор — не чаще cooldown; нормализация — только
+    когда значение опустится ниже recovery (гистерезис).
+    Тексты: i18n-ключи alert_<key или name>_high / _high_repeat / _normal,
+    params — дополнительные параметры текста (например, точка монтирования):
+    словарь или функция lang -> словарь, если они меняются от замера к замеру,
+    details(lang) — текст, добавляемый к алерту о превышении (например, топ процессов).
+    """
+    name: str
+    sampler: Callable[[Sample], float | None]
+    threshold: float
+    recovery: float
+    min_duration: float = 0
+    cooldown: float = RESOURCE_ALERT_COOLDOWN
+    key: str | None = None
+    params: dict | Callable[[str], dict] | None = None
+    details: Callable[[str], str] | None = None
+
+
+class MetricAlert(NamedTuple):
+    """
+    Текст алерта и его идентичность для очереди исходящих:
+    "<метрика>:<переход>:<время перехода>" — разные переходы с одинаковым
+    текстом не сливаются в один.
+    """
+    key: str
+    text: str
+
+
+class _MetricState:
+    def __init__(self):
+        self.active = False
+        self.above_since = None
+        self.last_alert = 0.0
+
+
+def _with_details(rule: MetricRule, text: str, lang: str) -> str:
+    if rule.details is None:
+        return text
+    try:
+        details = rule.details(lang)
+    except Exception as e:
+        logging.error(f"Ошибка подготовки деталей алерта {rule.name}: {e}")
+        return text
+    return f"{text}\n\n{details}" if details else text
+
+
+class MetricEngine:
+    """Таблица метрик: один общий снимок на тик, оценка всех правил по нему."""
+
+    def __init__(self):
+        self.rules: dict[str, MetricRule] = {}
+        self._states: dict[str, _MetricState] = {}
+
+    def register(self, rule: MetricRule):
+        if rule.recovery > rule.threshold:
+            raise ValueError(
+                f"Метрика {rule.name}: порог восстановления выше порога алерта")
+        self.rules[rule.name] = rule
+        self._states[rule.name] = _MetricState()
+
+    def unregister(self, name: str):
+        self.rules.pop(name, None)
+        self._states.pop(name, None)
+
+    def sample_sync(self) -> dict[str, float | None]:
+        """Снимает значения всех метрик (блокирующая, вызывать в потоке)."""
+        sample = Sample()
+        values = {}
+        for name, rule in self.rules.items():
+            try:
+                values[name] = rule.sampler(sample)
+            except Exception as e:
+                logging.error(f"Ошибка чтения метрики {name}: {e}")
+                values[name] = None
+        return values
+
+    def evaluate(self, values: dict[str, float | None], now: float,
+                 lang: str) -> list[MetricAlert]:
+        """Обновляет состояния метрик и возвращает алерты."""
+        messages = []
+        for name, rule in self.rules.items():
+            value = values.get(name)
+            if value is None:
+                continue
+            state = self._states[name]
+            key = rule.key or name
+            params = rule.params(lang) if callable(rule.params) else rule.params or {}
+            if not state.active:
+                if value < rule.threshold:
+                    state.above_since = None
+                    continue
+                if state.above_since is None:
+                    state.above_since = now
+                if now - state.above_since >= rule.min_duration:
+                    messages.append(MetricAlert(f"{name}:high:{now:.0f}", _with_details(rule, _(
+                        f"alert_{key}_high", lang, usage=value,
+                        threshold=rule.threshold, **params), lang)))
+                    logging.info(f"Сгенерирован алерт {name}.")
+                    state.active = True
+                    state.last_alert = now
+            elif value < rule.recovery:
+                messages.append(MetricAlert(f"{name}:normal:{now:.0f}", _(
+                    f"alert_{key}_normal", lang, usage=value, **params)))
+                logging.info(f"Сгенерирован алерт нормализации {name}.")
+                state.active = False
+                state.above_since = None
+            elif value >= rule.threshold and now - state.last_alert > rule.cooldown:
+                messages.append(MetricAlert(f"{name}:repeat:{now:.0f}", _with_details(rule, _(
+                    f"alert_{key}_high_repeat", lang, usage=value,
+                    threshold=rule.threshold, **params), lang)))
+                logging.info(f"Сгенерирован повторный алерт {name}.")
+                state.last_alert = now
+        return messages
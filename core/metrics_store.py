@@ -0,0 +1,198 @@
+# /opt-tg-bot/core/metrics_store.py
+import os
+import mmap
+import math
+import time
+import struct
+import asyncio
+import logging
+import threading
+from bisect import bisect_left, bisect_right
+from typing import NamedTuple
+
+import psutil
+
+from .utils import get_host_path
+from .cpu_sampler import CPU_SAMPLER
+from .config import (
+    METRICS_STORE_FILE, METRICS_STORE_INTERVAL, METRICS_STORE_CAPACITY
+)
+
+# Заголовок: magic, размер записи, емкость, индекс следующей записи, число записей
+_MAGIC = b"TGBMTS01"
+_HEADER = struct.Struct("<8sIIQQ")
+_DATA_OFFSET = 64
+# Запись: время (unix), cpu %, ram %, disk %, rx байт, tx байт, load average 1m
+_RECORD = struct.Struct("<dfffQQf")
+
+
+class MetricRecord(NamedTuple):
+    timestamp: float
+    cpu: float
+    ram: float
+    disk: float
+    rx: int
+    tx: int
+    load: float
+
+
+class _Timestamps:
+    """Последовательность времен записей в логическом порядке (для bisect)."""
+
+    def __init__(self, store: "MetricsStore"):
+        self.store = store
+
+    def __len__(self):
+        return self.store._count
+
+    def __getitem__(self, index):
+        return _RECORD.unpack_from(
+            self.store._mm, self.store._offset(index))[0]
+
+
+class MetricsStore:
+    """
+    Хранилище метрик хоста: кольцевой файл фиксированного размера
+    (mmap, записи по 40 байт). Добавление — O(1), чтение диапазона —
+    бинарный поиск по времени. Старые записи перезаписываются новыми.
+    Пишет фоновая задача, читают графики из потоков — доступ под блокировкой.
+    """
+
+    def __init__(self, path: str, capacity: int):
+        self.path = path
+        self.capacity = capacity
+        self._file = None
+        self._mm = None
+        self._next = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    # --- Файл ---
+    def _open(self):
+        if self._mm is not None:
+            return
+        size = _DATA_OFFSET + _RECORD.size * self.capacity
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._file = os.fdopen(fd, "r+b")
+        header = self._file.read(_HEADER.size)
+        valid = False
+        if len(header) == _HEADER.size:
+            magic, record_size, capacity, next_index, count = _HEADER.unpack(header)
+            valid = (magic == _MAGIC and record_size == _RECORD.size
+                     and capacity == self.capacity and next_index < capacity
+                     and count <= capacity)
+            if not valid:
+                logging.warning(
+                    f"MetricsStore: формат {self.path} не совпадает, файл пересоздан.")
+        if not valid:
+            next_index = count = 0
+            self._file.truncate(0)
+        self._file.truncate(size)
+        self._mm = mmap.mmap(self._file.fileno(), size)
+        self._next, self._count = next_index, count
+        if not valid:
+            self._write_header()
+        logging.info(f"MetricsStore: {self.path}, записей {self._count}/{self.capacity}")
+
+    def _write_header(self):
+        _HEADER.pack_into(self._mm, 0, _MAGIC, _RECORD.size, self.capacity,
+                          self._next, self._count)
+
+    def _offset(self, index: int) -> int:
+        """Смещение записи по логическому индексу (0 — самая старая)."""
+        physical = (self._next - self._count + index) % self.capacity
+        return _DATA_OFFSET + physical * _RECORD.size
+
+    def _read(self, index: int) -> MetricRecord:
+        return MetricRecord(*_RECORD.unpack_from(self._mm, self._offset(index)))
+
+    # --- API ---
+    def append(self, record: MetricRecord):
+        with self._lock:
+            self._open()
+            if self._count and record.timestamp <= self._read(self._count - 1).timestamp:
+                logging.warning("MetricsStore: время пошло назад, запись пропущена.")
+                return
+            _RECORD.pack_into(self._mm, _DATA_OFFSET + self._next * _RECORD.size,
+                              *record)
+            self._next = (self._next + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+            self._write_header()
+            # Без msync на каждую запись: грязные страницы MAP_SHARED ядро запишет
+            # само (и после падения процесса), явный flush — в close()
+
+    def __len__(self):
+        with self._lock:
+            self._open()
+            return self._count
+
+    def last(self) -> MetricRecord | None:
+        with self._lock:
+            self._open()
+            return self._read(self._count - 1) if self._count else None
+
+    def range(self, start: float, end: float) -> list[MetricRecord]:
+        """Записи с start <= timestamp <= end (по возрастанию времени)."""
+        with self._lock:
+            self._open()
+            timestamps = _Timestamps(self)
+            first = bisect_left(timestamps, start)
+            stop = bisect_right(timestamps, end)
+            return [self._read(index) for index in range(first, stop)]
+
+    def nearest(self, timestamp: float) -> MetricRecord | None:
+        """Ближайшая по времени запись (например, "что было в 03:00")."""
+        with self._lock:
+            self._open()
+            if not self._count:
+                return None
+            index = bisect_left(_Timestamps(self), timestamp)
+            candidates = [self._read(i) for i in (index - 1, index)
+                          if 0 <= i < self._count]
+            return min(candidates, key=lambda r: abs(r.timestamp - timestamp))
+
+    def close(self):
+        with self._lock:
+            if self._mm is not None:
+                self._mm.flush()
+                self._mm.close()
+                self._mm = None
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+METRICS_STORE = MetricsStore(METRICS_STORE_FILE, METRICS_STORE_CAPACITY)
+
+
+def collect_record_sync() -> MetricRecord:
+    """Снимок метрик хоста для хранилища (блокирующая, вызывать в потоке)."""
+    cpu = CPU_SAMPLER.stats(METRICS_STORE_INTERVAL)
+    counters = psutil.net_io_counters()
+    return MetricRecord(
+        timestamp=time.time(),
+        cpu=cpu.avg if cpu else math.nan,
+        ram=psutil.virtual_memory().percent,
+        disk=psutil.disk_usage(get_host_path('/')).percent,
+        rx=counters.bytes_recv,
+        tx=counters.bytes_sent,
+        load=os.getloadavg()[0])
+
+
+async def record_metrics(store: MetricsStore):
+    """Фоновая запись метрик каждые METRICS_STORE_INTERVAL секунд."""
+    logging.info(f"Запись метрик запущена (каждые {METRICS_STORE_INTERVAL} сек).")
+    try:
+        while True:
+            await asyncio.sleep(METRICS_STORE_INTERVAL)
+            try:
+                record = await asyncio.to_thread(collect_record_sync)
+                # Запись — под блокировкой, которую держат чтения графиков в потоках
+                await asyncio.to_thread(store.append, record)
+            except Exception as e:
+                logging.error(f"Ошибка записи метрик: {e}")
+    except asyncio.CancelledError:
+        logging.info("Запись метрик остановлена.")
+    finally:
+        store.close()
@@ -0,0 +1,234 @@
+# /opt-tg-bot/core/outbox.py
+import os
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from typing import NamedTuple
+
+from .config import (
+    OUTBOX_FILE, OUTBOX_BACKOFF_BASE, OUTBOX_BACKOFF_MAX, OUTBOX_MAX_AGE,
+    OUTBOX_SENT_RETENTION
+)
+
+PENDING, SENT, FAILED = "pending", "sent", "failed"
+
+# Классы приоритета (меньше — раньше)
+PRIORITY_CRITICAL = 0  # Ресурсы, аномалии трафика, падение сервиса
+PRIORITY_NORMAL = 1    # Входы, баны
+PRIORITY_BULK = 2      # Сводки, правки "живых" сообщений
+
+
+class OutboxItem(NamedTuple):
+    id: int
+    key: str
+    chat_id: int
+    text: str
+    parse_mode: str | None
+    attempts: int
+    created_at: float
+    priority: int
+
+
+def backoff_delay(attempts: int) -> float:
+    """Экспоненциальная задержка перед повтором (attempts — уже сделано попыток)."""
+    return min(OUTBOX_BACKOFF_MAX, OUTBOX_BACKOFF_BASE * 2 ** max(0, attempts - 1))
+
+
+class Outbox:
+    """
+    Очередь исходящих сообщений на диске (sqlite, WAL): алерт сначала
+    записывается, потом отправляется, поэтому не теряется ни при недоступном
+    API, ни при перезапуске. Пара (ключ алерта, chat_id) уникальна —
+    повторная постановка того же алерта не создает дублей.
+    Очередь разбирают бот и watchdog (разные процессы): строка перед отправкой
+    "арендуется" сдвигом next_attempt, поэтому одно сообщение не уйдет дважды.
+    Для отправленных хранится message_id: текст алерта можно уточнить позже
+    (replace_text), например подставить флаг страны вместо "⏳".
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _get_conn(self):
+        # Вызывается только под self._lock
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            # isolation_level=None: транзакции открываются явно (BEGIN IMMEDIATE)
+            self._conn = sqlite3.connect(
+                self.db_path, timeout=10, isolation_level=None,
+                check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, "
+                "chat_id INTEGER NOT NULL, text TEXT NOT NULL, parse_mode TEXT, "
+                "status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+                "created_at REAL NOT NULL, next_attempt REAL NOT NULL, "
+                "updated_at REAL NOT NULL, last_error TEXT, "
+                f"priority INTEGER NOT NULL DEFAULT {PRIORITY_NORMAL}, message_id INTEGER, "
+                "UNIQUE (key, chat_id))")
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(outbox)")}
+            if "priority" not in columns:  # База старой версии, без приоритетов
+                self._conn.execute(
+                    "ALTER TABLE outbox ADD COLUMN priority INTEGER NOT NULL "
+                    f"DEFAULT {PRIORITY_NORMAL}")
+            if "message_id" not in columns:  # База старой версии, без message_id
+                self._conn.execute("ALTER TABLE outbox ADD COLUMN message_id INTEGER")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt)")
+            pending = self._conn.execute(
+                "SELECT COUNT(*) FROM outbox WHERE status = ?", (PENDING,)).fetchone()[0]
+            logging.info(f"Очередь исходящих открыта: {self.db_path} (ожидают: {pending})")
+        return self._conn
+
+    def enqueue(self, chat_ids: list[int], text: str, key: str | None = None,
+                parse_mode: str | None = "HTML",
+                priority: int = PRIORITY_NORMAL) -> int:
+        """Ставит сообщение в очередь для каждого чата; возвращает число новых строк."""
+        key = key or uuid.uuid4().hex
+        now = time.time()
+        rows = [(key, chat_id, text, parse_mode, PENDING, now, now, now, priority)
+                for chat_id in chat_ids]
+        with self._lock:
+            conn = self._get_conn()
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO outbox (key, chat_id, text, parse_mode, status, "
+                "created_at, next_attempt, updated_at, priority) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            return conn.total_changes - before
+
+    def claim_due(self, limit: int, lease: float) -> list[OutboxItem]:
+        """
+        Забирает до limit готовых к отправке строк (сначала приоритетные),
+        откладывая их на lease секунд: если отправитель упадет, строки
+        вернутся в работу после аренды.
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._get_conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                expired = conn.execute(
+                    "UPDATE outbox SET status = ?, updated_at = ?, "
+                    "last_error = COALESCE(last_error, 'expired') "
+                    "WHERE status = ? AND created_at < ?",
+                    (FAILED, now, PENDING, now - OUTBOX_MAX_AGE)).rowcount
+                rows = conn.execute(
+                    "SELECT id, key, chat_id, text, parse_mode, attempts, created_at, priority "
+                    "FROM outbox WHERE status = ? AND next_attempt <= ? "
+                    "ORDER BY priority, id LIMIT ?", (PENDING, now, limit)).fetchall()
+                conn.executemany(
+                    "UPDATE outbox SET next_attempt = ? WHERE id = ?",
+                    [(now + lease, row[0]) for row in rows])
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        if expired:
+            logging.warning(f"Очередь исходящих: {expired} сообщений устарели и не будут отправлены")
+        return [OutboxItem(*row) for row in rows]
+
+    def extend_lease(self, item_ids: list[int], lease: float):
+        """Продлевает аренду строк, которые еще отправляются (долгий RetryAfter)."""
+        if not item_ids:
+            return
+        with self._lock:
+            self._get_conn().executemany(
+                "UPDATE outbox SET next_attempt = ? WHERE id = ? AND status = ?",
+                [(time.time() + lease, item_id, PENDING) for item_id in item_ids])
+
+    def mark_sent(self, item_id: int, message_id: int | None = None) -> str | None:
+        """
+        Отмечает строку доставленной. Возвращает текущий текст строки: если он
+        уже не тот, что был отправлен (replace_text во время отправки),
+        сообщение нужно поправить.
+        """
+        with self._lock:
+            conn = self._get_conn()
+            conn.execute(
+                "UPDATE outbox SET status = ?, attempts = attempts + 1, updated_at = ?, "
+                "last_error = NULL, message_id = ? WHERE id = ?",
+                (SENT, time.time(), message_id, item_id))
+            row = conn.execute("SELECT text FROM outbox WHERE id = ?", (item_id,)).fetchone()
+        return row[0] if row else None
+
+    def replace_text(self, key: str, text: str) -> list[tuple[int, int]]:
+        """
+        Меняет текст всех строк алерта с ключом key. Ждущие отправки уйдут
+        с новым текстом; возвращает (chat_id, message_id) уже доставленных —
+        их нужно поправить через Bot API.
+        """
+        with self._lock:
+            conn = self._get_conn()
+            conn.execute("UPDATE outbox SET text = ? WHERE key = ?", (text, key))
+            return conn.execute(
+                "SELECT chat_id, message_id FROM outbox "
+                "WHERE key = ? AND status = ? AND message_id IS NOT NULL",
+                (key, SENT)).fetchall()
+
+    def mark_failed(self, item_id: int, error: str):
+        """Окончательная ошибка (чат не найден, бот заблокирован) — без повторов."""
+        self._finish(item_id, FAILED, error)
+
+    def _finish(self, item_id: int, status: str, error: str | None):
+        with self._lock:
+            self._get_conn().execute(
+                "UPDATE outbox SET status = ?, attempts = attempts + 1, updated_at = ?, "
+                "last_error = ? WHERE id = ?", (status, time.time(), error, item_id))
+
+    def retry(self, item_id: int, error: str, delay: float | None = None):
+        """Временная ошибка: следующая попытка через delay (по умолчанию — backoff)."""
+        now = time.time()
+        with self._lock:
+            conn = self._get_conn()
+            attempts = conn.execute(
+                "SELECT attempts FROM outbox WHERE id = ?", (item_id,)).fetchone()
+            if attempts is None:
+                return
+            attempts = attempts[0] + 1
+            if delay is None:
+                delay = backoff_delay(attempts)
+            conn.execute(
+                "UPDATE outbox SET attempts = ?, next_attempt = ?, updated_at = ?, "
+                "last_error = ? WHERE id = ?",
+                (attempts, now + delay, now, error, item_id))
+        logging.info(f"Очередь исходящих: повтор #{attempts} для {item_id} через {delay:.0f}с ({error})")
+
+    def cancel(self, key: str) -> int:
+        """Снимает с отправки еще не доставленные строки алерта с ключом key."""
+        with self._lock:
+            return self._get_conn().execute(
+                "DELETE FROM outbox WHERE key = ? AND status = ?",
+                (key, PENDING)).rowcount
+
+    def next_due_in(self) -> float | None:
+        """Через сколько секунд появится строка для отправки (None — очередь пуста)."""
+        with self._lock:
+            row = self._get_conn().execute(
+                "SELECT MIN(next_attempt) FROM outbox WHERE status = ?",
+                (PENDING,)).fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def purge(self) -> int:
+        """Удаляет завершенные строки старше OUTBOX_SENT_RETENTION."""
+        with self._lock:
+            return self._get_conn().execute(
+                "DELETE FROM outbox WHERE status != ? AND updated_at < ?",
+                (PENDING, time.time() - OUTBOX_SENT_RETENTION)).rowcount
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+OUTBOX = Outbox(OUTBOX_FILE)
@@ -0,0 +1,84 @@
+# /opt-tg-bot/core/process_tracker.py
+import heapq
+import threading
+from operator import itemgetter
+from typing import NamedTuple
+
+import psutil
+
+from .i18n import _
+from .utils import escape_html, format_traffic
+from .config import TOP_PROCESSES_COUNT
+
+
+class ProcessInfo(NamedTuple):
+    pid: int
+    name: str
+    cpu: float   # % от всех ядер (как общая загрузка CPU)
+    rss: int     # байт
+
+
+class ProcessTracker:
+    """
+    Топ процессов по CPU и RSS. Объекты psutil.Process живут между тиками,
+    поэтому cpu_percent — реальная загрузка за интервал между замерами.
+    За проход читаются только /proc/<pid>/stat и statm; имена — лишь для топа.
+    """
+
+    def __init__(self, count: int):
+        self.count = count
+        self._procs: dict[int, psutil.Process] = {}
+        self._top: dict[str, list[ProcessInfo]] = {"cpu": [], "ram": []}
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Один проход по процессам (блокирующая, вызывать в потоке)."""
+        cpus = psutil.cpu_count() or 1
+        procs = {}
+        stats = []
+        for pid in psutil.pids():
+            proc = self._procs.get(pid)
+            try:
+                if proc is None:
+                    proc = psutil.Process(pid)  # Первый cpu_percent() — 0.0, замер с этого тика
+                with proc.oneshot():
+                    cpu = proc.cpu_percent(None) / cpus
+                    rss = proc.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.ZombieProcess, psutil.AccessDenied):
+                continue
+            procs[pid] = proc
+            stats.append((proc, cpu, rss))
+        self._procs = procs
+        top = {"cpu": self._describe(heapq.nlargest(self.count, stats, key=itemgetter(1))),
+               "ram": self._describe(heapq.nlargest(self.count, stats, key=itemgetter(2)))}
+        with self._lock:
+            self._top = top
+
+    def _describe(self, stats) -> list[ProcessInfo]:
+        result = []
+        for proc, cpu, rss in stats:
+            try:
+                name = proc.name()
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                name = "?"
+            result.append(ProcessInfo(proc.pid, name, cpu, rss))
+        return result
+
+    def top(self, kind: str) -> list[ProcessInfo]:
+        with self._lock:
+            return list(self._top.get(kind, []))
+
+    def format_top(self, kind: str, lang: str) -> str:
+        """Текст для алерта: kind — "cpu" или "ram"."""
+        processes = self.top(kind)
+        if not processes:
+            return ""
+        lines = [_(f"alert_top_{kind}_header", lang)]
+        for info in processes:
+            lines.append(_("alert_top_process", lang, pid=info.pid,
+                           name=escape_html(info.name), cpu=info.cpu,
+                           rss=format_traffic(info.rss, lang)))
+        return "\n".join(lines)
+
+
+PROCESS_TRACKER = ProcessTracker(TOP_PROCESSES_COUNT)
@@ -0,0 +1,62 @@
+# /opt-tg-bot/core/rate_limit.py
+import time
+import asyncio
+
+
+class TokenBucket:
+    """
+    Классический token bucket: rate токенов в секунду, не больше capacity.
+    pause(seconds) обнуляет бюджет и замораживает пополнение
+    (например, по ответу 429 или заголовкам лимита от сервера).
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        # Момент, с которого идет пополнение (может быть в будущем при паузе)
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        if now > self._updated:
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def available(self) -> float:
+        """Текущее количество токенов (0 во время паузы)."""
+        self._refill()
+        return self._tokens
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        """Забирает токены, если они есть. Не блокирует."""
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    def delay(self, tokens: float = 1) -> float:
+        """Сколько секунд ждать, пока накопится tokens."""
+        self._refill()
+        wait = max(0.0, self._updated - time.monotonic())
+        missing = tokens - self._tokens
+        if missing > 0:
+            wait += missing / self.rate
+        return wait
+
+    async def acquire(self, tokens: float = 1):
+        """Ждет и забирает токены."""
+        while not self.try_acquire(tokens):
+            await asyncio.sleep(self.delay(tokens))
+
+    def pause(self, seconds: float):
+        """Обнуляет бюджет и запрещает пополнение на seconds секунд."""
+        self._refill()
+        self._tokens = 0
+        self._updated = max(self._updated, time.monotonic() + seconds)
+
+    @property
+    def paused(self) -> bool:
+        return self._updated > time.monotonic()
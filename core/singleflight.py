@@ -0,0 +1,44 @@
+# /opt-tg-bot/core/singleflight.py
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """
+    Дедупликация одновременных запросов по ключу (single-flight).
+    Пока задача для ключа выполняется, все остальные вызовы с тем же ключом
+    ждут ее результат (или исключение) вместо запуска собственной.
+    Результат не кешируется: после завершения следующий вызов начнет новую задачу.
+    """
+
+    def __init__(self, name: str = "singleflight"):
+        self.name = name
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    def _register(self, key: Hashable, future: asyncio.Future):
+        self._inflight[key] = future
+
+        def _cleanup(done: asyncio.Future):
+            if self._inflight.get(key) is done:
+                del self._inflight[key]
+            # Помечаем исключение как полученное: ожидающие могли быть отменены
+            if not done.cancelled():
+                done.exception()
+
+        future.add_done_callback(_cleanup)
+
+    async def do(self, key: Hashable,
+                 factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Выполняет factory() один раз для всех одновременных вызовов с key."""
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(factory())
+            self._register(key, future)
+        else:
+            logging.debug(f"{self.name}: ожидание уже запущенной задачи для {key}")
+        # shield: отмена одного из ожидающих не отменяет общую задачу
+        return await asyncio.shield(future)
@@ -0,0 +1,119 @@
+# /opt-tg-bot/core/subscriptions.py
+import os
+import json
+import asyncio
+import logging
+
+from .config import ALERTS_CONFIG_FILE, SUBSCRIPTIONS_SAVE_DELAY
+
+ALERT_TYPES = ("resources", "logins", "bans")
+
+
+class SubscriptionRegistry:
+    """
+    Подписки на алерты: {user_id: {alert_type: настройка}} и обратный индекс
+    alert_type -> множество user_id, который обновляется при каждом изменении.
+    Настройка сейчас True/False; любое истинное значение (например, словарь
+    фильтров пользователя) считается подпиской и попадает в индекс.
+    Запись на диск откладывается на SUBSCRIPTIONS_SAVE_DELAY секунд и
+    объединяет серию переключений в одну.
+    """
+
+    def __init__(self, path: str, save_delay: float):
+        self.path = path
+        self.save_delay = save_delay
+        self._configs: dict[int, dict] = {}
+        self._index: dict[str, set[int]] = {}
+        self._dirty = False
+        self._save_handle = None
+
+    def load(self):
+        """Загружает подписки и строит индекс."""
+        configs = {}
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, "r", encoding='utf-8') as f:
+                    loaded_data = json.load(f)
+                configs = {int(k): v for k, v in loaded_data.items()}
+                logging.info("Настройки уведомлений загружены.")
+            else:
+                logging.info(
+                    "Файл настроек уведомлений не найден, используется пустой конфиг.")
+        except (OSError, ValueError, AttributeError) as e:
+            logging.error(f"Ошибка загрузки {self.path}: {e}", exc_info=True)
+        for user_id, user_config in list(configs.items()):
+            if not isinstance(user_config, dict):
+                logging.warning(
+                    f"Некорректные настройки уведомлений для {user_id} пропущены: {user_config!r}")
+                del configs[user_id]
+        self._configs = configs
+        self._index = {}
+        for user_id, user_config in configs.items():
+            for alert_type, value in user_config.items():
+                if value:
+                    self._index.setdefault(alert_type, set()).add(user_id)
+
+    def get(self, user_id: int, alert_type: str):
+        return self._configs.get(user_id, {}).get(alert_type, False)
+
+    def is_enabled(self, user_id: int, alert_type: str) -> bool:
+        return user_id in self._index.get(alert_type, ())
+
+    def subscribers(self, alert_type: str) -> frozenset[int]:
+        """Подписчики типа — без обхода всех пользователей."""
+        return frozenset(self._index.get(alert_type, ()))
+
+    def set_alert(self, user_id: int, alert_type: str, value):
+        self._configs.setdefault(user_id, {})[alert_type] = value
+        subscribers = self._index.setdefault(alert_type, set())
+        if value:
+            subscribers.add(user_id)
+        else:
+            subscribers.discard(user_id)
+        self._schedule_save()
+
+    def toggle(self, user_id: int, alert_type: str) -> bool:
+        """Переключает подписку; возвращает новое состояние."""
+        new_state = not self.is_enabled(user_id, alert_type)
+        self.set_alert(user_id, alert_type, new_state)
+        return new_state
+
+    def remove_user(self, user_id: int):
+        """Удаляет все подписки пользователя (при удалении из бота)."""
+        user_config = self._configs.pop(user_id, None)
+        if user_config is None:
+            return
+        for alert_type in user_config:
+            self._index.get(alert_type, set()).discard(user_id)
+        self._schedule_save()
+
+    def _schedule_save(self):
+        self._dirty = True
+        if self._save_handle is None:
+            try:
+                self._save_handle = asyncio.get_running_loop().call_later(
+                    self.save_delay, self.flush)
+            except RuntimeError:
+                self.flush()  # Вне event loop — пишем сразу
+
+    def flush(self):
+        """Сохраняет подписки на диск, если они менялись."""
+        if self._save_handle is not None:
+            self._save_handle.cancel()
+            self._save_handle = None
+        if not self._dirty:
+            return
+        tmp_path = self.path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            config_to_save = {str(k): v for k, v in self._configs.items()}
+            with open(tmp_path, "w", encoding='utf-8') as f:
+                json.dump(config_to_save, f, indent=4, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+            logging.info("Настройки уведомлений сохранены.")
+        except OSError as e:
+            logging.error(f"Ошибка сохранения {self.path}: {e}", exc_info=True)
+
+
+SUBSCRIPTIONS = SubscriptionRegistry(ALERTS_CONFIG_FILE, SUBSCRIPTIONS_SAVE_DELAY)
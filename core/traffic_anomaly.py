@@ -0,0 +1,190 @@
+# /opt-tg-bot/core/traffic_anomaly.py
+import os
+import json
+import math
+import time
+import logging
+from datetime import datetime
+
+import psutil
+
+from .i18n import _
+from .metric_engine import MetricEngine, MetricRule
+from .config import (
+    TRAFFIC_BASELINE_FILE, TRAFFIC_ANOMALY_ALPHA, TRAFFIC_ANOMALY_SIGMA,
+    TRAFFIC_ANOMALY_RECOVERY_SIGMA, TRAFFIC_ANOMALY_MIN_DURATION,
+    TRAFFIC_ANOMALY_WARMUP, TRAFFIC_ANOMALY_MIN_MBPS, TRAFFIC_ANOMALY_MIN_PPS,
+    TRAFFIC_BASELINE_SAVE_INTERVAL
+)
+
+# Скорости: байт/с и пакетов/с
+TRAFFIC_METRICS = ("rx_bytes", "tx_bytes", "rx_packets", "tx_packets")
+_FLOORS = {"rx_bytes": TRAFFIC_ANOMALY_MIN_MBPS * 1_000_000 / 8,
+           "tx_bytes": TRAFFIC_ANOMALY_MIN_MBPS * 1_000_000 / 8,
+           "rx_packets": TRAFFIC_ANOMALY_MIN_PPS,
+           "tx_packets": TRAFFIC_ANOMALY_MIN_PPS}
+
+
+def read_counters() -> dict[str, int]:
+    """Суммарные счетчики всех интерфейсов, кроме loopback."""
+    totals = dict.fromkeys(TRAFFIC_METRICS, 0)
+    for nic, counters in psutil.net_io_counters(pernic=True).items():
+        if nic == "lo":
+            continue
+        totals["rx_bytes"] += counters.bytes_recv
+        totals["tx_bytes"] += counters.bytes_sent
+        totals["rx_packets"] += counters.packets_recv
+        totals["tx_packets"] += counters.packets_sent
+    return totals
+
+
+class Baseline:
+    """Экспоненциально взвешенные среднее и дисперсия (EWMA/EWMVar)."""
+    __slots__ = ("mean", "var", "count")
+
+    def __init__(self, mean: float = 0.0, var: float = 0.0, count: int = 0):
+        self.mean = mean
+        self.var = var
+        self.count = count
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.var)
+
+    def update(self, value: float, alpha: float):
+        self.count += 1
+        # Пока замеров мало — обычное среднее, иначе первые значения весят слишком много
+        alpha = max(alpha, 1 / self.count)
+        diff = value - self.mean
+        increment = alpha * diff
+        self.mean += increment
+        self.var = (1 - alpha) * (self.var + diff * increment)
+
+
+class TrafficAnomalyDetector:
+    """
+    Базовые линии rx/tx (байт/с и пакетов/с) отдельно для каждого часа суток.
+    observe() переводит скорость в число стандартных отклонений от среднего
+    часа ("сигмы") и обучает базовую линию. Порог, гистерезис, длительность
+    и повтор алерта — правила MetricEngine "traffic:<метрика>" (register_rules):
+    алерт — выше TRAFFIC_ANOMALY_SIGMA сигм дольше TRAFFIC_ANOMALY_MIN_DURATION.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._baselines: dict[str, list[Baseline]] | None = None
+        self._distances: dict[str, float] = {}
+        # Последний замер для текста алерта: (скорость, среднее часа)
+        self._last: dict[str, tuple[float, float]] = {}
+        self._prev = None
+        self._saved_at = time.monotonic()
+
+    # --- Базовые линии ---
+    def _load(self) -> dict[str, list[Baseline]]:
+        if self._baselines is None:
+            self._baselines = {metric: [Baseline() for _hour in range(24)]
+                               for metric in TRAFFIC_METRICS}
+            try:
+                if os.path.exists(self.path):
+                    with open(self.path, "r", encoding='utf-8') as f:
+                        loaded = json.load(f)
+                    for metric, hours in loaded.items():
+                        if metric in self._baselines and len(hours) == 24:
+                            self._baselines[metric] = [Baseline(*hour) for hour in hours]
+            except (OSError, ValueError, TypeError) as e:
+                logging.error(f"Ошибка загрузки {self.path}: {e}")
+        return self._baselines
+
+    def save(self):
+        """
+        Сохраняет базовые линии: обучение не начинается заново после рестарта
+        (блокирующая, вызывать в потоке).
+        """
+        if self._baselines is None:
+            return
+        data = {metric: [[b.mean, b.var, b.count] for b in hours]
+                for metric, hours in self._baselines.items()}
+        tmp_path = self.path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp_path, "w", encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.error(f"Ошибка сохранения {self.path}: {e}")
+        self._saved_at = time.monotonic()
+
+    # --- Замер ---
+    def read_rates(self) -> dict[str, float] | None:
+        """Скорости с прошлого замера (блокирующая, вызывать в потоке)."""
+        now = time.monotonic()
+        counters = read_counters()
+        prev, self._prev = self._prev, (now, counters)
+        if prev is None:
+            return None
+        elapsed = now - prev[0]
+        if elapsed <= 0:
+            return None
+        rates = {}
+        for metric, value in counters.items():
+            delta = value - prev[1][metric]
+            if delta < 0:
+                return None  # Сброс счетчиков (интерфейс пересоздан)
+            rates[metric] = delta / elapsed
+        return rates
+
+    def _format(self, metric: str, value: float, lang: str) -> str:
+        if metric.endswith("_bytes"):
+            return _("traffic_anomaly_mbps", lang, value=value * 8 / 1_000_000)
+        return _("traffic_anomaly_pps", lang, value=value)
+
+    def observe(self, rates: dict[str, float], now: float):
+        """
+        Сравнивает скорости с базовой линией часа и обучает ее.
+        Результат — distance() для правил MetricEngine.
+        """
+        hour = datetime.fromtimestamp(now).hour
+        baselines = self._load()
+        for metric, value in rates.items():
+            baseline = baselines[metric][hour]
+            ready = baseline.count >= TRAFFIC_ANOMALY_WARMUP
+            self._last[metric] = (value, baseline.mean)
+            if not ready:
+                self._distances.pop(metric, None)  # Пока учимся — не оцениваем
+            elif value < _FLOORS[metric]:
+                self._distances[metric] = 0.0  # Ниже абсолютного минимума — не аномалия
+            elif baseline.std > 0:
+                self._distances[metric] = (value - baseline.mean) / baseline.std
+            else:
+                self._distances[metric] = math.inf if value > baseline.mean else 0.0
+
+            # Всплеск учитывается только до порога: флуд не становится "нормой" сразу,
+            # а устойчивый рост нагрузки постепенно поднимает базовую линию
+            threshold = max(baseline.mean + TRAFFIC_ANOMALY_SIGMA * baseline.std,
+                            _FLOORS[metric])
+            baseline.update(min(value, threshold) if ready else value, TRAFFIC_ANOMALY_ALPHA)
+
+    def distance(self, metric: str) -> float | None:
+        """Отклонение последнего замера в сигмах (None — нет данных или идет обучение)."""
+        return self._distances.get(metric)
+
+    def save_due(self) -> bool:
+        return time.monotonic() - self._saved_at >= TRAFFIC_BASELINE_SAVE_INTERVAL
+
+    def _text_params(self, metric: str, lang: str) -> dict:
+        value, mean = self._last.get(metric, (0.0, 0.0))
+        return {"metric": _(f"traffic_anomaly_{metric}", lang),
+                "value": self._format(metric, value, lang),
+                "baseline": self._format(metric, mean, lang)}
+
+    def register_rules(self, engine: MetricEngine):
+        """Правила "traffic:<метрика>": значение — отклонение в сигмах."""
+        for metric in TRAFFIC_METRICS:
+            engine.register(MetricRule(
+                f"traffic:{metric}",
+                lambda _sample, metric=metric: self.distance(metric),
+                TRAFFIC_ANOMALY_SIGMA, TRAFFIC_ANOMALY_RECOVERY_SIGMA,
+                TRAFFIC_ANOMALY_MIN_DURATION, key="traffic_anomaly",
+                params=lambda lang, metric=metric: self._text_params(metric, lang)))
+
+TRAFFIC_ANOMALY = TrafficAnomalyDetector(TRAFFIC_BASELINE_FILE)
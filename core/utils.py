@@ -1,7 +1,6 @@
 import os
 import json
 import logging
-import requests
 import re
 import asyncio
 import urllib.parse
@@ -9,14 +8,18 @@ import time
 from datetime import datetime
 from aiogram import Bot
 from aiogram.exceptions import TelegramBadRequest
+import aiohttp
 
 from . import config
-from . import shared_state
 from .i18n import get_text, get_user_lang
 from .config import INSTALL_MODE, DEPLOY_MODE
+from . import geoip
+from .geo_scheduler import (
+    GEO_SCHEDULER, PRIORITY_ALERT, PRIORITY_INTERACTIVE, PRIORITY_HISTORY
+)
 
 from .config import (
-    ALERTS_CONFIG_FILE, REBOOT_FLAG_FILE, RESTART_FLAG_FILE
+    REBOOT_FLAG_FILE, RESTART_FLAG_FILE
 )
 
 
@@ -40,49 +43,111 @@ def get_host_path(path: str) -> str:
     return path
 
 
-def load_alerts_config():
-    """Загружает ALERTS_CONFIG в shared_state"""
-    try:
-        if os.path.exists(ALERTS_CONFIG_FILE):
-            with open(ALERTS_CONFIG_FILE, "r", encoding='utf-8') as f:
-                loaded_data = json.load(f)
-                loaded_data_int_keys = {
-                    int(k): v for k, v in loaded_data.items()}
-                shared_state.ALERTS_CONFIG.clear()
-                shared_state.ALERTS_CONFIG.update(loaded_data_int_keys)
-            logging.info("Настройки уведомлений загружены.")
+def country_code_to_flag(country_code: str) -> str:
+    """Преобразует двухбуквенный код страны в эмодзи-флаг."""
+    return "".join(chr(ord(char) - 65 + 0x1F1E6)
+                   for char in country_code.upper())
+
+
+async def lookup_country(
+        identifier: str,
+        priority: int = PRIORITY_INTERACTIVE) -> tuple[str | None, str | None] | None:
+    """
+    Возвращает (country_code | None, country_name | None) для IP/кода.
+    Если загружена локальная база (GEOIP_DB_PATH) — ищет только в ней.
+    Иначе смотрит в GEO_CACHE, при промахе ставит запрос в GEO_SCHEDULER.
+    None — ответ еще не готов (лимит ip-api.com исчерпан / тайм-аут):
+    показывайте заглушку, результат позже попадет в кеш.
+    """
+    if geoip.OFFLINE_DB is not None:
+        return geoip.OFFLINE_DB.lookup(identifier)
+
+    cached = geoip.GEO_CACHE.get_memory(identifier)
+    if cached is None:
+        cached = await asyncio.to_thread(geoip.GEO_CACHE.get, identifier)
+    if cached is not None:
+        return cached
+
+    results = await GEO_SCHEDULER.resolve([identifier], priority)
+    return results.get(identifier)
+
+
+async def lookup_countries_batch(
+        identifiers: list[str],
+        priority: int = PRIORITY_HISTORY) -> dict[str, tuple[str | None, str | None] | None]:
+    """
+    Пакетный вариант lookup_country: промахи кеша разрешаются планировщиком
+    (через POST /batch, до GEOIP_BATCH_SIZE адресов за запрос).
+    """
+    if geoip.OFFLINE_DB is not None:
+        return {identifier: geoip.OFFLINE_DB.lookup(identifier)
+                for identifier in identifiers}
+
+    results = {}
+    misses = []
+    for identifier in identifiers:
+        cached = geoip.GEO_CACHE.get_memory(identifier)
+        if cached is not None:
+            results[identifier] = cached
         else:
-            shared_state.ALERTS_CONFIG.clear()
-            logging.info(
-                "Файл настроек уведомлений не найден, используется пустой конфиг.")
-    except json.JSONDecodeError as e:
-        logging.error(f"Ошибка JSON при загрузке alerts_config.json: {e}")
-        shared_state.ALERTS_CONFIG.clear()
-    except Exception as e:
-        logging.error(
-            f"Ошибка загрузки alerts_config.json: {e}",
-            exc_info=True)
-        shared_state.ALERTS_CONFIG.clear()
+            misses.append(identifier)
 
+    if misses:
+        # Промахи памяти — одним запросом к sqlite в потоке
+        results.update(await asyncio.to_thread(geoip.GEO_CACHE.get_many, misses))
+        misses = [identifier for identifier in misses if identifier not in results]
+    if misses:
+        results.update(await GEO_SCHEDULER.resolve(misses, priority))
+    return results
 
-def save_alerts_config():
-    """Сохраняет ALERTS_CONFIG из shared_state"""
+
+async def resolve_many(ips, priority: int = PRIORITY_HISTORY) -> dict[str, str]:
+    """
+    Возвращает {ip: flag} для набора IP за один проход:
+    дубликаты убираются, попадания в кеш отдаются сразу,
+    остальные разрешаются одним batch-запросом.
+    Неразрешенные пока адреса получают "⏳".
+    Ключи — строки в том виде, в каком их передал вызывающий.
+    """
+    flags = {}
+    to_lookup = {}  # Исходная строка -> адрес без пробелов
+    for ip in dict.fromkeys(ips):
+        value = ip.strip() if ip else ""
+        if not value or value in ["localhost", "127.0.0.1", "::1"]:
+            flags[ip] = "🏠"
+            continue
+        if len(value) == 2 and value.isalpha():
+            flags[ip] = country_code_to_flag(value)
+            continue
+        to_lookup[ip] = value
+
+    if not to_lookup:
+        return flags
+
+    results = {}
     try:
-        os.makedirs(os.path.dirname(ALERTS_CONFIG_FILE), exist_ok=True)
-        config_to_save = {
-            str(k): v for k,
-            v in shared_state.ALERTS_CONFIG.items()}
-        with open(ALERTS_CONFIG_FILE, "w", encoding='utf-8') as f:
-            json.dump(config_to_save, f, indent=4, ensure_ascii=False)
-        logging.info("Настройки уведомлений сохранены.")
+        results = await lookup_countries_batch(
+            list(dict.fromkeys(to_lookup.values())), priority)
     except Exception as e:
-        logging.error(
-            f"Ошибка сохранения alerts_config.json: {e}",
-            exc_info=True)
+        logging.warning(
+            f"Ошибка batch-запроса GeoIP для {len(to_lookup)} адресов: {e}")
+
+    for ip, value in to_lookup.items():
+        result = results.get(value)
+        if result is None:
+            flags[ip] = "⏳"
+        else:
+            flags[ip] = country_code_to_flag(result[0]) if result[0] else "❓"
+    return flags
 
 
-def get_country_flag(ip_or_code: str) -> str:
-    """Получает флаг страны по IP или двухбуквенному коду, обрабатывая ошибки."""
+async def get_country_flag(
+        ip_or_code: str,
+        priority: int = PRIORITY_INTERACTIVE) -> str:
+    """
+    Получает флаг страны по IP или двухбуквенному коду, обрабатывая ошибки.
+    Для строк уведомлений передавайте priority=PRIORITY_ALERT.
+    """
     if not ip_or_code or ip_or_code in ["localhost", "127.0.0.1", "::1"]:
         return "🏠"
 
@@ -90,48 +155,28 @@ def get_country_flag(ip_or_code: str) -> str:
 
     if len(input_str) == 2 and input_str.isalpha():
         try:
-            flag = "".join(chr(ord(char) - 65 + 0x1F1E6) for char in input_str)
-            return flag
+            return country_code_to_flag(input_str)
         except Exception as e:
             logging.warning(
                 f"Ошибка при прямой конвертации кода '{input_str}' во флаг: {e}")
             return "❓"
 
     try:
-        response = requests.get(
-            f"http://ip-api.com/json/{ip_or_code}?fields=countryCode,status",
-            timeout=2)
-        response.raise_for_status()
-        data = response.json()
-
-        if data.get("status") != "success":
-            logging.warning(
-                f"API ip-api.com вернул статус '{data.get('status')}' для IP {ip_or_code}")
-            return "❓"
-
-        country_code = data.get("countryCode")
-        if country_code:
-            if len(country_code) == 2 and country_code.isalpha():
-                flag = "".join(chr(ord(char.upper()) - 65 + 0x1F1E6)
-                               for char in country_code)
-                return flag
-            else:
-                logging.warning(
-                    f"Некорректный countryCode '{country_code}' от API для IP {ip_or_code}")
-                return "❓"
-        else:
-            logging.debug(
-                f"Не удалось получить countryCode от API для IP {ip_or_code}, хотя статус success. Ответ: {data}")
-            return "❓"
+        result = await lookup_country(ip_or_code.strip(), priority)
+        if result is None:
+            return "⏳"
+        if result[0]:
+            return country_code_to_flag(result[0])
+        return "❓"
 
-    except requests.exceptions.Timeout:
+    except asyncio.TimeoutError:
         logging.warning(f"Тайм-аут при получении флага для IP {ip_or_code}")
         return "⏳"
-    except requests.exceptions.HTTPError as e:
+    except aiohttp.ClientResponseError as e:
         logging.warning(
-            f"HTTP ошибка {e.response.status_code} при запросе флага для IP {ip_or_code}: {e}")
+            f"HTTP ошибка {e.status} при запросе флага для IP {ip_or_code}: {e}")
         return "❓"
-    except requests.exceptions.RequestException as e:
+    except aiohttp.ClientError as e:
         logging.warning(
             f"Ошибка сети при получении флага для IP {ip_or_code}: {e}")
         return "❓"
@@ -145,84 +190,71 @@ def get_country_flag(ip_or_code: str) -> str:
         return "❓"
 
 
+async def get_country_flag_now(ip: str) -> tuple[str, asyncio.Future | None]:
+    """
+    Флаг для алерта без ожидания ip-api.com: из локальной базы или кеша.
+    При промахе адрес ставится в GEO_SCHEDULER с PRIORITY_ALERT и
+    возвращается ("⏳", future) — future завершится (code, name) или None,
+    и флаг можно будет подставить в уже отправленный алерт.
+    """
+    if not ip or ip in ["localhost", "127.0.0.1", "::1"]:
+        return "🏠", None
+    ip = ip.strip()
+    if len(ip) == 2 and ip.isalpha():
+        return country_code_to_flag(ip), None
+    if geoip.OFFLINE_DB is not None:
+        result = geoip.OFFLINE_DB.lookup(ip)
+        return (country_code_to_flag(result[0]) if result and result[0] else "❓"), None
+
+    try:
+        cached = geoip.GEO_CACHE.get_memory(ip)
+        if cached is None:
+            cached = await asyncio.to_thread(geoip.GEO_CACHE.get, ip)
+    except Exception as e:
+        logging.warning(f"Ошибка чтения GeoIP-кеша для {ip}: {e}")
+        cached = None
+    if cached is not None:
+        return (country_code_to_flag(cached[0]) if cached[0] else "❓"), None
+    return "⏳", GEO_SCHEDULER.submit([ip], PRIORITY_ALERT)[ip]
+
+
 async def get_country_details(ip_or_code: str) -> tuple[str, str | None]:
     """
     Получает флаг и ПОЛНОЕ имя страны по IP или двухбуквенному коду.
     Возвращает (flag, country_name | None).
     """
-    flag = "❓"
-    country_name = None
     input_str = ip_or_code.strip().upper() if ip_or_code else ""
 
     if not input_str or input_str in ["localhost", "127.0.0.1", "::1"]:
         return "🏠", None
 
-    country_code_known = None
+    flag = "❓"
     if len(input_str) == 2 and input_str.isalpha():
-        country_code_known = input_str
         try:
-            flag = "".join(chr(ord(char) - 65 + 0x1F1E6) for char in input_str)
+            flag = country_code_to_flag(input_str)
         except Exception as e:
             logging.warning(
                 f"Ошибка при прямой конвертации кода '{input_str}' во флаг: {e}")
-            flag = "❓"
+        identifier = input_str
     else:
-        try:
-            response_flag = await asyncio.to_thread(
-                requests.get,
-                f"http://ip-api.com/json/{ip_or_code}?fields=countryCode,status",
-                timeout=2
-            )
-            response_flag.raise_for_status()
-            data_flag = response_flag.json()
-            if data_flag.get("status") == "success" and data_flag.get(
-                    "countryCode"):
-                code = data_flag["countryCode"]
-                if len(code) == 2 and code.isalpha():
-                    country_code_known = code
-                    flag = "".join(chr(ord(char.upper()) - 65 + 0x1F1E6)
-                                   for char in code)
-                else:
-                    logging.warning(
-                        f"Некорректный countryCode '{code}' от API для IP {ip_or_code}")
-                    flag = "❓"
-            else:
-                logging.warning(
-                    f"Не удалось получить countryCode от API (1) для {ip_or_code}. Status: {data_flag.get('status')}")
-                flag = "❓"
-        except requests.exceptions.Timeout:
-            logging.warning(
-                f"Тайм-аут (1) при получении флага для {ip_or_code}")
-            return "⏳", None
-        except Exception as e:
-            logging.warning(
-                f"Ошибка (1) при получении флага для {ip_or_code}: {e}")
-            flag = "❓"
+        identifier = ip_or_code.strip()
 
-    identifier_for_name = country_code_known if country_code_known else ip_or_code
+    # Флаг и имя приходят одним ответом (и кешируются вместе)
     try:
-        response_name = await asyncio.to_thread(
-            requests.get,
-            f"http://ip-api.com/json/{identifier_for_name}?fields=country,status",
-            timeout=2
-        )
-        response_name.raise_for_status()
-        data_name = response_name.json()
-        if data_name.get("status") == "success" and data_name.get("country"):
-            country_name = data_name["country"]
-            logging.debug(
-                f"Получено имя страны для '{identifier_for_name}': {country_name}")
-        else:
-            logging.warning(
-                f"Не удалось получить country name от API для '{identifier_for_name}'. Status: {data_name.get('status')}")
-
-    except requests.exceptions.Timeout:
-        logging.warning(
-            f"Тайм-аут (2) при получении имени страны для '{identifier_for_name}'")
+        result = await lookup_country(identifier)
     except Exception as e:
         logging.warning(
-            f"Ошибка (2) при получении имени страны для '{identifier_for_name}': {e}")
-
+            f"Ошибка при получении данных страны для '{identifier}': {e}")
+        return flag, None
+
+    if result is None:
+        return ("⏳", None) if flag == "❓" else (flag, None)
+    country_code, country_name = result
+    if country_code and flag == "❓":
+        flag = country_code_to_flag(country_code)
+    if country_name:
+        logging.debug(
+            f"Получено имя страны для '{identifier}': {country_name}")
     return flag, country_name
 
 
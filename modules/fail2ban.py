@@ -1,9 +1,7 @@
 # /opt-tg-bot/modules/fail2ban.py
 import asyncio
 import os
-import re
 import logging
-from datetime import datetime
 from aiogram import F, Dispatcher, types
 from aiogram.types import KeyboardButton
 
@@ -16,12 +14,20 @@ from core.auth import is_allowed, send_access_denied_message
 from core.messaging import delete_previous_message
 from core.shared_state import LAST_MESSAGE_IDS
 # <-- Добавлен get_host_path
-from core.utils import get_country_flag, get_server_timezone_label, get_host_path
+from core.utils import resolve_many, get_server_timezone_label, get_host_path
+from core.log_bus import LOG_BUS
+from core.log_parser import F2B_EVENT_KINDS, F2B_BAN, F2B_ALREADY_BANNED
 
 # --- ИЗМЕНЕНО: Используем ключ ---
 BUTTON_KEY = "btn_fail2ban"
 # --------------------------------
 
+# Тип события -> ключ i18n
+BAN_TYPE_KEYS = {
+    F2B_BAN: "f2b_banned",
+    F2B_ALREADY_BANNED: "f2b_already_banned",
+}
+
 
 def get_button() -> KeyboardButton:
     # --- ИЗМЕНЕНО: Используем i18n ---
@@ -63,76 +69,31 @@ async def fail2ban_handler(message: types.Message):
                 user_id, {})[command] = sent_message.message_id
             return
 
-        def read_f2b_log():
-            try:
-                with open(F2B_LOG_FILE, "r", encoding='utf-8', errors='ignore') as f:
-                    return f.readlines()[-50:]
-            except Exception as read_e:
-                logging.error(f"Error reading Fail2Ban log file: {read_e}")
-                return None
-
-        lines = await asyncio.to_thread(read_f2b_log)
-
-        if lines is None:
+        # --- ИЗМЕНЕНО: События берутся из общей шины логов (core/log_bus.py) ---
+        events = LOG_BUS.recent("fail2ban", F2B_EVENT_KINDS, limit=10)
+        if events is None:
             # --- ИЗМЕНЕНО: Используем i18n ---
             raise Exception(_("f2b_log_read_error", lang))
             # --------------------------------
 
         log_entries = []
         tz_label = get_server_timezone_label()
-        regex_ban = r"(\d{4}-\d{2}-\d{2}\s\d{2}:\d{2}:\d{2},\d{3}).*fail2ban\.actions.* Ban\s+(\S+)"
-        regex_already = r"(\d{4}-\d{2}-\d{2}\s\d{2}:\d{2}:\d{2},\d{3}).*fail2ban\.actions.* (\S+)\s+already banned"
-
-        for line in reversed(lines):
-            line = line.strip()
-            if "fail2ban.actions" not in line:
-                continue
-
-            match = None
-            ban_type_key = None  # Используем ключ для перевода
-            ip = None
-            timestamp_str = None
-
-            match_ban_found = re.search(regex_ban, line)
-            if match_ban_found:
-                match = match_ban_found
-                ban_type_key = "f2b_banned"  # Ключ
-                timestamp_str, ip = match.groups()
-            else:
-                match_already_found = re.search(regex_already, line)
-                if match_already_found:
-                    match = match_already_found
-                    ban_type_key = "f2b_already_banned"  # Ключ
-                    timestamp_str, ip = match.groups()
-
-            if match and ip and timestamp_str and ban_type_key:
-                try:
-                    dt = datetime.strptime(
-                        timestamp_str, "%Y-%m-%d %H:%M:%S,%f")
-                    flag = await asyncio.to_thread(get_country_flag, ip)
-                    formatted_time = dt.strftime('%H:%M:%S')
-                    formatted_date = dt.strftime('%d.%m.%Y')
-                    # --- ИЗМЕНЕНО: Используем i18n ---
-                    ban_type_translated = _(ban_type_key, lang)
-                    log_entries.append(
-                        _("f2b_ban_entry", lang,
-                          ban_type=ban_type_translated,
-                          flag=flag, ip=ip,
-                          time=formatted_time, tz=tz_label,
-                          date=formatted_date)
-                    )
-                    # --------------------------------
-                except ValueError:
-                    logging.warning(
-                        f"Could not parse Fail2Ban timestamp: {timestamp_str}")
-                    continue
-                except Exception as parse_e:
-                    logging.error(
-                        f"Error processing Fail2Ban line: {parse_e} | Line: {line}")
-                    continue
-
-            if len(log_entries) >= 10:
-                break
+        # Флаг подставляется позже, одним вызовом resolve_many
+        parsed_entries = [
+            (BAN_TYPE_KEYS[event.kind], event.ip, event.timestamp)
+            for event in events]
+
+        # --- ИЗМЕНЕНО: Все IP разрешаются одним пакетным запросом ---
+        flags = await resolve_many(entry[1] for entry in parsed_entries)
+        for ban_type_key, ip, dt in parsed_entries:
+            log_entries.append(
+                _("f2b_ban_entry", lang,
+                  ban_type=_(ban_type_key, lang),
+                  flag=flags.get(ip, "❓"), ip=ip,
+                  time=dt.strftime('%H:%M:%S'), tz=tz_label,
+                  date=dt.strftime('%d.%m.%Y'))
+            )
+        # -------------------------------------------------------------
 
         if log_entries:
             log_output = "\n\n".join(log_entries)
@@ -0,0 +1,125 @@
+# /opt-tg-bot/modules/history.py
+import logging
+from aiogram import F, Dispatcher, types
+from aiogram.filters import Command
+from aiogram.types import KeyboardButton, BufferedInputFile, InputMediaPhoto
+from aiogram.exceptions import TelegramBadRequest
+
+from core.i18n import _, I18nFilter, get_user_lang
+from core import config
+
+from core.auth import is_allowed, send_access_denied_message
+from core.messaging import delete_previous_message
+from core.shared_state import LAST_MESSAGE_IDS
+from core.keyboards import get_history_keyboard
+from core.utils import escape_html
+from core.charts import CHART_CACHE, CHART_METRICS, CHART_RANGES
+
+BUTTON_KEY = "btn_history"
+DEFAULT_METRIC = "cpu"
+DEFAULT_RANGE = "24h"
+
+
+def get_button() -> KeyboardButton:
+    return KeyboardButton(text=_(BUTTON_KEY, config.DEFAULT_LANGUAGE))
+
+
+def register_handlers(dp: Dispatcher):
+    dp.message(I18nFilter(BUTTON_KEY))(history_handler)
+    dp.message(Command("history"))(history_handler)
+    dp.callback_query(F.data.startswith("history_"))(cq_history)
+
+
+def _caption(lang: str, metric: str, range_key: str, stats: dict) -> str:
+    params = {"metric": _(f"history_metric_{metric}", lang),
+              "period": _(f"history_range_{range_key}", lang)}
+    if metric == "traffic":
+        empty = {"avg": 0.0, "max": 0.0}
+        rx, tx = stats.get("rx", empty), stats.get("tx", empty)
+        return _("history_caption_traffic", lang, rx_avg=rx["avg"], rx_max=rx["max"],
+                 tx_avg=tx["avg"], tx_max=tx["max"], **params)
+    return _("history_caption_percent", lang, **stats[metric], **params)
+
+
+async def history_handler(message: types.Message):
+    user_id = message.from_user.id
+    chat_id = message.chat.id
+    lang = get_user_lang(user_id)
+    command = "history"
+    if not is_allowed(user_id, command):
+        await send_access_denied_message(message.bot, user_id, chat_id, command)
+        return
+
+    await delete_previous_message(user_id, command, chat_id, message.bot)
+    await message.bot.send_chat_action(chat_id=chat_id, action="upload_photo")
+    try:
+        # Одинаковые графики в пределах минуты берутся из кеша (core/charts.py)
+        image = await CHART_CACHE.get(DEFAULT_METRIC, DEFAULT_RANGE)
+        if image is None:
+            sent_message = await message.answer(
+                _("history_no_data", lang, period=_(f"history_range_{DEFAULT_RANGE}", lang)),
+                reply_markup=get_history_keyboard(lang, DEFAULT_METRIC, DEFAULT_RANGE))
+        else:
+            sent_message = await message.answer_photo(
+                BufferedInputFile(image.png, filename="history.png"),
+                caption=_caption(lang, DEFAULT_METRIC, DEFAULT_RANGE, image.stats),
+                reply_markup=get_history_keyboard(lang, DEFAULT_METRIC, DEFAULT_RANGE),
+                parse_mode="HTML")
+    except Exception as e:
+        logging.error(f"Ошибка в history_handler: {e}")
+        sent_message = await message.answer(
+            _("history_error", lang, error=escape_html(str(e))))
+    LAST_MESSAGE_IDS.setdefault(user_id, {})[command] = sent_message.message_id
+
+
+async def cq_history(callback: types.CallbackQuery):
+    user_id = callback.from_user.id
+    lang = get_user_lang(user_id)
+    command = "history"
+    if not is_allowed(user_id, command):
+        await callback.answer(_("access_denied_generic", lang), show_alert=True)
+        return
+
+    try:
+        _prefix, metric, range_key = callback.data.split("_", 2)
+    except ValueError:
+        metric = range_key = None
+    if metric not in CHART_METRICS or range_key not in CHART_RANGES:
+        await callback.answer()
+        return
+
+    keyboard = get_history_keyboard(lang, metric, range_key)
+    try:
+        image = await CHART_CACHE.get(metric, range_key)
+        if image is None:
+            text = _("history_no_data", lang, period=_(f"history_range_{range_key}", lang))
+            if callback.message.photo:
+                # Фото нельзя превратить в текст — заменяем сообщение
+                await callback.message.delete()
+                sent_message = await callback.message.answer(text, reply_markup=keyboard)
+                LAST_MESSAGE_IDS.setdefault(user_id, {})[command] = sent_message.message_id
+            else:
+                await callback.message.edit_text(text, reply_markup=keyboard)
+        else:
+            media = InputMediaPhoto(
+                media=BufferedInputFile(image.png, filename="history.png"),
+                caption=_caption(lang, metric, range_key, image.stats),
+                parse_mode="HTML")
+            if callback.message.photo:
+                await callback.message.edit_media(media, reply_markup=keyboard)
+            else:
+                await callback.message.delete()
+                sent_message = await callback.message.answer_photo(
+                    media.media, caption=media.caption, reply_markup=keyboard,
+                    parse_mode="HTML")
+                LAST_MESSAGE_IDS.setdefault(user_id, {})[command] = sent_message.message_id
+        await callback.answer()
+    except TelegramBadRequest as e:
+        if "message is not modified" in str(e):
+            await callback.answer()
+        else:
+            logging.error(f"Ошибка обновления графика: {e}")
+            await callback.answer(_("history_error", lang, error=str(e)), show_alert=True)
+    except Exception as e:
+        logging.error(f"Ошибка в cq_history: {e}")
+        await callback.answer(_("history_error", lang, error=str(e)), show_alert=True)
@@ -3,8 +3,7 @@ import asyncio
 import logging
 import psutil
 import time
-import re
-import os
+import functools
 from datetime import datetime
 from aiogram import F, Dispatcher, types, Bot
 from aiogram.types import KeyboardButton
@@ -16,22 +15,30 @@ from core import config
 # ----------------------------------------
 
 from core.auth import is_allowed, send_access_denied_message
-from core.messaging import delete_previous_message, send_alert
-from core.shared_state import (
-    LAST_MESSAGE_IDS,
-    ALERTS_CONFIG,
-    RESOURCE_ALERT_STATE,
-    LAST_RESOURCE_ALERT_TIME)
+from core.messaging import delete_previous_message, send_alert, update_alert
+from core.outbox import PRIORITY_CRITICAL
+from core.shared_state import LAST_MESSAGE_IDS
+from core.subscriptions import SUBSCRIPTIONS, ALERT_TYPES
 from core.utils import (
-    save_alerts_config,
-    get_country_flag,
+    get_country_flag_now,
+    country_code_to_flag,
     get_server_timezone_label,
-    escape_html,
-    get_host_path)  # <-- Добавлено
+    escape_html)
 from core.keyboards import get_alerts_menu_keyboard
+from core import log_parser
+from core.log_parser import LogEvent
+from core.log_bus import LOG_BUS
+from core.alert_coalescer import ALERT_COALESCER, AlertEvent
+from core.metric_engine import MetricEngine, MetricRule
+from core.cpu_sampler import CPU_SAMPLER
+from core.disk_monitor import DISK_MONITOR
+from core.traffic_anomaly import TRAFFIC_ANOMALY
+from core.process_tracker import PROCESS_TRACKER
 from core.config import (
-    RESOURCE_CHECK_INTERVAL, CPU_THRESHOLD, RAM_THRESHOLD, DISK_THRESHOLD,
-    RESOURCE_ALERT_COOLDOWN
+    RESOURCE_CHECK_INTERVAL, CPU_THRESHOLD, RAM_THRESHOLD,
+    CPU_RECOVERY_THRESHOLD, RAM_RECOVERY_THRESHOLD,
+    CPU_ALERT_MIN_DURATION, RAM_ALERT_MIN_DURATION, CPU_ALERT_WINDOW,
+    CPU_ALERT_MIN_COVERAGE, CPU_SAMPLE_INTERVAL, TRAFFIC_ANOMALY_INTERVAL
 )
 
 # --- ИЗМЕНЕНО: Используем ключ ---
@@ -62,47 +69,20 @@ def start_background_tasks(bot: Bot) -> list[asyncio.Task]:
     task_resources = asyncio.create_task(
         resource_monitor(bot), name="ResourceMonitor")
 
-    # 2. Монитор SSH
-    # --- ИЗМЕНЕНО: Используем get_host_path ---
-    ssh_log_file_to_monitor = None
-    secure_path = get_host_path("/var/log/secure")
-    auth_path = get_host_path("/var/log/auth.log")
-
-    if os.path.exists(secure_path):
-        ssh_log_file_to_monitor = secure_path
-    elif os.path.exists(auth_path):
-        ssh_log_file_to_monitor = auth_path
-    # --- КОНЕЦ ИЗМЕНЕНИЯ ---
-
-    task_logins = None
-    if ssh_log_file_to_monitor:
-        task_logins = asyncio.create_task(
-            reliable_tail_log_monitor(
-                bot,
-                ssh_log_file_to_monitor,
-                "logins",
-                parse_ssh_log_line),
-            name="LoginsMonitor")
-    else:
-        logging.warning(
-            "Не найден лог SSH. Мониторинг SSH (logins) не запущен.")
-
-    # 3. Монитор F2B
-    # --- ИЗМЕНЕНО: Используем get_host_path ---
-    f2b_log_file_to_monitor = get_host_path("/var/log/fail2ban.log")
-    # --- КОНЕЦ ИЗМЕНЕНИЯ ---
-    task_bans = asyncio.create_task(
-        reliable_tail_log_monitor(
-            bot,
-            f2b_log_file_to_monitor,
-            "bans",
-            parse_f2b_log_line),
-        name="BansMonitor")
-
-    tasks = [task_resources, task_bans]
-    if task_logins:
-        tasks.append(task_logins)
+    # 2. Входы SSH и баны F2B — подписка на общую шину логов
+    # (файлы читает core/log_bus.py, запускается в main)
+    LOG_BUS.subscribe(
+        [log_parser.LOGIN_ACCEPTED],
+        functools.partial(_on_log_event, bot, "logins", format_ssh_login_alert))
+    LOG_BUS.subscribe(
+        [log_parser.F2B_BAN],
+        functools.partial(_on_log_event, bot, "bans", format_f2b_ban_alert))
 
+    # 3. Аномалии трафика (базовые линии по часам суток)
+    task_traffic = asyncio.create_task(
+        traffic_anomaly_monitor(bot), name="TrafficAnomalyMonitor")
+
+    tasks = [task_resources, task_traffic]
     return tasks
 
 # --- Хэндлеры ---
@@ -146,7 +126,7 @@ async def cq_toggle_alert(callback: types.CallbackQuery):
 
     try:
         alert_type = callback.data.split('_', 2)[-1]
-        if alert_type not in ["resources", "logins", "bans"]:
+        if alert_type not in ALERT_TYPES:
             raise ValueError(f"Неизвестный тип алерта: {alert_type}")
     except Exception as e:
         logging.error(
@@ -156,13 +136,9 @@ async def cq_toggle_alert(callback: types.CallbackQuery):
         # --------------------------------
         return
 
-    if user_id not in ALERTS_CONFIG:
-        ALERTS_CONFIG[user_id] = {}
-
-    current_state = ALERTS_CONFIG[user_id].get(alert_type, False)
-    new_state = not current_state
-    ALERTS_CONFIG[user_id][alert_type] = new_state
-    save_alerts_config()
+    # --- ИЗМЕНЕНО: Реестр обновляет индекс подписчиков, запись на диск отложена ---
+    new_state = SUBSCRIPTIONS.toggle(user_id, alert_type)
+    # ---------------------------------------------------------------------------
 
     logging.info(
         f"Пользователь {user_id} изменил '{alert_type}' на {new_state}")
@@ -215,60 +191,121 @@ async def cq_alert_downtime_stub(callback: types.CallbackQuery):
 # (Алерты отправляются всем подписанным пользователям, поэтому используем язык по умолчанию)
 
 
-async def parse_ssh_log_line(line: str) -> str | None:
-    match = re.search(r"Accepted\s+(?:\S+)\s+for\s+(\S+)\s+from\s+(\S+)", line)
-    if match:
-        try:
-            user = escape_html(match.group(1))
-            ip = escape_html(match.group(2))
-            flag = await asyncio.to_thread(get_country_flag, ip)
-            tz_label = get_server_timezone_label()
-            now_time = datetime.now().strftime('%H:%M:%S')
-            # --- ИЗМЕНЕНО: Используем i18n (язык по умолчанию) ---
-            lang = config.DEFAULT_LANGUAGE
-            return _(
-                "alert_ssh_login_detected",
-                lang,
-                user=user,
-                flag=flag,
-                ip=ip,
-                time=now_time,
-                tz=tz_label)
-            # ----------------------------------------------------
-        except Exception as e:
-            logging.warning(f"parse_ssh_log_line: Ошибка парсинга: {e}")
-            return None
-    return None
+def format_ssh_login_alert(event: LogEvent, flag: str) -> AlertEvent:
+    user = escape_html(event.user)
+    ip = escape_html(event.ip)
+    tz_label = get_server_timezone_label()
+    event_time = (event.timestamp or datetime.now()).strftime('%H:%M:%S')
+    # --- ИЗМЕНЕНО: Используем i18n (язык по умолчанию) ---
+    lang = config.DEFAULT_LANGUAGE
+    message = _(
+        "alert_ssh_login_detected",
+        lang,
+        user=user,
+        flag=flag,
+        ip=ip,
+        time=event_time,
+        tz=tz_label)
+    return AlertEvent(message, ip, flag, event.timestamp, event.origin)
+
+
+def format_f2b_ban_alert(event: LogEvent, flag: str) -> AlertEvent:
+    ip = escape_html(event.ip)
+    tz_label = get_server_timezone_label()
+    event_time = (event.timestamp or datetime.now()).strftime('%H:%M:%S')
+    # --- ИЗМЕНЕНО: Используем i18n (язык по умолчанию) ---
+    lang = config.DEFAULT_LANGUAGE
+    message = _(
+        "alert_f2b_ban_detected",
+        lang,
+        flag=flag,
+        ip=ip,
+        time=event_time,
+        tz=tz_label)
+    return AlertEvent(message, ip, flag, event.timestamp, event.origin)
+
+
+# Правки алертов, получивших флаг страны (ссылки, чтобы задачи не собрал GC)
+_flag_updates: set[asyncio.Task] = set()
+
+
+async def _on_log_event(bot: Bot, alert_type: str, format_function, event: LogEvent):
+    """
+    Подписчик LOG_BUS: форматирует событие и отдает его в ALERT_COALESCER
+    сразу и по порядку — флаг страны, которого нет в кеше, не ждется:
+    алерт уходит с "⏳", а флаг подставляется правкой, когда адрес разрешится.
+    """
+    if event.timestamp is None:
+        # Время фиксируется, чтобы правка не поменяла его в тексте
+        event = event._replace(timestamp=datetime.now())
+    try:
+        flag, pending = await get_country_flag_now(event.ip)
+        alert = format_function(event, flag)
+    except Exception as e:
+        logging.warning(f"Монитор {alert_type}: Ошибка форматирования события: {e}")
+        return
+    # Шторм событий сворачивается в сводку
+    await ALERT_COALESCER.submit(bot, alert_type, alert)
+    if pending is not None and alert.key:
+        pending.add_done_callback(functools.partial(
+            _on_flag_resolved, bot, alert_type, format_function, event))
+
+
+def _on_flag_resolved(bot: Bot, alert_type: str, format_function, event: LogEvent,
+                      future: asyncio.Future):
+    result = None if future.cancelled() else future.result()
+    if result is None:
+        return  # Адрес не разрешился — в алерте остается "⏳"
+    flag = country_code_to_flag(result[0]) if result[0] else "❓"
+    alert = format_function(event, flag)
+    task = asyncio.create_task(
+        update_alert(bot, alert_type, alert.key, alert.message),
+        name=f"AlertFlag-{alert_type}")
+    _flag_updates.add(task)
+    task.add_done_callback(_flag_updates.discard)
 
+# --- Фоновые задачи ---
 
-async def parse_f2b_log_line(line: str) -> str | None:
-    match = re.search(r"fail2ban\.actions.* Ban\s+(\S+)", line)
-    if match:
-        try:
-            ip = escape_html(match.group(1).strip(" \n\t,"))
-            flag = await asyncio.to_thread(get_country_flag, ip)
-            tz_label = get_server_timezone_label()
-            now_time = datetime.now().strftime('%H:%M:%S')
-            # --- ИЗМЕНЕНО: Используем i18n (язык по умолчанию) ---
-            lang = config.DEFAULT_LANGUAGE
-            return _(
-                "alert_f2b_ban_detected",
-                lang,
-                flag=flag,
-                ip=ip,
-                time=now_time,
-                tz=tz_label)
-            # ----------------------------------------------------
-        except Exception as e:
-            logging.warning(f"parse_f2b_log_line: Ошибка парсинга: {e}")
-            return None
-    return None
 
-# --- Фоновые задачи ---
+# --- ИЗМЕНЕНО: Метрики ресурсов описаны таблицей (core/metric_engine.py) ---
+def _cpu_load(sample):
+    # Средняя загрузка за окно фонового замера: короткие пики не дают алерт
+    stats = CPU_SAMPLER.stats(CPU_ALERT_WINDOW)
+    # Сразу после старта в окне несколько секунд — это еще не среднее за окно
+    min_samples = CPU_ALERT_MIN_COVERAGE * CPU_ALERT_WINDOW / CPU_SAMPLE_INTERVAL
+    if stats is None or stats.samples < min_samples:
+        return None
+    return stats.avg
+
+
+RESOURCE_METRICS = MetricEngine()
+# К алертам CPU/RAM прикладывается топ процессов на момент превышения
+RESOURCE_METRICS.register(MetricRule(
+    "cpu", _cpu_load,
+    CPU_THRESHOLD, CPU_RECOVERY_THRESHOLD, CPU_ALERT_MIN_DURATION,
+    details=functools.partial(PROCESS_TRACKER.format_top, "cpu")))
+RESOURCE_METRICS.register(MetricRule(
+    "ram", lambda sample: sample.read(psutil.virtual_memory).percent,
+    RAM_THRESHOLD, RAM_RECOVERY_THRESHOLD, RAM_ALERT_MIN_DURATION,
+    details=functools.partial(PROCESS_TRACKER.format_top, "ram")))
+# Правила дисков ("disk:<точка монтирования>") ведет DISK_MONITOR
+
+# Аномалии трафика: значение правила — отклонение от базовой линии часа в сигмах
+TRAFFIC_METRICS = MetricEngine()
+TRAFFIC_ANOMALY.register_rules(TRAFFIC_METRICS)
+
+
+def _sample_resources():
+    DISK_MONITOR.sync_rules(RESOURCE_METRICS)
+    try:
+        PROCESS_TRACKER.refresh()
+    except Exception as e:
+        logging.error(f"Ошибка обхода процессов: {e}")
+    return RESOURCE_METRICS.sample_sync()
+# ----------------------------------------------------------------------------
 
 
 async def resource_monitor(bot: Bot):
-    global RESOURCE_ALERT_STATE, LAST_RESOURCE_ALERT_TIME
     logging.info("Монитор ресурсов запущен.")
     await asyncio.sleep(15)
 
@@ -278,302 +315,45 @@ async def resource_monitor(bot: Bot):
 
     while True:
         try:
-            def check_resources_sync():
-                cpu = psutil.cpu_percent(interval=1)
-                ram = psutil.virtual_memory().percent
-                # --- ИЗМЕНЕНО: Используем get_host_path ---
-                disk = psutil.disk_usage(get_host_path('/')).percent
-                # -----------------------------------------
-                return cpu, ram, disk
-
-            cpu_usage, ram_usage, disk_usage = await asyncio.to_thread(check_resources_sync)
-            logging.debug(
-                f"Проверка ресурсов: CPU={cpu_usage}%, RAM={ram_usage}%, Disk={disk_usage}%")
-
-            alerts_to_send = []
-            current_time = time.time()
-
-            # --- ИЗМЕНЕНО: Логика CPU с i18n ---
-            if cpu_usage >= CPU_THRESHOLD:
-                if not RESOURCE_ALERT_STATE["cpu"]:
-                    msg = _(
-                        "alert_cpu_high",
-                        lang,
-                        usage=cpu_usage,
-                        threshold=CPU_THRESHOLD)
-                    alerts_to_send.append(msg)
-                    logging.info("Сгенерирован алерт CPU.")
-                    RESOURCE_ALERT_STATE["cpu"] = True
-                    LAST_RESOURCE_ALERT_TIME["cpu"] = current_time
-                elif current_time - LAST_RESOURCE_ALERT_TIME["cpu"] > RESOURCE_ALERT_COOLDOWN:
-                    msg = _(
-                        "alert_cpu_high_repeat",
-                        lang,
-                        usage=cpu_usage,
-                        threshold=CPU_THRESHOLD)
-                    alerts_to_send.append(msg)
-                    logging.info("Сгенерирован повторный алерт CPU.")
-                    LAST_RESOURCE_ALERT_TIME["cpu"] = current_time
-            elif cpu_usage < CPU_THRESHOLD and RESOURCE_ALERT_STATE["cpu"]:
-                alerts_to_send.append(
-                    _("alert_cpu_normal", lang, usage=cpu_usage))
-                logging.info("Сгенерирован алерт нормализации CPU.")
-                RESOURCE_ALERT_STATE["cpu"] = False
-                LAST_RESOURCE_ALERT_TIME["cpu"] = 0
-
-            # --- ИЗМЕНЕНО: Логика RAM с i18n ---
-            if ram_usage >= RAM_THRESHOLD:
-                if not RESOURCE_ALERT_STATE["ram"]:
-                    msg = _(
-                        "alert_ram_high",
-                        lang,
-                        usage=ram_usage,
-                        threshold=RAM_THRESHOLD)
-                    alerts_to_send.append(msg)
-                    logging.info("Сгенерирован алерт RAM.")
-                    RESOURCE_ALERT_STATE["ram"] = True
-                    LAST_RESOURCE_ALERT_TIME["ram"] = current_time
-                elif current_time - LAST_RESOURCE_ALERT_TIME["ram"] > RESOURCE_ALERT_COOLDOWN:
-                    msg = _(
-                        "alert_ram_high_repeat",
-                        lang,
-                        usage=ram_usage,
-                        threshold=RAM_THRESHOLD)
-                    alerts_to_send.append(msg)
-                    logging.info("Сгенерирован повторный алерт RAM.")
-                    LAST_RESOURCE_ALERT_TIME["ram"] = current_time
-            elif ram_usage < RAM_THRESHOLD and RESOURCE_ALERT_STATE["ram"]:
-                alerts_to_send.append(
-                    _("alert_ram_normal", lang, usage=ram_usage))
-                logging.info("Сгенерирован алерт нормализации RAM.")
-                RESOURCE_ALERT_STATE["ram"] = False
-                LAST_RESOURCE_ALERT_TIME["ram"] = 0
-
-            # --- ИЗМЕНЕНО: Логика Disk с i18n ---
-            if disk_usage >= DISK_THRESHOLD:
-                if not RESOURCE_ALERT_STATE["disk"]:
-                    msg = _(
-                        "alert_disk_high",
-                        lang,
-                        usage=disk_usage,
-                        threshold=DISK_THRESHOLD)
-                    alerts_to_send.append(msg)
-                    logging.info("Сгенерирован алерт Disk.")
-                    RESOURCE_ALERT_STATE["disk"] = True
-                    LAST_RESOURCE_ALERT_TIME["disk"] = current_time
-                elif current_time - LAST_RESOURCE_ALERT_TIME["disk"] > RESOURCE_ALERT_COOLDOWN:
-                    msg = _(
-                        "alert_disk_high_repeat",
-                        lang,
-                        usage=disk_usage,
-                        threshold=DISK_THRESHOLD)
-                    alerts_to_send.append(msg)
-                    logging.info("Сгенерирован повторный алерт Disk.")
-                    LAST_RESOURCE_ALERT_TIME["disk"] = current_time
-            elif disk_usage < DISK_THRESHOLD and RESOURCE_ALERT_STATE["disk"]:
-                alerts_to_send.append(
-                    _("alert_disk_normal", lang, usage=disk_usage))
-                logging.info("Сгенерирован алерт нормализации Disk.")
-                RESOURCE_ALERT_STATE["disk"] = False
-                LAST_RESOURCE_ALERT_TIME["disk"] = 0
-            # -------------------------------------
+            values = await asyncio.to_thread(_sample_resources)
+            logging.debug(f"Проверка ресурсов: {values}")
 
+            alerts_to_send = RESOURCE_METRICS.evaluate(values, time.time(), lang)
+            alerts_to_send.extend(DISK_MONITOR.evaluate_trends(lang))
             if alerts_to_send:
-                full_alert_message = "\n\n".join(alerts_to_send)
+                full_alert_message = "\n\n".join(alert.text for alert in alerts_to_send)
                 # send_alert сам обработает язык получателей
-                await send_alert(bot, full_alert_message, "resources")
+                await send_alert(bot, full_alert_message, "resources", PRIORITY_CRITICAL,
+                                 key="+".join(alert.key for alert in alerts_to_send))
 
         except Exception as e:
             logging.error(f"Ошибка в мониторе ресурсов: {e}")
 
         await asyncio.sleep(RESOURCE_CHECK_INTERVAL)
 
-# --- [НАЧАЛО ИСПРАВЛЕНИЯ] --- (Код reliable_tail_log_monitor остается без изменений)
-
-
-async def _read_stdout(process, alert_type, parse_function, close_event):
-    """Читает stdout процесса, пока он не закроется."""
-    try:
-        async for line in process.stdout:
-            try:
-                line_str = line.decode('utf-8', errors='ignore').strip()
-                if line_str:
-                    # parse_function уже использует i18n
-                    message = await parse_function(line_str)
-                    if message:
-                        await send_alert(process.bot_ref, message, alert_type)
-            except Exception as e:
-                logging.error(
-                    f"Монитор {alert_type} (stdout): Ошибка парсинга строки: {e}")
-    except Exception as e:
-        if not isinstance(e, asyncio.CancelledError):
-            logging.error(
-                f"Монитор {alert_type} (stdout): Ошибка чтения потока: {e}")
-    finally:
-        logging.info(f"Монитор {alert_type}: stdout ридер завершен.")
-        close_event.set()
-
-
-async def _read_stderr(process, alert_type, close_event):
-    """Читает stderr процесса, пока он не закроется."""
-    try:
-        async for line in process.stderr:
-            try:
-                stderr_str = line.decode('utf-8', errors='ignore').strip()
-                if stderr_str:
-                    logging.warning(
-                        f"Монитор {alert_type} (tail stderr): {stderr_str}")
-            except Exception as e:
-                logging.error(
-                    f"Монитор {alert_type} (stderr): Ошибка парсинга строки: {e}")
-    except Exception as e:
-        if not isinstance(e, asyncio.CancelledError):
-            logging.error(
-                f"Монитор {alert_type} (stderr): Ошибка чтения потока: {e}")
-    finally:
-        logging.info(f"Монитор {alert_type}: stderr ридер завершен.")
-        close_event.set()
-
-
-async def reliable_tail_log_monitor(
-        bot: Bot,
-        log_file_path: str,
-        alert_type: str,
-        parse_function: callable):
-    process = None
-    stdout_closed = asyncio.Event()
-    stderr_closed = asyncio.Event()
-    stdout_task = None
-    stderr_task = None
 
+async def traffic_anomaly_monitor(bot: Bot):
+    logging.info("Детектор аномалий трафика запущен.")
+    lang = config.DEFAULT_LANGUAGE
     try:
         while True:
-            stdout_closed.clear()
-            stderr_closed.clear()
-            process = None
-            stdout_task = None
-            stderr_task = None
-
-            if not await asyncio.to_thread(os.path.exists, log_file_path):
-                logging.warning(
-                    f"Монитор: {log_file_path} не найден. Проверка через 60с.")
-                await asyncio.sleep(60)
-                continue
-
-            logging.info(
-                f"Запуск (или перезапуск) монитора {alert_type} для {log_file_path}")
+            await asyncio.sleep(TRAFFIC_ANOMALY_INTERVAL)
             try:
-                process = await asyncio.create_subprocess_shell(
-                    f"tail -n 0 -f {log_file_path}",
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE
-                )
-                process.bot_ref = bot
-                logging.info(
-                    f"Монитор {alert_type} (PID: {process.pid}) следит за {log_file_path}")
-
-                stdout_task = asyncio.create_task(
-                    _read_stdout(
-                        process,
-                        alert_type,
-                        parse_function,
-                        stdout_closed))
-                stderr_task = asyncio.create_task(
-                    _read_stderr(process, alert_type, stderr_closed))
-
-                return_code = await process.wait()
-
-                logging.warning(
-                    f"Процесс 'tail' для {alert_type} (PID: {process.pid}) умер с кодом {return_code}. Ожидание ридеров...")
-
-                try:
-                    await asyncio.wait_for(asyncio.gather(stdout_closed.wait(), stderr_closed.wait()), timeout=2.0)
-                    logging.info(
-                        f"Монитор {alert_type}: Оба ридера штатно завершились.")
-                except asyncio.TimeoutError:
-                    logging.warning(
-                        f"Монитор {alert_type}: Таймаут ожидания закрытия ридеров. Принудительная отмена.")
-
-            except PermissionError:
-                logging.warning(
-                    f"Монитор: Нет прав на чтение {log_file_path}. Проверка через 60с.")
-                await asyncio.sleep(60)
+                rates = await asyncio.to_thread(TRAFFIC_ANOMALY.read_rates)
+                if rates is None:
+                    continue
+                now = time.time()
+                TRAFFIC_ANOMALY.observe(rates, now)
+                # Пробы правил только читают результат observe() — без ввода-вывода
+                alerts_to_send = TRAFFIC_METRICS.evaluate(
+                    TRAFFIC_METRICS.sample_sync(), now, lang)
+                if alerts_to_send:
+                    await send_alert(bot, "\n\n".join(alert.text for alert in alerts_to_send),
+                                     "resources", PRIORITY_CRITICAL,
+                                     key="+".join(alert.key for alert in alerts_to_send))
+                if TRAFFIC_ANOMALY.save_due():
+                    await asyncio.to_thread(TRAFFIC_ANOMALY.save)
             except Exception as e:
-                pid_info = f"(PID: {process.pid})" if process else ""
-                logging.error(
-                    f"Критическая ошибка во внутреннем цикле reliable_tail_log_monitor ({log_file_path}) {pid_info}: {e}")
-
-            finally:
-                if stdout_task and not stdout_task.done():
-                    stdout_task.cancel()
-                    logging.debug(
-                        f"Монитор {alert_type}: Отмена задачи stdout...")
-                if stderr_task and not stderr_task.done():
-                    stderr_task.cancel()
-                    logging.debug(
-                        f"Монитор {alert_type}: Отмена задачи stderr...")
-
-                if stdout_task:
-                    await asyncio.gather(stdout_task, return_exceptions=True)
-                if stderr_task:
-                    await asyncio.gather(stderr_task, return_exceptions=True)
-
-                if process and process.returncode is None:
-                    try:
-                        process.terminate()
-                        logging.warning(
-                            f"Монитор {alert_type}: Принудительное завершение 'tail' (PID: {process.pid}).")
-                    except ProcessLookupError:
-                        pass
-
-                process = None
-                logging.info(
-                    f"Монитор {alert_type}: Пауза 5 сек перед перезапуском...")
-                await asyncio.sleep(5)
-
-    except asyncio.CancelledError:
-        logging.info(f"Монитор {alert_type} отменен (штатное завершение).")
-
+                logging.error(f"Ошибка в детекторе аномалий трафика: {e}")
     finally:
-        pid = process.pid if process else None
-        logging.info(
-            f"Завершение работы монитора {alert_type}, попытка остановки 'tail' (PID: {pid})...")
-
-        if stdout_task and not stdout_task.done():
-            stdout_task.cancel()
-        if stderr_task and not stderr_task.done():
-            stderr_task.cancel()
-
-        if stdout_task or stderr_task:
-            tasks_to_wait = [t for t in (stdout_task, stderr_task) if t]
-            await asyncio.gather(*tasks_to_wait, return_exceptions=True)
-            logging.info(f"Монитор {alert_type}: Задачи чтения остановлены.")
-
-        if process and process.returncode is None:
-            logging.info(
-                f"Монитор {alert_type}: Остановка процесса tail (PID: {pid}).")
-            try:
-                process.terminate()
-                try:
-                    await asyncio.wait_for(process.wait(), timeout=2.0)
-                    logging.info(
-                        f"Монитор {alert_type}: 'tail' (PID: {pid}) успешно остановлен (terminate).")
-                except asyncio.TimeoutError:
-                    logging.warning(
-                        f"Монитор {alert_type}: 'tail' (PID: {pid}) не завершился за 2 сек. Попытка kill().")
-                    try:
-                        process.kill()
-                        await asyncio.wait_for(process.wait(), timeout=1.0)
-                        logging.info(
-                            f"Монитор {alert_type}: 'tail' (PID: {pid}) успешно убит (kill).")
-                    except Exception:
-                        pass
-            except Exception:
-                pass
-        elif process:
-            logging.info(
-                f"Монитор {alert_type}: 'tail' (PID: {pid}) уже был завершен (код: {process.returncode}).")
-        else:
-            logging.info(
-                f"Монитор {alert_type}: Процесс tail не был запущен или уже был очищен.")
-# --- [КОНЕЦ ИСПРАВЛЕНИЯ] ---
+        await asyncio.to_thread(TRAFFIC_ANOMALY.save)
@@ -1,17 +1,15 @@
 # /opt-tg-bot/modules/selftest.py
 import asyncio
 import psutil
-import time
 import re
 import os
 import logging
-from datetime import datetime
 from aiogram import F, Dispatcher, types
 from aiogram.types import KeyboardButton
 
 # --- Оставляем эти импорты ---
 from core.i18n import I18nFilter, get_user_lang  # Убираем _ отсюда
-from core import config
+from core import config, http_client
 # ----------------------------------------
 
 from core.auth import is_allowed, send_access_denied_message
@@ -20,8 +18,13 @@ from core.shared_state import LAST_MESSAGE_IDS
 # <-- Добавлен get_host_path
 from core.utils import format_uptime, format_traffic, get_country_flag, get_server_timezone_label, escape_html, get_host_path
 from core.config import INSTALL_MODE
+from core.log_bus import LOG_BUS
+from core.cpu_sampler import CPU_SAMPLER
+from core.log_parser import LOGIN_ACCEPTED
 
 BUTTON_KEY = "btn_selftest"
+# api.ipify.org отдает только IPv4 (как раньше `curl -4 ifconfig.me`)
+EXTERNAL_IP_URL = "https://api.ipify.org"
 
 
 def get_button() -> KeyboardButton:
@@ -55,9 +58,10 @@ async def selftest_handler(message: types.Message):
     LAST_MESSAGE_IDS.setdefault(user_id, {})[command] = sent_message.message_id
 
     def get_system_stats_sync():
-        psutil.cpu_percent(interval=None)
-        time.sleep(0.2)
-        cpu = psutil.cpu_percent(interval=None)
+        # --- ИЗМЕНЕНО: CPU берется из фонового замера (core/cpu_sampler.py) ---
+        cpu = CPU_SAMPLER.current()
+        if cpu is None:  # Сразу после старта замеров еще нет
+            cpu = psutil.cpu_percent(interval=0.2)
         mem = psutil.virtual_memory().percent
         # --- ИЗМЕНЕНО: Используем get_host_path ---
         disk = psutil.disk_usage(get_host_path('/')).percent
@@ -98,99 +102,43 @@ async def selftest_handler(message: types.Message):
         "selftest_inet_fail",
         lang)
 
-    ip_cmd = "curl -4 -s --max-time 3 ifconfig.me"
-    ip_process = await asyncio.create_subprocess_shell(
-        ip_cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-    )
-    # --- ИЗМЕНЕНО: Переименована переменная ---
-    ip_stdout, ip_stderr = await ip_process.communicate()
-    # -----------------------------------------
-    external_ip = ip_stdout.decode().strip() or _("selftest_ip_fail", lang)
+    # --- ИЗМЕНЕНО: Внешний IP через общий HTTP-клиент (вместо curl) ---
+    try:
+        external_ip = (await http_client.get_text(EXTERNAL_IP_URL, timeout=3, retries=0)).strip()
+    except Exception as e:
+        logging.debug(f"Selftest: не удалось получить внешний IP: {e}")
+        external_ip = ""
+    external_ip = escape_html(external_ip) or _("selftest_ip_fail", lang)
+    # -----------------------------------------------------------------
 
     last_login_info = ""
     if INSTALL_MODE == "root":
         try:
-            log_file = None
-            # --- ИЗМЕНЕНО: Используем get_host_path ---
-            secure_path = get_host_path("/var/log/secure")
-            auth_path = get_host_path("/var/log/auth.log")
-            if await asyncio.to_thread(os.path.exists, secure_path):
-                log_file = secure_path
-            elif await asyncio.to_thread(os.path.exists, auth_path):
-                log_file = auth_path
-            # -----------------------------------------
-
-            line = None
-            source_text = ""
-
-            if log_file:
-                source = os.path.basename(log_file)
-                source_text = _("selftest_ssh_source", lang, source=source)
-                cmd = f"tail -n 100 {log_file}"
-                process = await asyncio.create_subprocess_shell(
-                    cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-                )
-                stdout, stderr = await process.communicate()
-                if process.returncode != 0:
-                    raise Exception(stderr.decode())
-
-                for l in reversed(stdout.decode().strip().split('\n')):
-                    if "Accepted" in l and "sshd" in l:
-                        line = l.strip()
-                        break
-            else:
+            # --- ИЗМЕНЕНО: Последний вход берется из общей шины логов
+            # (файл auth.log/secure или поток journald) ---
+            source = LOG_BUS.sources.get("ssh")
+            if source is None:
+                raise Exception(_("sshlog_no_source", lang))
+            if source.is_journal:
                 source_text = _("selftest_ssh_source_journal", lang)
-                # --- ИЗМЕНЕНО: journalctl должен работать в docker-root из-за pid:host ---
-                cmd = "journalctl -u ssh --no-pager -g 'Accepted' | tail -n 1"
-                # ---------------------------------------------------------------------
-                process = await asyncio.create_subprocess_shell(
-                    cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-                )
-                try:
-                    stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=5.0)
-                except asyncio.TimeoutError:
-                    raise Exception("journalctl timeout")
-
-                if process.returncode != 0:
-                    raise Exception(stderr.decode())
-                line = stdout.decode().strip()
+            else:
+                source_text = _("selftest_ssh_source", lang,
+                                source=os.path.basename(source.path))
+            recent_logins = LOG_BUS.recent("ssh", [LOGIN_ACCEPTED], limit=1)
+            event = recent_logins[0] if recent_logins else None
+            found = event is not None
 
             ssh_header = _("selftest_ssh_header", lang, source=source_text)
 
-            if line:
-                dt_object = None
-                date_match_iso = re.search(
-                    r"(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})", line)
-                date_match_syslog = re.search(
-                    r"(\w{3}\s+\d{1,2}\s+\d{2}:\d{2}:\d{2})", line)
-
-                try:
-                    if date_match_iso:
-                        dt_object = datetime.strptime(
-                            date_match_iso.group(1), "%Y-%m-%dT%H:%M:%S")
-                    elif date_match_syslog:
-                        log_timestamp = datetime.strptime(
-                            date_match_syslog.group(1), "%b %d %H:%M:%S")
-                        current_year = datetime.now().year
-                        dt_object = log_timestamp.replace(year=current_year)
-                        if dt_object > datetime.now():
-                            dt_object = dt_object.replace(
-                                year=current_year - 1)
-                except Exception as e:
-                    logging.warning(
-                        f"Selftest: не удалось распарсить дату: {e}. Строка: {line}")
-
-                login_match = re.search(
-                    r"Accepted\s+(?:\S+)\s+for\s+(\S+)\s+from\s+(\S+)", line)
-
-                if dt_object and login_match:
-                    user = escape_html(login_match.group(1))
-                    ip = escape_html(login_match.group(2))
-                    flag = await asyncio.to_thread(get_country_flag, ip)
+            if found:
+                if event and event.kind == LOGIN_ACCEPTED and event.timestamp:
+                    user = escape_html(event.user)
+                    ip = escape_html(event.ip)
+                    flag = await get_country_flag(ip)
 
                     tz_label = get_server_timezone_label()
-                    formatted_time = dt_object.strftime("%H:%M")
-                    formatted_date = dt_object.strftime("%d.%m.%Y")
+                    formatted_time = event.timestamp.strftime("%H:%M")
+                    formatted_date = event.timestamp.strftime("%d.%m.%Y")
 
                     last_login_info = ssh_header + _(
                         "selftest_ssh_entry",
@@ -203,7 +151,7 @@ async def selftest_handler(message: types.Message):
                         date=formatted_date)
                 else:
                     logging.warning(
-                        f"Selftest: Не удалось разобрать строку SSH (login_match={login_match}, dt_object={dt_object}): {line}")
+                        f"Selftest: Не удалось разобрать строку SSH: {event}")
                     last_login_info = ssh_header + \
                         _("selftest_ssh_parse_fail", lang)
             else:
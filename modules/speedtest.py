@@ -5,7 +5,6 @@ import logging
 import json
 import platform
 import shlex
-import requests
 import os
 import subprocess
 import concurrent.futures
@@ -13,6 +12,7 @@ from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Dict, Any, Tuple, List
 import ipaddress
 import yaml  # <-- Добавлено
+import aiohttp
 
 from aiogram import F, Dispatcher, types, Bot  # <<<--- Добавлен импорт Bot
 from aiogram.types import KeyboardButton
@@ -20,10 +20,12 @@ from aiogram.exceptions import TelegramBadRequest
 
 # --- Импорты ядра ---
 from core.i18n import _, I18nFilter, get_user_lang
-from core import config
+from core import config, http_client
 from core.auth import is_allowed, send_access_denied_message
 from core.messaging import delete_previous_message
 from core.shared_state import LAST_MESSAGE_IDS
+from core.singleflight import SingleFlight
+from core.live_message import LIVE_MESSAGES
 # --- ИЗМЕНЕНИЕ ИМПОРТА ---
 from core.utils import escape_html, get_country_details  # Заменили get_country_flag
 # -------------------------
@@ -49,6 +51,10 @@ IPERF_TEST_DURATION = 8
 IPERF_PROCESS_TIMEOUT = 30.0
 MAX_TEST_ATTEMPTS = 3
 
+# Одновременные /speedtest (несколько админов) используют одну геолокацию
+# и одну загрузку списка серверов
+_flight = SingleFlight("speedtest")
+
 
 def get_button() -> KeyboardButton:
     return KeyboardButton(text=_(BUTTON_KEY, config.DEFAULT_LANGUAGE))
@@ -65,26 +71,29 @@ async def edit_status_safe(
         message_id: Optional[int],
         text: str,
         lang: str):
-    """Безопасно редактирует сообщение статуса или отправляет новое."""
+    """
+    Безопасно редактирует сообщение статуса или отправляет новое.
+    Статус — "живое" сообщение (core/live_message.py): быстрые смены этапов
+    сливаются в одну правку, ошибка прошлой правки видна здесь же.
+    """
     if not message_id:
         logging.warning("edit_status_safe: message_id is None, cannot edit.")
         return message_id
 
     try:
-        await bot.edit_message_text(text, chat_id=chat_id, message_id=message_id, parse_mode="HTML")
+        await LIVE_MESSAGES.get(bot, chat_id, message_id).update(text)
         return message_id
     except TelegramBadRequest as e:
-        if "message is not modified" in str(e).lower():
-            pass
-        elif "message to edit not found" in str(e).lower():
+        LIVE_MESSAGES.close(chat_id, message_id)
+        if "message to edit not found" in str(e).lower():
             logging.warning(
                 f"edit_status_safe: Message {message_id} not found. Sending new.")
-            return None
         else:
             logging.error(
                 f"edit_status_safe: Error editing message {message_id}: {e}")
-            return None
+        return None
     except Exception as e:
+        LIVE_MESSAGES.close(chat_id, message_id)
         logging.error(
             f"edit_status_safe: Unexpected error editing message {message_id}: {e}",
             exc_info=True)
@@ -122,33 +131,33 @@ def get_ping_sync(host: str) -> Optional[float]:
     return None
 
 
-def get_vps_location_sync() -> Tuple[Optional[str], Optional[str]]:
+async def get_vps_location() -> Tuple[Optional[str], Optional[str]]:
+    """Возвращает (ip | None, country_code | None) VPS."""
+    return await _flight.do("vps_location", _resolve_vps_location)
+
+
+async def _resolve_vps_location() -> Tuple[Optional[str], Optional[str]]:
     ip, country_code = None, None
     try:
-        ip_response = requests.get(
+        ip_data = await http_client.get_json(
             "https://api.ipify.org?format=json", timeout=5)
-        ip_response.raise_for_status()
-        ip = ip_response.json().get("ip")
+        ip = ip_data.get("ip")
         if not ip:
-            ip_response = requests.get("https://ipinfo.io/ip", timeout=5)
-            ip_response.raise_for_status()
-            ip = ip_response.text.strip()
-    except requests.RequestException as e:
+            ip = (await http_client.get_text("https://ipinfo.io/ip", timeout=5)).strip()
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
         logging.warning(f"Не удалось определить IP VPS: {e}")
         return None, None
     if ip:
         try:
-            geo_response = requests.get(
-                f"http://ip-api.com/json/{ip}?fields=status,countryCode", timeout=5)
-            geo_response.raise_for_status()
-            data = geo_response.json()
+            data = await http_client.get_json(
+                f"{config.GEOIP_API_URL}/json/{ip}?fields=status,countryCode", timeout=5)
             if data.get("status") == "success":
                 country_code = data.get("countryCode")
                 logging.info(f"Определен код страны VPS: {country_code}")
             else:
                 logging.warning(
                     f"Не удалось получить страну для IP {ip}. Ответ: {data}")
-        except requests.RequestException as e:
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             logging.warning(f"Ошибка при запросе геолокации для IP {ip}: {e}")
     return ip, country_code
 
@@ -161,234 +170,238 @@ def is_ip_address(host: str) -> bool:
         return False
 
 
-def fetch_parse_and_prioritize_servers_sync(
-        vps_country_code: Optional[str],
-        lang: str) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+async def fetch_list_with_cache(
+        url: str,
+        cache_file: str,
+        label: str) -> Tuple[Optional[str], Optional[str]]:
     """
-    Загружает и парсит список серверов.
-    Если VPS в России ('RU'), пытается использовать YAML-список.
-    Возвращает (список_серверов, ключ_ошибки_i18n | None).
+    Скачивает список серверов через общий HTTP-клиент и обновляет локальный кеш.
+    При ошибке загрузки читает кеш. Возвращает (содержимое | None, ошибка_загрузки | None).
     """
-    servers_list = []
-    error_key = None
-    use_ru_list = vps_country_code == 'RU'
-
-    # --- Попытка загрузить российский YAML-список, если vps_country_code == 'RU' ---
-    if use_ru_list:
-        logging.info(
-            f"VPS находится в RU, попытка загрузки российского списка с {RU_SERVER_LIST_URL}...")
-        ru_yaml_content = None
-        ru_download_error = None
+    content, download_error = None, None
+    try:
+        content = await http_client.get_text(url, timeout=10)
         try:
-            response_ru = requests.get(RU_SERVER_LIST_URL, timeout=10)
-            response_ru.raise_for_status()
-            ru_yaml_content = response_ru.text
-            try:
-                os.makedirs(
-                    os.path.dirname(LOCAL_RU_CACHE_FILE),
-                    exist_ok=True)
-                with open(LOCAL_RU_CACHE_FILE, "w", encoding='utf-8') as f:
-                    f.write(ru_yaml_content)
-                logging.info(
-                    f"Свежий российский список сохранен в {LOCAL_RU_CACHE_FILE}")
-            except Exception as e:
-                logging.error(
-                    f"Не удалось сохранить кеш RU: {e}",
-                    exc_info=True)
-        except requests.RequestException as e:
-            ru_download_error = f"Ошибка сети/таймаут RU: {e}"
-            logging.warning(f"Ошибка загрузки RU: {ru_download_error}")
+            await asyncio.to_thread(_write_cache_file_sync, cache_file, content)
+            logging.info(f"Свежий {label} список сохранен в {cache_file}")
         except Exception as e:
-            ru_download_error = f"Ошибка RU: {e}"
             logging.error(
-                f"Ошибка загрузки RU: {ru_download_error}",
+                f"Не удалось сохранить кеш {label}: {e}",
                 exc_info=True)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        download_error = f"Ошибка сети/таймаут {label}: {e}"
+        logging.warning(f"Ошибка загрузки {label}: {download_error}")
+    except Exception as e:
+        download_error = f"Ошибка {label}: {e}"
+        logging.error(
+            f"Ошибка загрузки {label}: {download_error}",
+            exc_info=True)
 
-        if ru_yaml_content is None:
-            if os.path.exists(LOCAL_RU_CACHE_FILE):
-                logging.warning(f"Чтение RU из кеша {LOCAL_RU_CACHE_FILE}...")
-                try:
-                    with open(LOCAL_RU_CACHE_FILE, "r", encoding='utf-8') as f:
-                        ru_yaml_content = f.read()
-                    logging.info("Успешно прочитан RU кеш.")
-                except Exception as e:
-                    logging.error(
-                        f"Не удалось прочитать RU кеш: {e}",
-                        exc_info=True)
-            else:
-                logging.error(
-                    f"Не удалось скачать RU список ({ru_download_error}) и кеш не найден.")
-                error_key = "iperf_fetch_error_ru"
-
-        if ru_yaml_content:
+    if content is None:
+        if await asyncio.to_thread(os.path.exists, cache_file):
+            logging.warning(f"Чтение {label} из кеша {cache_file}...")
             try:
-                ru_servers_data = yaml.safe_load(ru_yaml_content)
-                if not isinstance(ru_servers_data, list):
-                    raise ValueError("Ожидался список в YAML")
-                for s in ru_servers_data:
-                    if not isinstance(s, dict):
-                        continue
-                    host, port_str, city, name = s.get('address'), s.get(
-                        'port'), s.get('City'), s.get('Name')
-                    if not host or not port_str or not city or not name:
-                        continue
-                    port = None
-                    try:
-                        port = int(str(port_str).split('-')[0].strip())
-                    except ValueError:
-                        continue
-
-                    servers_list.append({
-                        "host": host,
-                        "port": port,
-                        "city": city,
-                        "country": "RU",
-                        "continent": "EU",
-                        "provider": name
-                    })
-                logging.info(
-                    f"Успешно загружено и распарсено {len(servers_list)} российских серверов.")
-                return servers_list, None
-            except yaml.YAMLError as e:
-                logging.error(f"Ошибка разбора RU YAML: {e}")
-                error_key = "iperf_parse_error_ru"
-                if ru_download_error and os.path.exists(LOCAL_RU_CACHE_FILE):
-                    try:
-                        os.remove(LOCAL_RU_CACHE_FILE)
-                        logging.warning("Поврежденный RU кеш удален.")
-                    except OSError as rm_e:
-                        logging.error(
-                            f"Не удалось удалить поврежденный RU файл кеша {LOCAL_RU_CACHE_FILE}: {rm_e}")
+                content = await asyncio.to_thread(_read_cache_file_sync, cache_file)
+                logging.info(f"Успешно прочитан {label} кеш.")
             except Exception as e:
                 logging.error(
-                    f"Неожиданная ошибка при парсинге RU YAML: {e}",
+                    f"Не удалось прочитать {label} кеш: {e}",
                     exc_info=True)
-                error_key = "iperf_parse_error_ru"
+        else:
+            logging.error(
+                f"Не удалось скачать {label} список ({download_error}) и кеш не найден.")
+    return content, download_error
+
+
+def _write_cache_file_sync(cache_file: str, content: str):
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    with open(cache_file, "w", encoding='utf-8') as f:
+        f.write(content)
 
-    # --- Если российский список не использовался или произошла ошибка, используем основной JSON ---
-    if not servers_list:
-        if use_ru_list:
-            logging.warning(
-                "Не удалось использовать российский список, переход на основной JSON...")
 
-        servers_json_content, download_error = None, None
-        vps_continent = None
+def _read_cache_file_sync(cache_file: str) -> str:
+    with open(cache_file, "r", encoding='utf-8') as f:
+        return f.read()
+
+
+def _remove_broken_cache_sync(cache_file: str, label: str):
+    if os.path.exists(cache_file):
         try:
-            response = requests.get(SERVER_LIST_URL, timeout=10)
-            response.raise_for_status()
-            servers_json_content = response.text
-            try:
-                os.makedirs(os.path.dirname(LOCAL_CACHE_FILE), exist_ok=True)
-                with open(LOCAL_CACHE_FILE, "w", encoding='utf-8') as f:
-                    f.write(servers_json_content)
-                logging.info(
-                    f"Свежий JSON список сохранен в {LOCAL_CACHE_FILE}")
-            except Exception as e:
-                logging.error(
-                    f"Не удалось сохранить JSON кеш: {e}",
-                    exc_info=True)
-        except requests.RequestException as e:
-            download_error = f"Ошибка сети/таймаут JSON: {e}"
-            logging.warning(f"Ошибка загрузки JSON: {download_error}")
-        except Exception as e:
-            download_error = f"Ошибка JSON: {e}"
+            os.remove(cache_file)
+            logging.warning(f"Поврежденный {label} кеш удален.")
+        except OSError as rm_e:
             logging.error(
-                f"Ошибка загрузки JSON: {download_error}",
-                exc_info=True)
+                f"Не удалось удалить поврежденный {label} файл кеша {cache_file}: {rm_e}")
 
-        if servers_json_content is None:
-            if os.path.exists(LOCAL_CACHE_FILE):
-                logging.warning(f"Чтение JSON из кеша {LOCAL_CACHE_FILE}...")
-                try:
-                    with open(LOCAL_CACHE_FILE, "r", encoding='utf-8') as f:
-                        servers_json_content = f.read()
-                    logging.info("Успешно прочитан JSON кеш.")
-                except Exception as e:
-                    logging.error(
-                        f"Не удалось прочитать JSON кеш: {e}",
-                        exc_info=True)
-                    return [], error_key or "iperf_fetch_error"
-            else:
-                logging.error(
-                    f"Не удалось скачать JSON ({download_error}) и кеш не найден.")
-                return [], error_key or "iperf_fetch_error"
 
-        try:
-            servers_data = json.loads(servers_json_content)
-            if not isinstance(servers_data, list):
-                raise ValueError("Ожидался список в JSON")
-
-            if vps_country_code:
-                for s in servers_data:
-                    if isinstance(s, dict) and s.get(
-                            "COUNTRY") == vps_country_code:
-                        vps_continent = s.get("CONTINENT")
-                        break
+def parse_ru_servers_sync(
+        ru_yaml_content: str,
+        ru_download_error: Optional[str]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Парсит российский YAML-список. Возвращает (список_серверов, ключ_ошибки_i18n | None)."""
+    servers_list = []
+    try:
+        ru_servers_data = yaml.safe_load(ru_yaml_content)
+        if not isinstance(ru_servers_data, list):
+            raise ValueError("Ожидался список в YAML")
+        for s in ru_servers_data:
+            if not isinstance(s, dict):
+                continue
+            host, port_str, city, name = s.get('address'), s.get(
+                'port'), s.get('City'), s.get('Name')
+            if not host or not port_str or not city or not name:
+                continue
+            port = None
+            try:
+                port = int(str(port_str).split('-')[0].strip())
+            except ValueError:
+                continue
+
+            servers_list.append({
+                "host": host,
+                "port": port,
+                "city": city,
+                "country": "RU",
+                "continent": "EU",
+                "provider": name
+            })
+        logging.info(
+            f"Успешно загружено и распарсено {len(servers_list)} российских серверов.")
+        return servers_list, None
+    except yaml.YAMLError as e:
+        logging.error(f"Ошибка разбора RU YAML: {e}")
+        if ru_download_error:
+            _remove_broken_cache_sync(LOCAL_RU_CACHE_FILE, "RU")
+        return [], "iperf_parse_error_ru"
+    except Exception as e:
+        logging.error(
+            f"Неожиданная ошибка при парсинге RU YAML: {e}",
+            exc_info=True)
+        return [], "iperf_parse_error_ru"
+
 
-            domain_same_country, domain_same_continent, domain_others = [], [], []
-            ip_same_country, ip_same_continent, ip_others = [], [], []
+def parse_and_prioritize_servers_sync(
+        servers_json_content: str,
+        download_error: Optional[str],
+        vps_country_code: Optional[str],
+        error_key: Optional[str]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Парсит основной JSON-список и сортирует серверы по близости к VPS."""
+    vps_continent = None
+    try:
+        servers_data = json.loads(servers_json_content)
+        if not isinstance(servers_data, list):
+            raise ValueError("Ожидался список в JSON")
+
+        if vps_country_code:
             for s in servers_data:
-                if not isinstance(s, dict):
-                    continue
-                host, port_str, s_country, s_continent = s.get(
-                    "IP/HOST"), s.get("PORT"), s.get("COUNTRY"), s.get("CONTINENT")
-                if not host or not port_str:
-                    continue
-                port = None
-                try:
-                    port = int(port_str.split('-')[0].strip()) if isinstance(
-                        port_str, str) and '-' in port_str else int(port_str)
-                except ValueError:
-                    continue
-
-                server_dict = {
-                    "host": host, "port": port,
-                    "city": s.get("SITE", "N/A"),
-                    "country": s_country,
-                    "continent": s_continent,
-                    "provider": s.get("PROVIDER", "N/A")
-                }
-                is_ip = is_ip_address(host)
-                if vps_country_code and s_country == vps_country_code:
-                    (ip_same_country if is_ip else domain_same_country).append(
-                        server_dict)
-                elif vps_continent and s_continent == vps_continent:
-                    (ip_same_continent if is_ip else domain_same_continent).append(
-                        server_dict)
-                else:
-                    (ip_others if is_ip else domain_others).append(server_dict)
-
-            prioritized_list = (
-                domain_same_country +
-                domain_same_continent +
-                domain_others +
-                ip_same_country +
-                ip_same_continent +
-                ip_others)
-            logging.info(
-                f"Загружено/распарсено и приоритезировано {len(prioritized_list)} JSON серверов.")
-            return prioritized_list, None
-
-        except json.JSONDecodeError as e:
-            logging.error(f"Ошибка разбора JSON: {e}")
-            if download_error and os.path.exists(LOCAL_CACHE_FILE):
-                try:
-                    os.remove(LOCAL_CACHE_FILE)
-                    logging.warning("Поврежденный JSON кеш удален.")
-                except OSError as rm_e:
-                    logging.error(
-                        f"Не удалось удалить поврежденный JSON файл кеша {LOCAL_CACHE_FILE}: {rm_e}")
-            return [], error_key or "iperf_fetch_error"
-        except ValueError as e:
-            logging.error(f"Ошибка структуры JSON: {e}")
-            return [], error_key or "iperf_fetch_error"
-        except Exception as e:
-            logging.error(
-                f"Неожиданная ошибка при парсинге/приоритезации JSON: {e}",
-                exc_info=True)
-            return [], error_key or "iperf_fetch_error"
+                if isinstance(s, dict) and s.get(
+                        "COUNTRY") == vps_country_code:
+                    vps_continent = s.get("CONTINENT")
+                    break
+
+        domain_same_country, domain_same_continent, domain_others = [], [], []
+        ip_same_country, ip_same_continent, ip_others = [], [], []
+        for s in servers_data:
+            if not isinstance(s, dict):
+                continue
+            host, port_str, s_country, s_continent = s.get(
+                "IP/HOST"), s.get("PORT"), s.get("COUNTRY"), s.get("CONTINENT")
+            if not host or not port_str:
+                continue
+            port = None
+            try:
+                port = int(port_str.split('-')[0].strip()) if isinstance(
+                    port_str, str) and '-' in port_str else int(port_str)
+            except ValueError:
+                continue
+
+            server_dict = {
+                "host": host, "port": port,
+                "city": s.get("SITE", "N/A"),
+                "country": s_country,
+                "continent": s_continent,
+                "provider": s.get("PROVIDER", "N/A")
+            }
+            is_ip = is_ip_address(host)
+            if vps_country_code and s_country == vps_country_code:
+                (ip_same_country if is_ip else domain_same_country).append(
+                    server_dict)
+            elif vps_continent and s_continent == vps_continent:
+                (ip_same_continent if is_ip else domain_same_continent).append(
+                    server_dict)
+            else:
+                (ip_others if is_ip else domain_others).append(server_dict)
+
+        prioritized_list = (
+            domain_same_country +
+            domain_same_continent +
+            domain_others +
+            ip_same_country +
+            ip_same_continent +
+            ip_others)
+        logging.info(
+            f"Загружено/распарсено и приоритезировано {len(prioritized_list)} JSON серверов.")
+        return prioritized_list, None
+
+    except json.JSONDecodeError as e:
+        logging.error(f"Ошибка разбора JSON: {e}")
+        if download_error:
+            _remove_broken_cache_sync(LOCAL_CACHE_FILE, "JSON")
+        return [], error_key or "iperf_fetch_error"
+    except ValueError as e:
+        logging.error(f"Ошибка структуры JSON: {e}")
+        return [], error_key or "iperf_fetch_error"
+    except Exception as e:
+        logging.error(
+            f"Неожиданная ошибка при парсинге/приоритезации JSON: {e}",
+            exc_info=True)
+        return [], error_key or "iperf_fetch_error"
+
+
+async def fetch_parse_and_prioritize_servers(
+        vps_country_code: Optional[str],
+        lang: str) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Загружает и парсит список серверов.
+    Если VPS в России ('RU'), пытается использовать YAML-список.
+    Возвращает (список_серверов, ключ_ошибки_i18n | None).
+    """
+    return await _flight.do(
+        ("servers", vps_country_code),
+        lambda: _fetch_parse_and_prioritize_servers(vps_country_code))
+
+
+async def _fetch_parse_and_prioritize_servers(
+        vps_country_code: Optional[str]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    error_key = None
+
+    # --- Попытка загрузить российский YAML-список, если vps_country_code == 'RU' ---
+    if vps_country_code == 'RU':
+        logging.info(
+            f"VPS находится в RU, попытка загрузки российского списка с {RU_SERVER_LIST_URL}...")
+        ru_yaml_content, ru_download_error = await fetch_list_with_cache(
+            RU_SERVER_LIST_URL, LOCAL_RU_CACHE_FILE, "RU")
+        if ru_yaml_content is None:
+            error_key = "iperf_fetch_error_ru"
+        else:
+            servers_list, error_key = await asyncio.to_thread(
+                parse_ru_servers_sync, ru_yaml_content, ru_download_error)
+            if servers_list:
+                return servers_list, None
+        logging.warning(
+            "Не удалось использовать российский список, переход на основной JSON...")
+
+    # --- Основной JSON-список ---
+    servers_json_content, download_error = await fetch_list_with_cache(
+        SERVER_LIST_URL, LOCAL_CACHE_FILE, "JSON")
+    if servers_json_content is None:
+        return [], error_key or "iperf_fetch_error"
 
-    return servers_list, None
+    return await asyncio.to_thread(
+        parse_and_prioritize_servers_sync,
+        servers_json_content,
+        download_error,
+        vps_country_code,
+        error_key)
 
 
 def find_best_servers_sync(
@@ -620,7 +633,7 @@ async def speedtest_handler(message: types.Message):
     final_text = ""
     try:
         # --- Этап 1: Геолокация ---
-        vps_ip, vps_country_code = await asyncio.to_thread(get_vps_location_sync)
+        vps_ip, vps_country_code = await get_vps_location()
         if not vps_ip or not vps_country_code:
             logging.warning("Поиск без приоритезации геолокации.")
 
@@ -630,7 +643,7 @@ async def speedtest_handler(message: types.Message):
         if not status_message_id:
             raise Exception("Не удалось обновить статус 'Загрузка списка'")
 
-        all_servers, fetch_error_key = await asyncio.to_thread(fetch_parse_and_prioritize_servers_sync, vps_country_code, lang)
+        all_servers, fetch_error_key = await fetch_parse_and_prioritize_servers(vps_country_code, lang)
 
         if not all_servers:
             final_text = _(fetch_error_key or "iperf_fetch_error", lang)
@@ -707,6 +720,8 @@ async def speedtest_handler(message: types.Message):
 
     # Финальное редактирование сообщения
     if status_message_id:
+        # Неотправленный промежуточный статус больше не нужен
+        LIVE_MESSAGES.close(chat_id, status_message_id)
         try:
             await message.bot.edit_message_text(final_text, chat_id=chat_id, message_id=status_message_id, parse_mode="HTML")
             LAST_MESSAGE_IDS.setdefault(
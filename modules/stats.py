@@ -0,0 +1,70 @@
+# /opt-tg-bot/modules/stats.py
+from aiogram import Dispatcher, types
+from aiogram.filters import Command
+
+from core.i18n import _, get_user_lang
+from core.auth import is_allowed, send_access_denied_message
+from core.messaging import delete_previous_message
+from core.shared_state import LAST_MESSAGE_IDS
+from core.bot_telemetry import BOT_TELEMETRY, OUTBOX_DELIVERY, RETRY_AFTER_BOUNDS
+
+
+def register_handlers(dp: Dispatcher):
+    # Только команда /stats, без кнопки в меню
+    dp.message(Command("stats"))(stats_handler)
+
+
+def _format_latency(value: float, lang: str) -> str:
+    if value < 1:
+        return _("stats_ms", lang, value=value * 1000)
+    return _("stats_sec", lang, value=value)
+
+
+def _format_retry_after(buckets: list[int]) -> str:
+    parts = []
+    for i, count in enumerate(buckets):
+        if count:
+            label = f"≤{RETRY_AFTER_BOUNDS[i]}s" if i < len(buckets) - 1 else f">{RETRY_AFTER_BOUNDS[i - 1]}s"
+            parts.append(f"{label}: {count}")
+    return ", ".join(parts)
+
+
+def build_stats_text(lang: str) -> str:
+    summary = BOT_TELEMETRY.summary()
+    if not summary:
+        return _("stats_no_data", lang)
+    lines = [_("stats_header", lang)]
+    outbox = summary.pop(OUTBOX_DELIVERY, None)
+    for method, stats in summary.items():
+        errors = sum(stats.errors.values())
+        lines.append(_("stats_method", lang, method=method, calls=stats.calls,
+                       p50=_format_latency(stats.p50, lang),
+                       p95=_format_latency(stats.p95, lang),
+                       error_rate=errors * 100 / stats.calls))
+        if errors:
+            lines.append(_("stats_errors", lang, errors=", ".join(
+                f"{name} {count}" for name, count in stats.errors.items())))
+        if any(stats.retry_after):
+            lines.append(_("stats_retry_after", lang,
+                           buckets=_format_retry_after(stats.retry_after)))
+    if outbox is not None:
+        lines.append("")
+        lines.append(_("stats_outbox", lang, calls=outbox.calls,
+                       p50=_format_latency(outbox.p50, lang),
+                       p95=_format_latency(outbox.p95, lang),
+                       error_rate=sum(outbox.errors.values()) * 100 / outbox.calls))
+    return "\n".join(lines)
+
+
+async def stats_handler(message: types.Message):
+    user_id = message.from_user.id
+    chat_id = message.chat.id
+    lang = get_user_lang(user_id)
+    command = "stats"
+    if not is_allowed(user_id, command):
+        await send_access_denied_message(message.bot, user_id, chat_id, command)
+        return
+
+    await delete_previous_message(user_id, command, chat_id, message.bot)
+    sent_message = await message.answer(build_stats_text(lang), parse_mode="HTML")
+    LAST_MESSAGE_IDS.setdefault(user_id, {})[command] = sent_message.message_id
@@ -4,7 +4,7 @@ import logging
 import psutil
 from aiogram import F, Dispatcher, types, Bot
 from aiogram.types import KeyboardButton, ReplyKeyboardRemove, InlineKeyboardMarkup, InlineKeyboardButton
-from aiogram.exceptions import TelegramRetryAfter, TelegramBadRequest
+from aiogram.exceptions import TelegramBadRequest
 
 # --- Импортируем i18n и config ---
 from core.i18n import I18nFilter, get_user_lang, get_text
@@ -18,6 +18,7 @@ from core import shared_state
 from core.auth import is_allowed, send_access_denied_message
 from core.messaging import delete_previous_message
 from core.utils import format_traffic
+from core.live_message import LIVE_MESSAGES
 # --- ИЗМЕНЕНО: Импортируем get_main_reply_keyboard ---
 from core.keyboards import get_main_reply_keyboard
 # ----------------------------------------------------
@@ -39,6 +40,14 @@ def start_background_tasks(bot: Bot) -> list[asyncio.Task]:
     task = asyncio.create_task(traffic_monitor(bot), name="TrafficMonitor")
     return [task]
 
+
+def _stop_monitor(user_id: int) -> int | None:
+    """Снимает мониторинг трафика пользователя; возвращает ID его сообщения."""
+    message_id = shared_state.TRAFFIC_MESSAGE_IDS.pop(user_id, None)
+    shared_state.TRAFFIC_PREV.pop(user_id, None)
+    LIVE_MESSAGES.close(user_id, message_id)  # Отменяет ждущую правку
+    return message_id
+
 # --- ИЗМЕНЕНО: Логика traffic_handler ---
 
 
@@ -58,9 +67,7 @@ async def traffic_handler(message: types.Message):
     if user_id in shared_state.TRAFFIC_MESSAGE_IDS:
         logging.info(
             f"Мониторинг трафика уже активен для {user_id}. Перезапускаем...")
-        message_id_to_delete = shared_state.TRAFFIC_MESSAGE_IDS.pop(
-            user_id, None)
-        shared_state.TRAFFIC_PREV.pop(user_id, None)
+        message_id_to_delete = _stop_monitor(user_id)
         if message_id_to_delete:
             try:
                 await message.bot.delete_message(chat_id=chat_id, message_id=message_id_to_delete)
@@ -117,8 +124,7 @@ async def stop_traffic_handler(callback: types.CallbackQuery):
 
     logging.info(f"Остановка мониторинга трафика для {user_id} через кнопку.")
 
-    message_id_to_delete = shared_state.TRAFFIC_MESSAGE_IDS.pop(user_id, None)
-    shared_state.TRAFFIC_PREV.pop(user_id, None)
+    message_id_to_delete = _stop_monitor(user_id)
 
     delete_success = False  # Флаг для отслеживания удаления
     if message_id_to_delete:
@@ -196,8 +202,7 @@ async def traffic_monitor(bot: Bot):
             if not message_id:
                 logging.warning(
                     f"Traffic monitor: ID сообщения None для user {user_id}, пропускаем.")
-                shared_state.TRAFFIC_MESSAGE_IDS.pop(user_id, None)
-                shared_state.TRAFFIC_PREV.pop(user_id, None)
+                _stop_monitor(user_id)
                 continue
 
             lang = get_user_lang(user_id)
@@ -240,35 +245,29 @@ async def traffic_monitor(bot: Bot):
                     f"{get_text('traffic_speed_rx', lang, speed=rx_speed)}\n"
                     f"{get_text('traffic_speed_tx', lang, speed=tx_speed)}")
 
-                await bot.edit_message_text(
-                    chat_id=user_id,  # Используем user_id как chat_id
-                    message_id=message_id,
-                    text=msg_text,
-                    reply_markup=keyboard
-                )
+                # --- ИЗМЕНЕНО: "Живое" сообщение (core/live_message.py): без правки,
+                # если текст не изменился, не чаще LIVE_MESSAGE_MIN_INTERVAL; правка
+                # идет через общий лимит с низким приоритетом (core/delivery.py) ---
+                live = LIVE_MESSAGES.get(
+                    bot, user_id, message_id,  # Используем user_id как chat_id
+                    parse_mode=None)
+                await live.update(msg_text, reply_markup=keyboard)
 
-            except TelegramRetryAfter as e:
-                logging.warning(
-                    f"Traffic Monitor: TelegramRetryAfter for {user_id}: Wait {e.retry_after}s")
-                await asyncio.sleep(e.retry_after)
             except TelegramBadRequest as e:
                 if "message to edit not found" in str(
                         e).lower() or "chat not found" in str(e).lower():
                     logging.warning(
                         f"Traffic Monitor: Message/Chat not found for user {user_id}. Stopping monitor.")
-                    shared_state.TRAFFIC_MESSAGE_IDS.pop(user_id, None)
-                    shared_state.TRAFFIC_PREV.pop(user_id, None)
+                    _stop_monitor(user_id)
                 elif "message is not modified" in str(e).lower():
                     pass  # Игнорируем
                 else:
                     logging.error(
                         f"Traffic Monitor: Unexpected TelegramBadRequest for {user_id}: {e}. Stopping monitor.")
-                    shared_state.TRAFFIC_MESSAGE_IDS.pop(user_id, None)
-                    shared_state.TRAFFIC_PREV.pop(user_id, None)
+                    _stop_monitor(user_id)
             except Exception as e:
                 logging.error(
                     f"Traffic Monitor: Critical error updating for {user_id}: {e}. Stopping monitor.")
-                shared_state.TRAFFIC_MESSAGE_IDS.pop(user_id, None)
-                shared_state.TRAFFIC_PREV.pop(user_id, None)
+                _stop_monitor(user_id)
 
         await asyncio.sleep(TRAFFIC_INTERVAL)
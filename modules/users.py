@@ -16,7 +16,8 @@ from core import config
 # ИСПРАВЛЕНИЕ: Добавляем 'get_user_name' в импорт
 from core.auth import is_allowed, send_access_denied_message, refresh_user_names, save_users, get_user_name
 from core.messaging import delete_previous_message
-from core.shared_state import LAST_MESSAGE_IDS, ALLOWED_USERS, USER_NAMES, ALERTS_CONFIG
+from core.shared_state import LAST_MESSAGE_IDS, ALLOWED_USERS, USER_NAMES
+from core.subscriptions import SUBSCRIPTIONS
 from core.config import ADMIN_USER_ID
 from core.keyboards import (
     get_manage_users_keyboard,
@@ -379,12 +380,10 @@ async def cq_delete_user_confirm(callback: types.CallbackQuery):
             user_id_to_delete, "unknown")  # Используем ключ 'unknown'
         USER_NAMES.pop(str(user_id_to_delete), None)
         # Удаляем настройки уведомлений и языка для удаленного пользователя
-        ALERTS_CONFIG.pop(user_id_to_delete, None)
+        SUBSCRIPTIONS.remove_user(user_id_to_delete)
         shared_state.USER_SETTINGS.pop(user_id_to_delete, None)
         # Сохраняем все изменения
         save_users()
-        from core.utils import save_alerts_config  # Импорт здесь, чтобы избежать цикла
-        save_alerts_config()
         from core.i18n import save_user_settings  # Импорт здесь, чтобы избежать цикла
         save_user_settings()
 
@@ -457,12 +456,10 @@ async def cq_confirm_self_delete(callback: types.CallbackQuery):
         deleted_group_key = ALLOWED_USERS.pop(user_id_to_delete, "unknown")
         USER_NAMES.pop(str(user_id_to_delete), None)
         # Удаляем настройки уведомлений и языка
-        ALERTS_CONFIG.pop(user_id_to_delete, None)
+        SUBSCRIPTIONS.remove_user(user_id_to_delete)
         shared_state.USER_SETTINGS.pop(user_id_to_delete, None)
         # Сохраняем
         save_users()
-        from core.utils import save_alerts_config
-        save_alerts_config()
         from core.i18n import save_user_settings
         save_user_settings()
 
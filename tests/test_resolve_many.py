@@ -0,0 +1,98 @@
+# /opt-tg-bot/tests/test_resolve_many.py
+# resolve_many против локальной заглушки ip-api.com (aiohttp test server)
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+os.environ.setdefault("TG_BOT_TOKEN", "1:test")
+os.environ.setdefault("TG_ADMIN_ID", "1")
+
+from core import geoip, http_client, utils  # noqa: E402
+from core import geo_scheduler  # noqa: E402
+from core.geo_scheduler import GeoLookupScheduler  # noqa: E402
+from core.rate_limit import TokenBucket  # noqa: E402
+from core.config import GEOIP_BATCH_SIZE  # noqa: E402
+
+
+class ResolveManyTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.batches = []
+        self.singles = []
+
+        async def batch(request):
+            ips = await request.json()
+            self.batches.append(ips)
+            return web.json_response([
+                {"status": "success", "countryCode": "DE", "country": "Germany", "query": ip}
+                for ip in ips])
+
+        async def single(request):
+            self.singles.append(request.match_info["ip"])
+            return web.json_response(
+                {"status": "success", "countryCode": "FR", "country": "France"})
+
+        app = web.Application()
+        app.router.add_post("/batch", batch)
+        app.router.add_get("/json/{ip}", single)
+        self.server = TestServer(app)
+        await self.server.start_server()
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = geoip.GeoCache(os.path.join(self.tmp.name, "geoip_cache.db"), 10_000, 3600, 600)
+        self.scheduler = GeoLookupScheduler(
+            TokenBucket(100, 100), TokenBucket(100, 100), max_wait=5)
+        self.patches = [
+            mock.patch.object(geo_scheduler, "GEOIP_API_URL",
+                              str(self.server.make_url("")).rstrip("/")),
+            mock.patch.object(geoip, "GEO_CACHE", self.cache),
+            mock.patch.object(geoip, "OFFLINE_DB", None),
+            mock.patch.object(utils, "GEO_SCHEDULER", self.scheduler),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    async def asyncTearDown(self):
+        for patch in reversed(self.patches):
+            patch.stop()
+        await self.scheduler.close()
+        self.cache.close()
+        await http_client.close()
+        http_client._host_semaphores.clear()
+        await self.server.close()
+        self.tmp.cleanup()
+
+    async def test_batches_are_split_by_api_limit(self):
+        ips = [f"10.0.{i // 256}.{i % 256}" for i in range(2 * GEOIP_BATCH_SIZE + 50)]
+        flags = await utils.resolve_many(ips + ips[:10])  # Дубликаты не запрашиваются
+
+        self.assertEqual(sorted(len(batch) for batch in self.batches),
+                         [50, GEOIP_BATCH_SIZE, GEOIP_BATCH_SIZE])
+        self.assertEqual(sorted(ip for batch in self.batches for ip in batch), sorted(ips))
+        self.assertEqual(self.singles, [])
+        self.assertEqual(set(flags), set(ips))
+        self.assertEqual(set(flags.values()), {"🇩🇪"})
+
+        # Повтор отдается из кеша, без запросов
+        self.batches.clear()
+        await utils.resolve_many(ips)
+        self.assertEqual(self.batches, [])
+
+    async def test_keys_are_callers_strings(self):
+        flags = await utils.resolve_many(
+            [" 192.0.2.1", "192.0.2.2\n", "192.0.2.1", "127.0.0.1", " DE"])
+
+        self.assertEqual(flags[" 192.0.2.1"], "🇩🇪")
+        self.assertEqual(flags["192.0.2.2\n"], "🇩🇪")
+        self.assertEqual(flags["127.0.0.1"], "🏠")
+        self.assertEqual(flags[" DE"], "🇩🇪")
+        self.assertEqual(sorted(ip for batch in self.batches for ip in batch),
+                         ["192.0.2.1", "192.0.2.2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -8,6 +8,7 @@ import logging.handlers
 import re
 import json
 import sys
+import sqlite3
 from datetime import datetime, timedelta
 from typing import Optional, Callable  # <-- Добавлено
 
@@ -31,6 +32,7 @@ try:
     from core import config
     from core.i18n import get_text
     from core.utils import escape_html
+    from core.outbox import OUTBOX, PRIORITY_CRITICAL
 except ImportError as e:
     print(f"FATAL: Could not import core modules: {e}")
     print("Ensure watchdog.py is run from the correct directory (/opt-tg-bot) and venv.")
@@ -83,7 +85,10 @@ ALERT_COOLDOWN_SECONDS = 300
 config.setup_logging(WATCHDOG_LOG_DIR, "watchdog")
 
 last_alert_times = {}
+outbox_keys = {}  # alert_type -> ключ алерта в очереди исходящих (пока не доставлен)
 bot_service_was_down_or_activating = False
+# Пока бот работает, очередь исходящих разбирает он сам (с лимитами и приоритетами)
+bot_service_active = True
 status_alert_message_id = None
 current_reported_state = None
 WD_LANG = config.DEFAULT_LANGUAGE
@@ -204,14 +209,18 @@ def send_or_edit_telegram_alert(
                     f"Telegram-оповещение '{alert_type}' успешно отправлено (новое сообщение ID {new_message_id}).")
                 if apply_cooldown:
                     last_alert_times[alert_type] = current_time
+                dequeue_alert(alert_type)
             else:
                 logging.error(
                     f"Не удалось отправить Telegram-оповещение '{alert_type}'. Статус: {response.status_code}, Ответ: {response.text}")
                 new_message_id = None
+                if response.status_code == 429 or response.status_code >= 500:
+                    queue_alert(alert_type, text_to_send)
         except requests.exceptions.RequestException as e:
             logging.error(
                 f"Ошибка сети при отправке Telegram-оповещения '{alert_type}': {e}")
             new_message_id = None
+            queue_alert(alert_type, text_to_send)
         except Exception as e:
             logging.error(
                 f"Неожиданное исключение при отправке Telegram-оповещения '{alert_type}': {e}")
@@ -220,6 +229,70 @@ def send_or_edit_telegram_alert(
     return new_message_id
 
 
+# --- ДОБАВЛЕНО: Очередь исходящих (core/outbox.py) ---
+def queue_alert(alert_type: str, text: str):
+    """
+    Кладет недоставленный алерт в очередь: он уйдет, когда вернется сеть,
+    даже если состояние успеет смениться. Повторные неудачи того же алерта
+    не создают дублей (один ключ до успешной отправки).
+    """
+    key = outbox_keys.setdefault(alert_type, f"watchdog:{alert_type}:{int(time.time())}")
+    try:
+        if OUTBOX.enqueue([ALERT_ADMIN_ID], text, key=key, priority=PRIORITY_CRITICAL):
+            logging.info(f"Оповещение '{alert_type}' поставлено в очередь исходящих.")
+    except sqlite3.Error as e:
+        logging.error(f"Очередь исходящих недоступна: {e}")
+
+
+def dequeue_alert(alert_type: str):
+    """Алерт доставлен напрямую — копия в очереди больше не нужна."""
+    key = outbox_keys.pop(alert_type, None)
+    if key:
+        try:
+            OUTBOX.cancel(key)
+        except sqlite3.Error as e:
+            logging.error(f"Очередь исходящих недоступна: {e}")
+
+
+def drain_outbox():
+    """
+    Досылает сообщения из очереди исходящих — свои и бота. Вызывается только
+    пока бот не работает: у работающего бота есть общие лимиты Bot API и
+    приоритеты (core/delivery.py), а отсюда отправка идет в обход них.
+    """
+    try:
+        items = OUTBOX.claim_due(config.OUTBOX_BATCH_SIZE, config.OUTBOX_LEASE)
+    except sqlite3.Error as e:
+        logging.error(f"Очередь исходящих недоступна: {e}")
+        return
+    url = f"https://api.telegram.org/bot{ALERT_BOT_TOKEN}/sendMessage"
+    for index, item in enumerate(items):
+        payload = {'chat_id': item.chat_id, 'text': item.text}
+        if item.parse_mode:
+            payload['parse_mode'] = item.parse_mode
+        try:
+            response = requests.post(url, data=payload, timeout=10)
+        except requests.exceptions.RequestException as e:
+            # Сети нет — остальные строки тоже откладываем, не ждем таймаут на каждой
+            for pending in items[index:]:
+                OUTBOX.retry(pending.id, str(e))
+            return
+        if response.status_code == 200:
+            OUTBOX.mark_sent(item.id)
+            logging.info(f"Сообщение из очереди исходящих доставлено ({item.key}).")
+        elif response.status_code == 429:
+            try:
+                retry_after = response.json().get("parameters", {}).get("retry_after")
+            except json.JSONDecodeError:
+                retry_after = None
+            OUTBOX.retry(item.id, "HTTP 429", retry_after)
+        elif response.status_code in (400, 403):
+            OUTBOX.mark_failed(item.id, response.text)
+        else:
+            OUTBOX.retry(item.id, f"HTTP {response.status_code}")
+# ----------------------------------------------------
+
+
 def check_bot_log_for_errors():
     """Читает последние 20 строк лога бота и ищет ошибки. Возвращает (key, kwargs)."""
     current_bot_log_file = os.path.join(BOT_LOG_DIR, "bot.log")
@@ -489,7 +562,9 @@ def process_service_state(
     Общая логика обработки состояния, не зависящая от systemd или docker.
     """
     global bot_service_was_down_or_activating, status_alert_message_id, current_reported_state
+    global bot_service_active
 
+    bot_service_active = actual_state == "active"
     state_to_report = None
     alert_type = None
     message_key = None
@@ -673,4 +748,6 @@ if __name__ == "__main__":
             # По умолчанию используем systemd
             check_bot_service_systemd()
 
+        if not bot_service_active:
+            drain_outbox()
         time.sleep(CHECK_INTERVAL_SECONDS)